@@ -0,0 +1,18 @@
+"""Filtro del autocompletado en memoria (se ejecuta en cada tecla)"""
+import pytest
+
+from src.components.autocomplete_dropdown import create_autocomplete_dropdown
+
+
+def opciones(n):
+    return tuple(f"Producto {i:06d} {'abcdefghij'[i % 10]}" for i in range(n))
+
+
+@pytest.mark.parametrize("n", [1_000, 10_000, 100_000])
+@pytest.mark.parametrize("consulta", ["", "producto 0999", "sin coincidencias"])
+def bench_autocomplete_filter(benchmark, n, consulta):
+    campo = create_autocomplete_dropdown("Producto", "Ej: Cúrcuma", options=opciones(n))
+    campo.value = consulta
+
+    # Sin página: el .update() final del componente falla en silencio y se mide solo el filtro + render
+    benchmark(campo.on_change, None)
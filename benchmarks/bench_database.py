@@ -0,0 +1,82 @@
+"""Consultas de DatabaseManager sobre la base sembrada (ver conftest.py)"""
+import itertools
+from datetime import timedelta
+
+import pytest
+
+from conftest import skip_if_unsupported
+from src import database_manager
+from src.shared_state import get_shared_store
+
+
+def limpiar_caches():
+    database_manager._lote_cache.invalidate()
+    database_manager._catalog_search_cache.invalidate()
+    get_shared_store().invalidate(database_manager.STATS_CACHE_PREFIX)
+
+
+@pytest.fixture
+def lote_ids(db):
+    return itertools.cycle(db.lote_ids)
+
+
+def bench_get_lote_by_id_sin_cache(run_query, db, lote_ids):
+    run_query(lambda: db.get_lote_by_id(next(lote_ids)), setup=limpiar_caches)
+
+
+def bench_get_lote_by_id_con_cache(run_query, db):
+    lote_id = db.lote_ids[0]
+    db.get_lote_by_id(lote_id)
+    run_query(db.get_lote_by_id, lote_id)
+
+
+def bench_get_dashboard_stats(run_query, db):
+    run_query(db.get_dashboard_stats, setup=limpiar_caches)
+
+
+def bench_get_history(run_query, db):
+    run_query(db.get_history)
+
+
+@pytest.mark.parametrize("dias", [1, 30])
+def bench_get_records_between(run_query, db, dias):
+    run_query(db.get_records_between, db.inicio, db.inicio + timedelta(days=dias))
+
+
+def bench_get_records_between_producto(run_query, db):
+    run_query(db.get_records_between, db.inicio, db.inicio + timedelta(days=30), product="Cúrcuma")
+
+
+def bench_get_production_series(run_query, db):
+    skip_if_unsupported(db, db.rollup_production)
+    run_query(db.get_production_series, db.inicio, db.inicio + timedelta(days=60))
+
+
+def bench_get_products(run_query, db):
+    run_query(db.get_products)
+
+
+def bench_get_suppliers(run_query, db):
+    run_query(db.get_suppliers)
+
+
+@pytest.mark.parametrize("prefijo", ["c", "cur"])
+def bench_search_products_sin_cache(run_query, db, prefijo):
+    run_query(lambda: db.search_products(prefijo), setup=limpiar_caches)
+
+
+def bench_search_suppliers_sin_cache(run_query, db):
+    run_query(lambda: db.search_suppliers("agro"), setup=limpiar_caches)
+
+
+def bench_get_operators(run_query, db):
+    run_query(db.get_operators)
+
+
+def bench_get_movements(run_query, db):
+    run_query(db.get_movements, db.lote_ids[1])
+
+
+def bench_dispatch(run_query, db, lote_ids):
+    """Despacho atómico de 0.01 (el stock sembrado alcanza para todas las rondas)"""
+    run_query(lambda: db.dispatch(next(lote_ids), 0.01))
@@ -0,0 +1,13 @@
+"""Lectura de la fecha del selector (se ejecuta al generar cada QR)"""
+import pytest
+
+from src.components.date_time_picker import create_date_time_picker
+
+
+@pytest.mark.parametrize("usar_hora_actual", [True, False])
+def bench_get_datetime_string(benchmark, usar_hora_actual):
+    picker = create_date_time_picker()
+    picker.use_current_time_checkbox.value = usar_hora_actual
+    # get_value es get_datetime_string del componente
+    resultado = benchmark(picker.get_value)
+    assert resultado
@@ -0,0 +1,38 @@
+"""Render de etiquetas QR (trabajo de CPU con PIL)"""
+import pytest
+
+from src.utils import generate_qr_image, render_qr_png
+
+PLANTILLA = """--- LoteTracker ---
+Producto: Cúrcuma
+Cantidad: 100 kg
+Proveedor: Agro Sur S.A.
+Fecha: 2024-01-01 08:00:00
+Operador: Juan Pérez
+Código Op: OP-001
+
+-------------------
+Ver Dashboard en Vivo:
+http://192.168.1.7:8550/lote/65a1b2c3d4e5f60718293a4b
+"""
+
+
+def payload(longitud):
+    """Payload real del generador, recortado o rellenado hasta `longitud` caracteres"""
+    texto = PLANTILLA
+    while len(texto) < longitud:
+        texto += "Nota: " + "x" * 40 + "\n"
+    return texto[:longitud]
+
+
+@pytest.mark.parametrize("longitud", [64, 256, 512, 1024])
+def bench_generate_qr_image(benchmark, longitud):
+    texto = payload(longitud)
+    resultado = benchmark(generate_qr_image, texto)
+    assert resultado
+
+
+@pytest.mark.parametrize("longitud", [256])
+def bench_render_qr_png(benchmark, longitud):
+    """Solo el PNG (lo que hace cada proceso del pool de render), sin base64"""
+    benchmark(render_qr_png, payload(longitud))
@@ -0,0 +1,113 @@
+"""
+Fixtures de los benchmarks.
+
+Las consultas se miden contra un mongod local si se indica --mongo-uri (o BENCH_MONGO_URI),
+y si no contra mongomock. La base se siembra con --lotes registros (por defecto 1000).
+Con mongomock algunas etapas de agregación no existen ($facet, $round, $dateTrunc...):
+esos benchmarks se marcan como omitidos en lugar de fallar.
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DB_NAME = "lotetracker_bench"
+
+PRODUCTOS = ["Cúrcuma", "Jengibre", "Cacao", "Café", "Achiote", "Canela", "Vainilla", "Pimienta",
+             "Clavo", "Nuez moscada", "Orégano", "Comino"]
+PROVEEDORES = ["Agro Sur S.A.", "Finca El Roble", "Cooperativa Andina", "Hacienda La Esperanza"]
+OPERADORES = [("Juan Pérez", "OP-001"), ("Ana Gómez", "OP-002"), ("Luis Torres", "OP-003")]
+UNIDADES = [("kg", 1.0), ("libras", 0.45359237), ("cajas", 1.0)]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--lotes", type=int, default=1000, help="Registros de lotes a sembrar")
+    parser.addoption("--mongo-uri", default=os.getenv("BENCH_MONGO_URI"),
+                     help="mongod para las consultas (por defecto mongomock)")
+
+
+def _lote(i, inicio):
+    from src.storage import ESTADO_ALMACENADO, ESTADO_DESPACHO_PARCIAL
+    from src.utils import DATE_FORMAT, normalize_key
+    producto = PRODUCTOS[i % len(PRODUCTOS)]
+    proveedor = PROVEEDORES[i % len(PROVEEDORES)]
+    operador, codigo = OPERADORES[i % len(OPERADORES)]
+    unidad, factor = UNIDADES[i % len(UNIDADES)]
+    base = "kg" if unidad in ("kg", "libras") else unidad
+    cantidad = float(random.randint(10, 500))
+    restante = cantidad if i % 3 else round(cantidad / 2, 2)
+    fecha = inicio + timedelta(hours=i)
+    return {
+        "operatorName": operador, "operatorCode": codigo,
+        "productType": producto, "productKey": normalize_key(producto),
+        "supplier": proveedor, "supplierKey": normalize_key(proveedor),
+        "quantity": f"{cantidad:g} {unidad}", "unit": unidad,
+        "date": fecha.strftime(DATE_FORMAT), "fecha_produccion": fecha,
+        "cantidad_inicial": cantidad, "cantidad_restante": restante,
+        "unidad_base": base, "factor_base": factor,
+        "cantidad_base_inicial": round(cantidad * factor, 6),
+        "cantidad_base_restante": round(restante * factor, 6),
+        "estado": ESTADO_ALMACENADO if restante == cantidad else ESTADO_DESPACHO_PARCIAL,
+    }
+
+
+@pytest.fixture(scope="session")
+def db(request):
+    """DatabaseManager sobre una base sembrada y desechable"""
+    from src.database_manager import DatabaseManager
+    from src.utils import normalize_key
+
+    uri = request.config.getoption("--mongo-uri")
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    client.drop_database(BENCH_DB_NAME)
+    DatabaseManager._indexes_ready = False
+    manager = DatabaseManager(client=client, db_name=BENCH_DB_NAME)
+
+    random.seed(42)
+    inicio = datetime(2024, 1, 1)
+    n = request.config.getoption("--lotes")
+    for desde in range(0, n, 5000):
+        manager.registros.insert_many([_lote(i, inicio) for i in range(desde, min(n, desde + 5000))])
+    manager.productos.insert_many([{"nombre": p, "clave": normalize_key(p)} for p in PRODUCTOS])
+    manager.proveedores.insert_many([{"nombre": p, "clave": normalize_key(p)} for p in PROVEEDORES])
+    manager.inicio = inicio
+    manager.is_mock = not uri
+    manager.lote_ids = [str(d["_id"]) for d in manager.registros.find({}, {"_id": 1}).limit(500)]
+
+    yield manager
+    client.drop_database(BENCH_DB_NAME)
+
+
+def skip_if_unsupported(db, funcion, *args, **kwargs):
+    """Ejecuta una vez la operación; con mongomock, si no la soporta, omite el benchmark"""
+    from pymongo.errors import OperationFailure
+    try:
+        return funcion(*args, **kwargs)
+    except (NotImplementedError, OperationFailure) as e:
+        if not db.is_mock:
+            raise
+        pytest.skip(f"no soportado por mongomock: {e}")
+
+
+@pytest.fixture
+def run_query(benchmark, db):
+    """Mide una consulta (con `setup`, este se ejecuta antes de cada ronda sin medirse)"""
+    def medir(funcion, *args, setup=None, **kwargs):
+        if setup is not None:
+            setup()
+        skip_if_unsupported(db, funcion, *args, **kwargs)
+        if setup is None:
+            return benchmark(funcion, *args, **kwargs)
+        return benchmark.pedantic(
+            funcion, args=args, kwargs=kwargs, setup=setup, rounds=50, warmup_rounds=2
+        )
+    return medir
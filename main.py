@@ -1,19 +1,26 @@
+import time
 import flet as ft
-from src.database_manager import DatabaseManager
-from src.app import create_generator_view
-from src.dashboard_view import create_dashboard_view
+from src.settings import get_settings
+from src.view_cache import ViewCache
+from src.ui_batch import instrument_page
+from src.sessions import get_session_registry
+
+# Los módulos pesados (pymongo, PIL, qrcode) se importan al primer uso, no al arrancar:
+# src.database_manager al abrir la primera sesión y cada vista al visitar su ruta.
 
 def main(page: ft.Page):
     """Función principal que ahora actúa como ENRUTADOR"""
     page.title = "LoteTracker - Sistema de Trazabilidad"
     page.padding = 0
     page.bgcolor = "#ffffff"
+    instrument_page(page)  # UI_METRICS=1: cuenta actualizaciones y bytes enviados
 
-    # 1. Crear una única instancia del gestor de base de datos
-    db = DatabaseManager()
+    # 1. Gestor de base de datos compartido por todas las sesiones (un solo pool de conexiones)
+    from src.database_manager import get_database_manager
+    db = get_database_manager()
 
     # 2. Comprobar la conexión a la DB
-    if db.db is None:
+    if not db.is_available():
         page.add(ft.Column(
             [
                 ft.Text("Error de Conexión a la Base de Datos", size=20, color="red"),
@@ -25,42 +32,124 @@ def main(page: ft.Page):
         ))
         return
 
-    # 3. Definir el manejador de rutas
-    def route_change(route):
-        page.views.clear() # Limpia las vistas anteriores
-        
+    # 3. Caché de vistas de esta sesión: navegar a una ruta ya visitada no reconstruye la vista
+    view_cache = ViewCache(max_views=get_settings().view_cache_size)
+    sessions = get_session_registry()
+    sessions.register(page, view_cache)
+
+    def normalize_route(route):
+        # /dashboard/lote/<id> es el enlace "dashboard completo" de la página ligera de escaneo,
+        # ya que /lote/<id> cargado directamente lo responde src/scan_server.py
+        if route.startswith("/dashboard/lote/"):
+            return "/lote/" + route.split("/")[-1]
+        return route
+
+    def build_view(route):
         # Ruta principal (Generador QR)
-        if page.route == "/":
-            view = create_generator_view(page, db)
-            page.views.append(view)
+        if route == "/":
+            from src.app import create_generator_view
+            return create_generator_view(page, db)
         
         # Ruta del Dashboard General
-        elif page.route == "/dashboard":
-            view = create_dashboard_view(page, db) # Sin lote_id
-            page.views.append(view)
+        if route == "/dashboard":
+            from src.dashboard_view import create_dashboard_view
+            return create_dashboard_view(page, db) # Sin lote_id
         
         # Ruta del Lote Específico (ej. /lote/60f...)
-        elif page.route.startswith("/lote/"):
+        if route.startswith("/lote/"):
+            from src.dashboard_view import create_dashboard_view
             # Extraemos el ID de la URL
-            lote_id = page.route.split("/")[-1] 
-            view = create_dashboard_view(page, db, lote_id=lote_id)
-            page.views.append(view)
-            
+            lote_id = route.split("/")[-1] 
+            return create_dashboard_view(page, db, lote_id=lote_id)
+        return None
+
+    def dispose_views(views):
+        for old_view in views:
+            if hasattr(old_view, "dispose"):
+                old_view.dispose()
+
+    # 4. Definir el manejador de rutas
+    def route_change(route):
+        route_key = normalize_route(page.route)
+        sessions.touch(page, route=route_key)
+        view = view_cache.get(route_key)
+        is_new = view is None
+        if is_new:
+            view = build_view(route_key)
+            if view is not None:
+                dispose_views(view_cache.put(route_key, view))
+
+        # La vista raíz, si ya existe, se queda debajo en la pila: al volver atrás
+        # Flet solo quita la vista de arriba en lugar de reenviar la raíz completa.
+        root_view = view_cache.get("/") if route_key != "/" else None
+        page.views.clear()
+        page.views.extend(v for v in (root_view, view) if v is not None)
         page.update()
 
-    # 4. Definir cómo manejar el botón "Atrás" del navegador
+        # Las vistas con carga diferida traen sus datos ya montadas, sin bloquear la navegación
+        if is_new and view is not None and hasattr(view, "load_data"):
+            page.run_thread(view.load_data)
+
+    # 5. Definir cómo manejar el botón "Atrás" del navegador
     def view_pop(view):
+        if len(page.views) < 2:
+            return
         page.views.pop()
         top_view = page.views[-1]
         page.go(top_view.route) # Navega a la vista anterior
 
-    # 5. Configurar la página
+    # 6. Configurar la página
     page.on_route_change = route_change
     page.on_view_pop = view_pop
+    # Sin conexión (tablet bloqueada, pestaña en segundo plano) solo se conserva la vista actual;
+    # las demás se liberan y dejan de escuchar el bus de eventos
+    def on_disconnect(e):
+        sessions.touch(page, connected=False)
+        dispose_views(view_cache.invalidate_except(normalize_route(page.route)))
+
+    # Al cerrar la sesión se libera todo
+    def on_close(e):
+        dispose_views(view_cache.invalidate())
+        sessions.unregister(page)
+
+    page.on_disconnect = on_disconnect
+    page.on_connect = lambda e: sessions.touch(page, connected=True)
+    page.on_close = on_close
     
-    # 6. Ir a la ruta inicial (puede ser la raíz o una específica)
+    # 7. Ir a la ruta inicial (puede ser la raíz o una específica)
     page.go(page.route)
 
 
+def warm_up():
+    """
+    Calentamiento opcional (WARMUP=1) antes de aceptar conexiones: importa las vistas,
+    conecta y hace ping a MongoDB, carga los catálogos y arranca el pool de render con
+    un render desechable, para que el primer operador no pague esos costos.
+    """
+    inicio = time.perf_counter()
+    import src.app  # noqa: F401
+    import src.dashboard_view  # noqa: F401
+    from src.database_manager import get_database_manager
+    from src.catalog import get_catalog_store
+    from src.render_service import get_render_service
+
+    db = get_database_manager()
+    if db.is_available():
+        db.warm_up()
+        get_catalog_store().get(db)
+    get_render_service().warm_up()
+    print(f"✅ Calentamiento completado en {time.perf_counter() - inicio:.2f} s")
+
+
 if __name__ == "__main__":
-    ft.app(target=main, view=ft.WEB_BROWSER, port=8550)
\ No newline at end of file
+    if get_settings().warmup:
+        warm_up()
+    try:
+        import uvicorn
+        from src.scan_server import create_asgi_app
+    except ImportError:
+        print("⚠️ fastapi/uvicorn/flet-web no instalados: se inicia solo la app Flet, sin la ruta ligera de escaneo")
+        ft.app(target=main, view=ft.WEB_BROWSER, port=8550)
+    else:
+        # Flet (/, /dashboard, /ws) y la ruta ligera /lote/<id> en el mismo puerto
+        uvicorn.run(create_asgi_app(main), host="0.0.0.0", port=8550)
@@ -0,0 +1,84 @@
+"""
+Benchmarks de las rutas críticas con líneas base guardadas en JSON.
+
+    guardar   ejecuta la suite y guarda los resultados como línea base (benchmarks/.baselines)
+    comparar  ejecuta la suite contra la última línea base y falla si alguna mediana
+              empeora más del --umbral (por defecto 15%)
+
+Los argumentos que sigan a `--` se pasan tal cual a pytest (p. ej. `-- --lotes 100000`
+o `-- -k database`). Requiere requirements-dev.txt; ver benchmarks/conftest.py para MongoDB.
+Con mongomock se omiten los benchmarks de despacho, estadísticas y totales diarios ($round,
+$facet, $dateTrunc...), así que `guardar` pide un mongod (BENCH_MONGO_URI o `-- --mongo-uri`)
+salvo que se indique --mongomock para guardar a sabiendas una línea base parcial.
+
+Uso:
+    python scripts/bench.py guardar [--nombre main] [--mongomock]
+    python scripts/bench.py comparar [--umbral 15] [-- <args de pytest>]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(RAIZ, "benchmarks", ".baselines")
+
+
+def ejecutar(extra):
+    comando = [
+        sys.executable, "-m", "pytest", "benchmarks", "-q",
+        "-c", os.path.join("benchmarks", "pytest.ini"),
+        f"--benchmark-storage=file://{BASELINES}",
+        *extra,
+    ]
+    return subprocess.run(comando, cwd=RAIZ).returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    guardar = sub.add_parser("guardar", help="Guarda una nueva línea base")
+    guardar.add_argument("--nombre", default="base")
+    guardar.add_argument("--mongomock", action="store_true",
+                         help="Guarda la línea base sin mongod (omite despacho, estadísticas y totales diarios)")
+    comparar = sub.add_parser("comparar", help="Compara contra la última línea base")
+    comparar.add_argument("--umbral", type=int, default=15, help="Regresión máxima de la mediana, en %%")
+
+    argv = sys.argv[1:]
+    pytest_args = []
+    if "--" in argv:
+        corte = argv.index("--")
+        argv, pytest_args = argv[:corte], argv[corte + 1:]
+    args = parser.parse_args(argv)
+
+    con_mongod = bool(os.getenv("BENCH_MONGO_URI")) or any(a.startswith("--mongo-uri") for a in pytest_args)
+    if args.comando == "guardar":
+        if not con_mongod and not args.mongomock:
+            print("❌ Sin mongod la línea base no cubre despacho, estadísticas ni totales diarios: "
+                  "usa BENCH_MONGO_URI o `-- --mongo-uri mongodb://...` (o --mongomock para una parcial)")
+            return 2
+        codigo = ejecutar([f"--benchmark-save={args.nombre}", "-rs", *pytest_args])
+        if codigo == 0:
+            print(f"✅ Línea base guardada en {BASELINES}")
+        return codigo
+
+    if not os.path.isdir(BASELINES):
+        print("❌ No hay líneas base: ejecuta primero `python scripts/bench.py guardar`")
+        return 2
+    if not con_mongod:
+        print("⚠️ Comparando con mongomock: los benchmarks de despacho, estadísticas y totales diarios se omiten")
+    codigo = ejecutar([
+        "-rs",
+        "--benchmark-compare",
+        f"--benchmark-compare-fail=median:{args.umbral}%",
+        *pytest_args,
+    ])
+    if codigo == 0:
+        print(f"✅ Sin regresiones por encima del {args.umbral}%")
+    else:
+        print(f"❌ Regresión de la mediana por encima del {args.umbral}% (o fallo en la suite)")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Presupuesto de arranque: mide `import main` con `python -X importtime` y falla si se pasa.
+
+Comprueba que:
+  * el import completo de main.py (incluido flet) no supere --budget-ms;
+  * los módulos propios (src.*) que carga el arranque no superen --src-budget-ms;
+  * el arranque no cargue módulos pesados que deben importarse al primer uso
+    (pymongo, PIL, qrcode y las vistas src.app / src.dashboard_view).
+
+Se toma el mejor de --repetir ejecuciones para reducir el ruido. No necesita MongoDB.
+
+Uso:
+    python scripts/check_startup.py [--budget-ms 1500] [--src-budget-ms 30] [--repetir 3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROHIBIDOS = ("pymongo", "PIL", "qrcode", "src.database_manager", "src.app", "src.dashboard_view")
+
+LINEA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def medir():
+    """Ejecuta `import main` en un proceso limpio; retorna [(módulo, nivel, acumulado_us)]"""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    ).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        m = LINEA.match(linea)
+        if m:
+            modulos.append((m.group(4), len(m.group(3)) // 2, int(m.group(2))))
+    return modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--src-budget-ms", type=float, default=30)
+    parser.add_argument("--repetir", type=int, default=3)
+    args = parser.parse_args()
+
+    mejor = None
+    for _ in range(args.repetir):
+        modulos = medir()
+        total = next(us for nombre, nivel, us in modulos if nombre == "main" and nivel == 0)
+        if mejor is None or total < mejor[0]:
+            mejor = (total, modulos)
+    total, modulos = mejor
+
+    # Módulos propios importados directamente por main (su acumulado ya incluye sus hijos)
+    propios = [(n, us) for n, nivel, us in modulos if nivel == 1 and n.startswith("src.")]
+    total_src = sum(us for _, us in propios)
+    cargados = {n for n, _, _ in modulos}
+    prohibidos = [p for p in PROHIBIDOS if p in cargados]
+
+    print(f"import main: {total / 1000:.1f} ms (presupuesto {args.budget_ms:g} ms)")
+    print(f"módulos src.*: {total_src / 1000:.1f} ms (presupuesto {args.src_budget_ms:g} ms)")
+    print("Más costosos:")
+    for nombre, nivel, us in sorted((m for m in modulos if m[1] <= 2), key=lambda m: -m[2])[:10]:
+        print(f"  {us / 1000:8.1f} ms  {'  ' * nivel}{nombre}")
+
+    errores = []
+    if total / 1000 > args.budget_ms:
+        errores.append(f"import main tarda {total / 1000:.1f} ms")
+    if total_src / 1000 > args.src_budget_ms:
+        errores.append(f"los módulos src.* tardan {total_src / 1000:.1f} ms")
+    if prohibidos:
+        errores.append("el arranque importa módulos que deben cargarse al primer uso: " + ", ".join(prohibidos))
+
+    for error in errores:
+        print(f"❌ {error}")
+    if not errores:
+        print("✅ Arranque dentro del presupuesto")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Mide cómo escala el modo clúster con el número de workers.
+
+Para cada cantidad de workers lanza `python -m src.cluster --balance round_robin`, espera a que
+responda y durante --segundos varios procesos cliente piden la ruta ligera de escaneo
+(/lote/<id>, con conexiones keep-alive). Imprime peticiones/s y la aceleración respecto a 1 worker.
+Necesita MongoDB (MONGO_URI del .env), fastapi, uvicorn y flet-web.
+
+Uso:
+    python scripts/cluster_bench.py [--workers 1,2,4] [--clientes 16] [--segundos 10] [--lote <id>]
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOTE_INEXISTENTE = "000000000000000000000000"
+sys.path.insert(0, RAIZ)
+
+
+def _primer_lote():
+    """ID de un lote existente (si no hay, se mide la respuesta 404, que también consulta la caché)"""
+    from src.database_manager import DatabaseManager
+    historial = DatabaseManager().get_history()
+    return str(historial[0]["_id"]) if historial else LOTE_INEXISTENTE
+
+
+def _esperar(port, timeout=60):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            # La ruta de escaneo es pública (las de diagnóstico piden DIAGNOSTICS_TOKEN); 404 también vale
+            conexion.request("GET", f"/lote/{LOTE_INEXISTENTE}")
+            if conexion.getresponse().status in (200, 404):
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def _cliente(args):
+    """Proceso cliente: peticiones en bucle hasta `fin`; retorna (ok, errores)"""
+    port, ruta, fin = args
+    ok = errores = 0
+    conexion = None
+    while time.time() < fin:
+        try:
+            if conexion is None:
+                conexion = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conexion.request("GET", ruta, headers={"Accept": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status in (200, 304, 404):
+                ok += 1
+            else:
+                errores += 1
+        except (OSError, http.client.HTTPException):
+            errores += 1
+            conexion = None
+    return ok, errores
+
+
+def medir(workers, args, ruta):
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "src.cluster", "--workers", str(workers),
+         "--port", str(args.port), "--host", "127.0.0.1", "--balance", "round_robin"],
+        cwd=RAIZ,
+    )
+    try:
+        if not _esperar(args.port):
+            print(f"❌ El clúster con {workers} workers no respondió")
+            return None
+        time.sleep(1)  # que todos los workers terminen de arrancar
+        fin = time.time() + args.segundos
+        with Pool(args.clientes) as pool:
+            resultados = pool.map(_cliente, [(args.port, ruta, fin)] * args.clientes)
+        ok = sum(r[0] for r in resultados)
+        errores = sum(r[1] for r in resultados)
+        return ok / args.segundos, errores
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Lista de cantidades de workers")
+    parser.add_argument("--clientes", type=int, default=16, help="Procesos cliente concurrentes")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8650)
+    parser.add_argument("--lote", help="ID de lote a consultar (por defecto el último creado)")
+    args = parser.parse_args()
+
+    ruta = f"/lote/{args.lote or _primer_lote()}"
+    base = None
+    print(f"{'workers':>8} {'req/s':>10} {'errores':>8} {'aceleración':>12}")
+    for workers in [int(n) for n in args.workers.split(",")]:
+        resultado = medir(workers, args, ruta)
+        if resultado is None:
+            return 1
+        rps, errores = resultado
+        base = base or rps
+        print(f"{workers:>8} {rps:>10.1f} {errores:>8} {rps / base:>11.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
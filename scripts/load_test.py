@@ -0,0 +1,400 @@
+"""
+Arnés de carga: sesiones de operadores generando etiquetas y teléfonos escaneando a la vez.
+
+Cada escenario (ver scripts/load_scenarios.json) define su duración y dos tipos de tráfico:
+  * generacion: N sesiones de operador que envían el formulario del generador
+    (POST /api/lotes, mismo flujo que src/app.py: catálogo, registro y render de la etiqueta);
+  * escaneos: M teléfonos que abren la página ligera del lote (GET /lote/<id>).
+Cada tipo indica "clientes" y su ritmo total, "por_segundo" o "total" (repartido en la duración).
+La carga es de lazo abierto: cada cliente tiene su calendario de envíos y la latencia se mide
+desde el instante programado, así un servidor saturado no reduce la carga que recibe.
+"entorno" son variables de entorno para el servidor lanzado (p. ej. RENDER_WORKERS) y
+permite comparar configuraciones de despliegue.
+
+Por defecto lanza el servidor (main.py) con mongomock como base de datos; con --mongo-uri usa
+un mongod (base desechable lotetracker_carga) y con --url ataca un servidor ya en marcha
+(con --pid se mide su CPU y memoria; ese servidor debe arrancar con LOAD_TEST_API=1). Reporta p50/p95/p99, rendimiento, errores por código,
+y CPU y RSS del servidor (árbol de procesos, incluido el pool de render, leído de /proc).
+
+Uso:
+    python scripts/load_test.py [--escenario revision_despacho] [--escenarios <archivo.json>]
+                                [--mongo-uri mongodb://...] [--url http://host:8550 --pid <pid>]
+                                [--port 8660] [--procesos 4] [--json resultados.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from multiprocessing import Pool
+from urllib.parse import urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ESCENARIOS = os.path.join(RAIZ, "scripts", "load_scenarios.json")
+DB_CARGA = "lotetracker_carga"
+LOTE_INEXISTENTE = "000000000000000000000000"
+MUESTREO = 0.5  # segundos entre lecturas de /proc
+
+PRODUCTOS = ["Cúrcuma", "Jengibre", "Cacao", "Café", "Achiote"]
+PROVEEDORES = ["Agro Sur S.A.", "Finca El Roble", "Cooperativa Andina"]
+UNIDADES = ["kg", "libras", "cajas", "sacos"]
+
+
+# --- Servidor ---
+
+def servidor(args):
+    """Proceso servidor (subcomando interno): main.py con mongomock o con una base desechable"""
+    from src import database_manager
+    from src.cluster import run_worker
+
+    if args.mongomock:
+        import mongomock
+        database_manager._shared_manager = database_manager.DatabaseManager(
+            client=mongomock.MongoClient(), db_name=DB_CARGA
+        )
+    else:
+        db = database_manager.get_database_manager()
+        if db.db is None:
+            print("❌ No se pudo conectar a MongoDB")
+            return 1
+        db.client.drop_database(db.db_name)
+        database_manager.DatabaseManager._indexes_ready = False
+        database_manager._shared_manager = database_manager.DatabaseManager()
+    run_worker(args.port)
+    return 0
+
+
+def lanzar_servidor(args, entorno):
+    # LOAD_TEST_API=1 registra POST /api/lotes, que la app no expone por defecto
+    env = {**os.environ, **entorno, "BASE_URL": f"http://127.0.0.1:{args.port}", "LOAD_TEST_API": "1"}
+    comando = [sys.executable, os.path.abspath(__file__), "servidor", "--port", str(args.port)]
+    if args.mongo_uri:
+        env.update(MONGO_URI=args.mongo_uri, DB_NAME=DB_CARGA)
+    else:
+        comando.append("--mongomock")
+    return subprocess.Popen(comando, cwd=RAIZ, env=env)
+
+
+def esperar(host, port, timeout=60):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            conexion = http.client.HTTPConnection(host, port, timeout=2)
+            # La ruta de escaneo es pública (las de diagnóstico piden DIAGNOSTICS_TOKEN); 404 también vale
+            conexion.request("GET", f"/lote/{LOTE_INEXISTENTE}")
+            if conexion.getresponse().status in (200, 404):
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+# --- CPU y memoria del servidor (/proc) ---
+
+def _arbol(pid):
+    """pid y todos sus descendientes (workers del clúster, procesos del pool de render)"""
+    hijos = {}
+    for nombre in os.listdir("/proc"):
+        if not nombre.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nombre}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        hijos.setdefault(ppid, []).append(int(nombre))
+    pids, pendientes = [], [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pids.append(actual)
+        pendientes.extend(hijos.get(actual, []))
+    return pids
+
+
+def _leer_proceso(pid):
+    """(segundos de CPU, RSS en bytes) de un proceso; (0, 0) si ya terminó"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next((int(l.split()[1]) * 1024 for l in f if l.startswith("VmRSS:")), 0)
+    except (OSError, ValueError):
+        return 0.0, 0
+    # utime y stime son los campos 14 y 15 de stat (11 y 12 tras el nombre del proceso)
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK"), rss
+
+
+class MonitorServidor(threading.Thread):
+    """Muestrea CPU y RSS del árbol de procesos del servidor mientras dura la carga"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.detener = threading.Event()
+        self.rss = []
+        self.cpu_inicio = self.cpu_fin = 0.0
+        self.inicio = self.fin = 0.0
+
+    def muestra(self):
+        lecturas = [_leer_proceso(p) for p in _arbol(self.pid)]
+        return sum(c for c, _ in lecturas), sum(r for _, r in lecturas)
+
+    def run(self):
+        self.inicio = time.monotonic()
+        self.cpu_inicio, rss = self.muestra()
+        self.rss.append(rss)
+        while not self.detener.wait(MUESTREO):
+            _, rss = self.muestra()
+            self.rss.append(rss)
+        self.cpu_fin, rss = self.muestra()
+        self.rss.append(rss)
+        self.fin = time.monotonic()
+
+    def resumen(self):
+        segundos = max(self.fin - self.inicio, 1e-9)
+        return {
+            "cpu_pct": round(100 * (self.cpu_fin - self.cpu_inicio) / segundos, 1),
+            "rss_inicio_mb": round(self.rss[0] / 2**20, 1),
+            "rss_max_mb": round(max(self.rss) / 2**20, 1),
+            "rss_fin_mb": round(self.rss[-1] / 2**20, 1),
+        }
+
+
+# --- Clientes ---
+
+def formulario(rng):
+    """Lo que enviaría un operador desde el generador"""
+    return {
+        "operatorName": f"Operador {rng.randint(1, 20)}",
+        "operatorCode": f"OP-{rng.randint(1, 20):03d}",
+        "productType": rng.choice(PRODUCTOS),
+        "quantity": rng.randint(5, 500),
+        "unit": rng.choice(UNIDADES),
+        "supplier": rng.choice(PROVEEDORES),
+    }
+
+
+def peticion(conexion, tipo, lote_ids, rng):
+    if tipo == "generacion":
+        cuerpo = json.dumps(formulario(rng)).encode()
+        conexion.request("POST", "/api/lotes", body=cuerpo, headers={"Content-Type": "application/json"})
+    else:
+        conexion.request("GET", f"/lote/{rng.choice(lote_ids)}", headers={"Accept": "text/html"})
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    return respuesta.status
+
+
+def cliente(host, port, tipo, intervalo, inicio, fin, lote_ids, semilla, resultados):
+    """Un operador o un teléfono: envía según su calendario hasta `fin`"""
+    rng = random.Random(semilla)
+    conexion = None
+    programado = inicio + rng.uniform(0, intervalo)  # desfase para no llegar todos juntos
+    while programado < fin:
+        espera = programado - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        try:
+            if conexion is None:
+                conexion = http.client.HTTPConnection(host, port, timeout=30)
+            estado = peticion(conexion, tipo, lote_ids, rng)
+        except (OSError, http.client.HTTPException) as e:
+            estado = type(e).__name__
+            conexion = None
+        resultados.append((tipo, time.monotonic() - programado, estado))
+        programado += intervalo
+
+
+def proceso_clientes(args):
+    """Proceso de carga: un hilo por cliente; retorna [(tipo, latencia_s, estado)]"""
+    host, port, clientes, inicio_unix, duracion, lote_ids = args
+    # monotonic no es comparable entre procesos: el inicio común llega en tiempo Unix
+    inicio = time.monotonic() + (inicio_unix - time.time())
+    resultados = []
+    hilos = [
+        threading.Thread(target=cliente, args=(
+            host, port, tipo, intervalo, inicio, inicio + duracion, lote_ids, semilla, resultados
+        ))
+        for tipo, intervalo, semilla in clientes
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def planificar(escenario):
+    """[(tipo, intervalo entre envíos de cada cliente, semilla)] según el escenario"""
+    duracion = escenario["duracion"]
+    clientes = []
+    for tipo in ("generacion", "escaneos"):
+        trafico = escenario.get(tipo) or {}
+        n = trafico.get("clientes", 0)
+        if not n:
+            continue
+        por_segundo = trafico.get("por_segundo") or trafico.get("total", 0) / duracion
+        if por_segundo <= 0:
+            continue
+        clientes += [(tipo, n / por_segundo, len(clientes) + i) for i in range(n)]
+    return clientes
+
+
+def sembrar(host, port, n):
+    """Crea los lotes que escanearán los teléfonos"""
+    conexion = http.client.HTTPConnection(host, port, timeout=30)
+    rng = random.Random(0)
+    ids = []
+    for _ in range(n):
+        conexion.request("POST", "/api/lotes?qr=0", body=json.dumps(formulario(rng)).encode(),
+                         headers={"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        cuerpo = respuesta.read()
+        if respuesta.status == 201:
+            ids.append(json.loads(cuerpo)["id"])
+        elif respuesta.status == 404:
+            raise RuntimeError("POST /api/lotes no está registrada: arranca el servidor con LOAD_TEST_API=1")
+        elif respuesta.status != 503:
+            raise RuntimeError(f"POST /api/lotes respondió {respuesta.status}: {cuerpo[:200]!r}")
+    return ids
+
+
+# --- Reporte ---
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+
+def resumir(resultados, duracion):
+    ok_por_tipo = {"generacion": {201}, "escaneos": {200, 304}}
+    resumen = {}
+    for tipo in ("generacion", "escaneos"):
+        filas = [(lat, estado) for t, lat, estado in resultados if t == tipo]
+        if not filas:
+            continue
+        latencias = sorted(lat for lat, estado in filas if estado in ok_por_tipo[tipo])
+        errores = Counter(str(estado) for _, estado in filas if estado not in ok_por_tipo[tipo])
+        resumen[tipo] = {
+            "peticiones": len(filas),
+            "ok": len(latencias),
+            "errores": dict(errores),
+            "rendimiento_rps": round(len(latencias) / duracion, 1),
+            **{f"p{p}_ms": round(percentil(latencias, p) * 1000, 1) for p in (50, 95, 99)},
+            "max_ms": round(latencias[-1] * 1000, 1) if latencias else 0.0,
+        }
+    return resumen
+
+
+def imprimir(nombre, escenario, resumen, servidor_stats):
+    print(f"\n=== {nombre}: {escenario.get('descripcion', '')}")
+    print(f"{'tráfico':<12} {'peticiones':>10} {'ok':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}  errores")
+    for tipo, r in resumen.items():
+        errores = ", ".join(f"{k}: {v}" for k, v in r["errores"].items()) or "-"
+        print(f"{tipo:<12} {r['peticiones']:>10} {r['ok']:>7} {r['rendimiento_rps']:>8} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8}  {errores}")
+    if servidor_stats:
+        print(f"servidor: CPU {servidor_stats['cpu_pct']}% (100% = un núcleo), RSS "
+              f"{servidor_stats['rss_inicio_mb']} → máx {servidor_stats['rss_max_mb']} → "
+              f"{servidor_stats['rss_fin_mb']} MB")
+
+
+def ejecutar(nombre, escenario, args):
+    proceso = None
+    if args.url:
+        partes = urlsplit(args.url)
+        host, port, pid = partes.hostname, partes.port or 80, args.pid
+    else:
+        proceso = lanzar_servidor(args, escenario.get("entorno", {}))
+        host, port, pid = "127.0.0.1", args.port, proceso.pid
+    try:
+        if not esperar(host, port):
+            print(f"❌ El servidor no respondió en {host}:{port}")
+            return None
+        lote_ids = sembrar(host, port, escenario.get("semilla", 20))
+        if not lote_ids:
+            print("❌ No se pudo crear ningún lote para los escaneos")
+            return None
+
+        clientes = planificar(escenario)
+        grupos = [clientes[i::args.procesos] for i in range(args.procesos)]
+        grupos = [g for g in grupos if g]
+        duracion = escenario["duracion"]
+        inicio = time.time() + 1  # margen para arrancar los procesos de carga
+        monitor = MonitorServidor(pid) if pid else None
+        with Pool(len(grupos)) as pool:
+            pendientes = pool.map_async(
+                proceso_clientes, [(host, port, g, inicio, duracion, lote_ids) for g in grupos]
+            )
+            time.sleep(max(0.0, inicio - time.time()))
+            if monitor:
+                monitor.start()
+            resultados = [fila for parte in pendientes.get() for fila in parte]
+        if monitor:
+            monitor.detener.set()
+            monitor.join()
+
+        resumen = resumir(resultados, duracion)
+        servidor_stats = monitor.resumen() if monitor else None
+        imprimir(nombre, escenario, resumen, servidor_stats)
+        return {"escenario": nombre, "entorno": escenario.get("entorno", {}),
+                "trafico": resumen, "servidor": servidor_stats}
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+
+def main():
+    if sys.argv[1:2] == ["servidor"]:
+        parser = argparse.ArgumentParser(prog="load_test.py servidor")
+        parser.add_argument("--port", type=int, required=True)
+        parser.add_argument("--mongomock", action="store_true")
+        return servidor(parser.parse_args(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escenarios", default=ESCENARIOS, help="Archivo JSON de escenarios")
+    parser.add_argument("--escenario", action="append", help="Escenario a ejecutar (por defecto todos)")
+    parser.add_argument("--mongo-uri", help="mongod para el servidor lanzado (por defecto mongomock)")
+    parser.add_argument("--url", help="Servidor ya en marcha (no se lanza uno)")
+    parser.add_argument("--pid", type=int, help="PID del servidor de --url, para medir CPU y RSS")
+    parser.add_argument("--port", type=int, default=8660, help="Puerto del servidor lanzado")
+    parser.add_argument("--procesos", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Procesos generadores de carga")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    with open(args.escenarios, encoding="utf-8") as f:
+        escenarios = json.load(f)
+    nombres = args.escenario or list(escenarios)
+    faltantes = [n for n in nombres if n not in escenarios]
+    if faltantes:
+        print(f"❌ Escenarios desconocidos: {', '.join(faltantes)} (disponibles: {', '.join(escenarios)})")
+        return 2
+
+    resultados = []
+    for nombre in nombres:
+        resultado = ejecutar(nombre, escenarios[nombre], args)
+        if resultado is None:
+            return 1
+        resultados.append(resultado)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Resultados guardados en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
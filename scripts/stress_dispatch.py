@@ -0,0 +1,83 @@
+"""
+Prueba de concurrencia del despacho atómico.
+
+Varios hilos despachan del MISMO lote a la vez (con dispatch y dispatch_many) y al final se
+comprueba que nunca se vendió más de lo que había y que el libro de movimientos cuadra con el stock.
+Necesita un MongoDB real (MONGO_URI del .env); usa una base de datos desechable.
+
+Uso:
+    python scripts/stress_dispatch.py [--hilos 32] [--stock 500]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_NAME"] = os.environ.get("STRESS_DB_NAME", "lotetracker_stress")
+
+from src.database_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", type=int, default=32)
+    parser.add_argument("--stock", type=float, default=500)
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if db.db is None:
+        print("❌ Se necesita MongoDB para esta prueba")
+        return 1
+    db.client.drop_database(db.db_name)
+    DatabaseManager._indexes_ready = False
+    db = DatabaseManager()
+
+    lote_id = db.add_history_record({
+        "operatorName": "stress", "operatorCode": "ST-1", "productType": "Prueba",
+        "quantity": f"{args.stock:g} kg", "unit": "kg", "supplier": "Prueba",
+    }).inserted_id
+
+    inicio = threading.Barrier(args.hilos)
+
+    def trabajador(n):
+        rnd = random.Random(n)
+        inicio.wait()
+        fallos_seguidos = 0
+        while fallos_seguidos < 5:
+            if rnd.random() < 0.2:
+                aplicados = db.dispatch_many([(lote_id, rnd.randint(1, 3)) for _ in range(rnd.randint(2, 5))])
+                ok = bool(aplicados)
+            else:
+                ok = db.dispatch(lote_id, rnd.randint(1, 5)) is not None
+            fallos_seguidos = 0 if ok else fallos_seguidos + 1
+
+    hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(args.hilos)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    lote = db.registros.find_one({"_id": lote_id})
+    despachado = sum(m["cantidad"] for m in db.movimientos.find({"lote_id": lote_id}))
+    print(f"Stock inicial: {args.stock:g}  despachado: {despachado:g}  restante: {lote['cantidad_restante']:g}  estado: {lote['estado']}")
+
+    errores = []
+    if lote["cantidad_restante"] < 0:
+        errores.append("stock negativo (sobreventa)")
+    if abs(args.stock - despachado - lote["cantidad_restante"]) > 1e-6:
+        errores.append("el libro de movimientos no cuadra con el stock")
+    if lote.get("movimientos_pendientes"):
+        errores.append("quedaron marcas de movimientos pendientes")
+
+    db.client.drop_database(db.db_name)
+    if errores:
+        print("❌ " + "; ".join(errores))
+        return 1
+    print("✅ Sin sobreventa y libro consistente")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,19 @@
 import flet as ft
 from datetime import datetime
 import base64
-import os
-from dotenv import load_dotenv
+import sqlite3
+from concurrent.futures.process import BrokenProcessPool
+
+from pymongo.errors import PyMongoError
 
 # Importamos el DatabaseManager
 from src.database_manager import DatabaseManager
-from src.utils import generate_qr_image
+from src.render_service import RenderQueueFull, RenderTimeout, get_render_service
+from src.ui_batch import batched, request_update
+from src.metrics import span
+from src.catalog import get_catalog_store
+from src.settings import get_settings
+from src.lotes import LoteInvalido, build_qr_data, build_qr_payload, crear_lote, generar_etiqueta, validar_lote
 
 # Importamos los componentes
 from src.components.header import create_header
@@ -20,27 +27,31 @@ from src.components.date_time_picker import create_date_time_picker
 class GeneratorPage:
 
     def __init__(self, page: ft.Page, db: DatabaseManager):
-        load_dotenv()
+        settings = get_settings()
         self.page = page
         self.db = db
-        self.base_url = os.getenv("BASE_URL")
+        self.base_url = settings.base_url
         self.current_qr_data = {}
         self.current_qr_base64 = ""
+        self.current_lote_id = None
+        # (lote_id, datos) de un lote guardado cuya etiqueta falló: el botón la reintenta sin otra alta
+        self.pending_label = None
+        # ZPL_PRINTER: botón para imprimir la etiqueta en una Zebra (src/zpl.py)
+        self.zpl_printer = settings.zpl_printer
+        # CATALOG_SEARCH=server: los catálogos no se cargan en memoria, se consultan por prefijo
+        self.server_side_search = settings.server_side_search
 
         # --- 1. Definir TODOS los controles ---
-        # Obtener datos para los dropdowns
-        self.operators_dict = db.get_operators()  # {nombre: código}
-        # Crear mapa inverso para buscar nombre por código
-        self.operators_code_map = {v: k for k, v in self.operators_dict.items()}
-        
-        products_list = db.get_products()
-        suppliers_list = db.get_suppliers()
-        
+        # Operadores, productos y proveedores salen del snapshot compartido por todas las
+        # sesiones: cada sesión consulta el vigente en lugar de guardar su propia copia
+        self.catalog = get_catalog_store()
+        self.catalog.get(db)
+
         # Campo de operador con autocompletado
         self.operator_name_field = create_autocomplete_dropdown(
             label="Nombre del operador *",
             hint_text="Ej: Juan Pérez",
-            options=list(self.operators_dict.keys()),
+            options=lambda: self.snapshot().operators,
             on_change=self.on_operator_selected
         )
         
@@ -48,7 +59,7 @@ class GeneratorPage:
         self.operator_code_field = create_autocomplete_dropdown(
             label="Código del operador *",
             hint_text="Ej: OP-001",
-            options=list(self.operators_dict.values()),
+            options=lambda: self.snapshot().operator_codes,
             on_change=self.on_code_selected
         )
         
@@ -56,7 +67,8 @@ class GeneratorPage:
         self.product_type_field = create_autocomplete_dropdown(
             label="Tipo de producto *",
             hint_text="Ej: Cúrcuma",
-            options=products_list
+            options=lambda: self.snapshot().products,
+            search=db.search_products if self.server_side_search else None
         )
         
         # Campo de cantidad con selector de unidad
@@ -78,7 +90,8 @@ class GeneratorPage:
         self.supplier_field = create_autocomplete_dropdown(
             label="Proveedor *",
             hint_text="Ej: Agro Sur S.A.",
-            options=suppliers_list
+            options=lambda: self.snapshot().suppliers,
+            search=db.search_suppliers if self.server_side_search else None
         )
         
         # Selector de fecha/hora
@@ -131,10 +144,14 @@ class GeneratorPage:
             self.quantity_display,
             self.supplier_display,
             self.date_display,
-            self.download_qr
+            self.download_qr,
+            self.print_zpl if self.zpl_printer else None
         )
         self.history_container = create_history_table_card(self.history_table)
 
+        # Una sola SnackBar por sesión, montada en el overlay y reutilizada en cada aviso
+        self.snackbar = ft.SnackBar(content=ft.Text("", color="#ffffff"))
+
     def create_custom_form_card(self):
         """Crea el form card personalizado con los nuevos componentes"""
         return ft.Container(
@@ -200,106 +217,147 @@ class GeneratorPage:
             width=700,
         )
 
+    def snapshot(self):
+        """Catálogos vigentes (compartidos, de solo lectura)"""
+        return self.catalog.get(self.db)
+
     def on_operator_selected(self, e):
         """Auto-rellena el código del operador cuando se selecciona uno existente"""
-        selected_operator = self.operator_name_field.value
-        if selected_operator and selected_operator in self.operators_dict:
-            self.operator_code_field.value = self.operators_dict[selected_operator]
+        code = self.snapshot().code_by_operator.get(self.operator_name_field.value)
+        if code:
+            self.operator_code_field.value = code
             self.operator_code_field.update()
             
     def on_code_selected(self, e):
         """Auto-rellena el nombre del operador cuando se selecciona un código existente"""
-        selected_code = self.operator_code_field.value
-        if selected_code and selected_code in self.operators_code_map:
-            self.operator_name_field.value = self.operators_code_map[selected_code]
+        name = self.snapshot().operator_by_code.get(self.operator_code_field.value)
+        if name:
+            self.operator_name_field.value = name
             self.operator_name_field.update()
 
     # --- 3. Lógica de la Aplicación ---
 
-    def validate_fields(self):
-        if not self.operator_name_field.value:
-            self.show_snackbar("⚠️ Por favor, ingrese el nombre del operador", "#d4183d")
-            return False
-        if not self.operator_code_field.value:
-            self.show_snackbar("⚠️ Por favor, ingrese el código del operador", "#d4183d")
-            return False
-        if not self.product_type_field.value:
-            self.show_snackbar("⚠️ Por favor, ingrese el tipo de producto", "#d4183d")
-            return False
-        if not self.quantity_field.value:
-            self.show_snackbar("⚠️ Por favor, ingrese la cantidad", "#d4183d")
-            return False
-        if not self.supplier_field.value:
-            self.show_snackbar("⚠️ Por favor, ingrese el proveedor", "#d4183d")
+    def form_data(self):
+        """Datos del lote tal como están en el formulario"""
+        return build_qr_data(
+            operator_name=self.operator_name_field.value,
+            operator_code=self.operator_code_field.value,
+            product_type=self.product_type_field.value,
+            quantity=self.quantity_field.value,
+            supplier=self.supplier_field.value,
+            date=self.date_picker.get_value(),
+            unit=self.unit_field.value,
+        )
+
+    def validate_fields(self, qr_data):
+        try:
+            validar_lote(qr_data)
+        except LoteInvalido as e:
+            self.show_snackbar(str(e), "#d4183d")
             return False
         return True
 
     def show_snackbar(self, message, bgcolor="#38A169"):
-        self.page.snack_bar = ft.SnackBar(content=ft.Text(message, color="#ffffff"), bgcolor=bgcolor)
-        self.page.snack_bar.open = True
-        self.page.update()
-
+        self.snackbar.content.value = message
+        self.snackbar.bgcolor = bgcolor
+        self.snackbar.open = True
+        if self.snackbar not in self.page.overlay:
+            self.page.overlay.append(self.snackbar)
+            request_update(self.page)  # la primera vez hay que montarla en el overlay
+        else:
+            request_update(self.page, self.snackbar)
+
+    @batched
     def on_generate_qr(self, e):
         """Maneja la generación del código QR"""
-        if not self.validate_fields():
-            return
+        pendiente = self.pending_label
+        if pendiente is None:
+            lote_id = None
+            # 1. Obtenemos los datos del formulario
+            with span("validate"):
+                qr_data = self.form_data()
+                valido = self.validate_fields(qr_data)
+            if not valido:
+                return
+        else:
+            # El lote ya está guardado: solo falta su etiqueta
+            lote_id, qr_data = pendiente
 
         if not self.base_url:
-            self.show_snackbar("❌ Error: 'BASE_URL' no está configurada en tu archivo .env", "#d4183d")
-            self.show_snackbar("Añade la URL de tu servidor (ej. http://192.168.1.7:8550) a .env", "#d4183d")
+            self.show_snackbar(
+                "❌ Error: 'BASE_URL' no está configurada en tu archivo .env. "
+                "Añade la URL de tu servidor (ej. http://192.168.1.7:8550) a .env",
+                "#d4183d"
+            )
             return
 
-        # Obtener fecha del date_picker
-        date_value = self.date_picker.get_value()
-        
-        # Obtener unidad
-        unit = self.unit_field.value or "kg"
-        quantity_with_unit = f"{self.quantity_field.value} {unit}"
-
-        # 1. Obtenemos los datos del formulario
-        qr_data = {
-            "operatorName": self.operator_name_field.value,
-            "operatorCode": self.operator_code_field.value,
-            "productType": self.product_type_field.value,
-            "quantity": quantity_with_unit,
-            "supplier": self.supplier_field.value,
-            "date": date_value,
-            "unit": unit,  # Guardar unidad por separado también
-        }
-
-        # 2. Guardamos en la base de datos
-        self.db.add_product(qr_data["productType"])
-        self.db.add_supplier(qr_data["supplier"])
-        insert_result = self.db.add_history_record(qr_data)
-        nuevo_lote_id = insert_result.inserted_id
-
-        # 3. Creamos la URL en vivo
-        qr_url = f"{self.base_url}/lote/{nuevo_lote_id}"
-
-        # 4. Creamos el texto de lectura offline + URL
-        qr_payload_string = f"""--- LoteTracker ---
-Producto: {qr_data['productType']}
-Cantidad: {quantity_with_unit}
-Proveedor: {qr_data['supplier']}
-Fecha: {qr_data['date']}
-Operador: {qr_data['operatorName']}
-Código Op: {qr_data['operatorCode']}
-
--------------------
-Ver Dashboard en Vivo:
-{qr_url}
-"""
-
-        # 5. Generamos el QR usando el nuevo texto
-        img_base64 = generate_qr_image(qr_payload_string)
+        # El render va al pool de procesos: se reserva cupo antes de guardar para no crear
+        # lotes sin etiqueta cuando el servidor está saturado
+        error_render = None
+        try:
+            with get_render_service().reserve() as render_job:
+                self.generate_button.disabled = True
+                self.generate_button.text = "Generando..."
+                # Se envía ya (fuera del lote): el operador ve el botón ocupado mientras se genera
+                with span("ui_flush"):
+                    self.page.update(self.generate_button)
+
+                if pendiente is None:
+                    # 2-5. Guardamos el lote y generamos su etiqueta (mismo flujo que POST /api/lotes)
+                    lote_id, img_base64 = crear_lote(self.db, qr_data, self.base_url, render_job)
+                else:
+                    img_base64 = generar_etiqueta(qr_data, lote_id, self.base_url, render_job)
+        except RenderQueueFull:
+            error_render = "⏳ El servidor está generando muchas etiquetas. Intente de nuevo en unos segundos."
+        except Exception as ex:
+            lote_guardado = getattr(ex, "lote_id", None) or lote_id
+            if lote_guardado is not None:
+                # El lote ya se guardó: reintentar el alta lo duplicaría, se reintenta solo la etiqueta
+                lote_id = lote_guardado
+                self.pending_label = (lote_id, qr_data)
+                if isinstance(ex, RenderTimeout):
+                    causa = "tardó demasiado"
+                elif isinstance(ex, BrokenProcessPool):
+                    causa = "falló el proceso de render"
+                else:
+                    print(f"❌ Error al generar la etiqueta del lote {lote_id}: {ex!r}")
+                    causa = "error inesperado"
+                error_render = (
+                    f"⚠️ El lote {lote_id} quedó guardado, pero su etiqueta no se generó ({causa}). "
+                    "Pulse \"Reintentar etiqueta\" para generarla sin crear otro lote."
+                )
+            elif isinstance(ex, (PyMongoError, sqlite3.Error)):
+                print(f"❌ Error de base de datos al guardar el lote: {ex}")
+                error_render = "❌ Error de base de datos: el lote no se guardó. Revise la conexión e intente de nuevo."
+            else:
+                print(f"❌ Error inesperado al guardar el lote: {ex!r}")
+                error_render = "❌ Error inesperado: el lote no se guardó. Intente de nuevo."
+        finally:
+            # Se restaura el botón aunque falle algo no previsto
+            self.generate_button.disabled = False
+            if self.pending_label is not None:
+                self.generate_button.text = "Reintentar etiqueta"
+            elif self.current_qr_base64:
+                self.generate_button.text = "Generar nuevo código QR"
+            else:
+                self.generate_button.text = "Generar código QR"
+            self.new_code_button.visible = bool(self.pending_label or self.current_qr_base64)
+            request_update(self.page, self.generate_button, self.new_code_button)
+
+        if error_render:
+            self.show_snackbar(error_render, "#d4183d")
+            return
 
         # 6. El resto de la lógica es la misma
+        self.pending_label = None
         self.qr_image.src_base64 = img_base64
         self.current_qr_base64 = img_base64
         self.current_qr_data = qr_data
+        self.current_lote_id = lote_id
 
         self.update_qr_display(qr_data)
-        self.update_history_table()
+        with span("history_refresh"):
+            self.update_history_table()
 
         self.qr_info_container.visible = True
         self.history_container.visible = True
@@ -308,7 +366,10 @@ Ver Dashboard en Vivo:
         self.new_code_button.visible = True
 
         self.show_snackbar("✅ Código QR Híbrido (Offline/Online) generado")
-        self.page.update()
+        request_update(
+            self.page,
+            self.generate_button, self.new_code_button, self.qr_info_container, self.history_container
+        )
 
     def update_qr_display(self, data):
         self.operator_name_display.value = data["operatorName"]
@@ -335,6 +396,13 @@ Ver Dashboard en Vivo:
                 ])
             )
 
+    def refresh(self):
+        """Vuelve a leer el historial (la vista se reutiliza desde la caché de rutas)"""
+        self.update_history_table()
+        self.history_container.visible = len(self.history_table.rows) > 0
+        request_update(self.page, self.history_container)
+
+    @batched
     def on_new_code(self, e):
         self.operator_name_field.value = ""
         self.operator_code_field.value = ""
@@ -367,10 +435,22 @@ Ver Dashboard en Vivo:
         self.date_picker.am_pm_dropdown.disabled = True
         
         self.qr_info_container.visible = False
+        # Se abandona el reintento de una etiqueta fallida (el lote sigue en el historial)
+        self.pending_label = None
         self.generate_button.text = "Generar código QR"
         self.new_code_button.visible = False
-        self.page.update()
+        request_update(self.page, self.form_card, self.qr_info_container)
 
+    def release(self):
+        """Libera el estado pesado de la sesión (imagen QR e historial) cuando la vista se descarta"""
+        self.current_qr_base64 = ""
+        self.current_qr_data = {}
+        self.current_lote_id = None
+        self.pending_label = None
+        self.qr_image.src_base64 = None
+        self.history_table.rows.clear()
+
+    @batched
     def download_qr(self, e):
         if self.current_qr_data:
             filename = f"QR-{self.current_qr_data['productType']}-{int(datetime.now().timestamp())}.png"
@@ -382,6 +462,20 @@ Ver Dashboard en Vivo:
             except Exception as ex:
                 self.show_snackbar(f"Error al guardar: {ex}", "#d4183d")
 
+    @batched
+    def print_zpl(self, e):
+        """Envía la etiqueta actual en ZPL a la impresora de ZPL_PRINTER"""
+        if not self.current_lote_id:
+            return
+        from src.zpl import send_zpl, zpl_label
+        settings = get_settings()
+        payload = build_qr_payload(self.current_qr_data, f"{self.base_url}/lote/{self.current_lote_id}")
+        try:
+            send_zpl(self.zpl_printer, [zpl_label(self.current_qr_data, payload, settings.zpl_qr, settings.zpl_dpi)])
+            self.show_snackbar(f"🖨️ Etiqueta enviada a {self.zpl_printer}")
+        except OSError as ex:
+            self.show_snackbar(f"Error al imprimir: {ex}", "#d4183d")
+
 
 # --- Esta función NO CAMBIA ---
 def create_generator_view(page: ft.Page, db: DatabaseManager):
@@ -389,7 +483,7 @@ def create_generator_view(page: ft.Page, db: DatabaseManager):
 
     generator_logic = GeneratorPage(page, db)
     generator_logic.update_history_table()
-    if len(db.get_history()) > 0:
+    if len(generator_logic.history_table.rows) > 0:
         generator_logic.history_container.visible = True
 
     if not generator_logic.base_url:
@@ -434,7 +528,7 @@ def create_generator_view(page: ft.Page, db: DatabaseManager):
         ),
     )
 
-    return ft.View(
+    view = ft.View(
         route="/",
         padding=0,
         scroll=ft.ScrollMode.AUTO,
@@ -450,4 +544,7 @@ def create_generator_view(page: ft.Page, db: DatabaseManager):
                 ]
             )
         ]
-    )
\ No newline at end of file
+    )
+    view.refresh = generator_logic.refresh
+    view.dispose = generator_logic.release
+    return view
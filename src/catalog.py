@@ -0,0 +1,119 @@
+"""
+Catálogos compartidos por todas las sesiones del proceso.
+
+Operadores, productos y proveedores se cargan una vez en un snapshot inmutable (tuplas de
+strings internados) que todas las sesiones leen sin copiarlo. Cuando el catálogo cambia se
+construye un snapshot nuevo y se reemplaza la referencia de una sola vez: quien ya tenía el
+anterior lo sigue usando sin bloqueos.
+"""
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+from src.events import get_event_bus, TOPIC_CACHE
+from src.settings import get_settings
+from src.shared_state import PROCESS_ID
+
+# Respaldo por si se pierde una invalidación (p. ej. un operador nuevo creado en otro worker)
+CATALOG_MAX_AGE = 300
+
+
+def _intern_all(values):
+    return tuple(sys.intern(v) for v in values if isinstance(v, str) and v)
+
+
+class CatalogSnapshot:
+    """Vista de solo lectura de los catálogos en un momento dado"""
+
+    __slots__ = ("operators", "operator_codes", "code_by_operator", "operator_by_code",
+                 "products", "suppliers", "loaded_at")
+
+    def __init__(self, operators=None, products=(), suppliers=()):
+        operators = {sys.intern(n): sys.intern(c) for n, c in (operators or {}).items() if n and c}
+        self.code_by_operator = MappingProxyType(operators)
+        self.operator_by_code = MappingProxyType({c: n for n, c in operators.items()})
+        self.operators = tuple(operators)
+        self.operator_codes = tuple(operators.values())
+        self.products = _intern_all(products)
+        self.suppliers = _intern_all(suppliers)
+        self.loaded_at = time.monotonic()
+
+
+EMPTY_CATALOG = CatalogSnapshot()
+
+
+class CatalogStore:
+    """
+    Mantiene el snapshot vigente. Si está marcado como viejo, el primer hilo que lo pide
+    lo reconstruye; los demás siguen con el anterior mientras tanto.
+    """
+
+    def __init__(self, load_lists=True, max_age=CATALOG_MAX_AGE):
+        self.load_lists = load_lists
+        self.max_age = max_age
+        self._snapshot = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def get(self, db):
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and time.monotonic() - snapshot.loaded_at < self.max_age:
+            return snapshot
+        if snapshot is None:
+            with self._lock:  # primera carga: los demás esperan a que termine
+                if self._snapshot is None:
+                    self._reload(db)
+            return self._snapshot
+        if self._lock.acquire(blocking=False):
+            try:
+                self._reload(db)
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def _reload(self, db):
+        self._stale = False
+        try:
+            self._snapshot = CatalogSnapshot(
+                operators=db.get_operators(),
+                products=db.get_products() if self.load_lists else (),
+                suppliers=db.get_suppliers() if self.load_lists else (),
+            )
+        except Exception as e:
+            # Se mantiene el snapshot anterior (o uno vacío) y se reintenta en la próxima lectura
+            print(f"Error al cargar los catálogos: {e}")
+            self._stale = True
+            if self._snapshot is None:
+                self._snapshot = EMPTY_CATALOG
+
+    def invalidate(self):
+        self._stale = True
+
+    def note_operator(self, name, code):
+        """Un operador nuevo (o con código nuevo) vuelve viejo el snapshot"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.code_by_operator.get(name) != code:
+            self.invalidate()
+            # Los demás workers también deben recargarlo
+            get_event_bus().publish(TOPIC_CACHE, {"cache": "catalogo", "coleccion": "operadores", "origen": PROCESS_ID})
+
+
+_catalog_store = None
+_catalog_store_lock = threading.Lock()
+
+
+def _on_cache_event(event):
+    if event.get("cache") == "catalogo":
+        _catalog_store.invalidate()
+
+
+def get_catalog_store():
+    """Catálogos compartidos del proceso; se invalidan con los cambios de catálogo de cualquier worker"""
+    global _catalog_store
+    if _catalog_store is None:
+        with _catalog_store_lock:
+            if _catalog_store is None:
+                _catalog_store = CatalogStore(load_lists=not get_settings().server_side_search)
+                get_event_bus().subscribe(TOPIC_CACHE, _on_cache_event)
+    return _catalog_store
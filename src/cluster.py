@@ -0,0 +1,154 @@
+"""
+Modo clúster: N workers de la app detrás de un proxy TCP local con sesiones pegajosas.
+
+Uso:
+    python -m src.cluster --workers 4 --port 8550
+
+Cada worker es `main.py` servido por uvicorn en su propio puerto (8551, 8552, ...) y su propio
+proceso, así que usa su propio núcleo. El proxy acepta las conexiones en --port y las reenvía
+byte a byte (HTTP y websocket por igual). Con --balance ip (por defecto) un mismo cliente
+siempre llega al mismo worker, de modo que al reconectar el websocket de Flet encuentra su sesión.
+
+El estado entre sesiones (bus de eventos, caché de estadísticas, invalidación de cachés) debe
+ser compartido: los workers se lanzan con SHARED_STATE=mongo.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import os
+import subprocess
+import sys
+
+PROXY_BUFFER = 64 * 1024
+WORKER_RESTART_DELAY = 2
+
+
+def run_worker(port):
+    """Proceso worker: la misma app de main.py en un puerto interno"""
+    import uvicorn
+    from main import main
+    from src.scan_server import create_asgi_app
+    uvicorn.run(create_asgi_app(main), host="127.0.0.1", port=port, log_level="warning")
+
+
+class Cluster:
+    """Lanza y supervisa los workers y hace de proxy hacia ellos"""
+
+    def __init__(self, workers, port, host="0.0.0.0", balance="ip"):
+        self.host = host
+        self.port = port
+        self.balance = balance
+        self.worker_ports = [port + 1 + i for i in range(workers)]
+        self.procesos = {}
+        self._turno = itertools.count()
+
+    # --- Workers ---
+
+    def _start_worker(self, worker_port):
+        env = {**os.environ, "SHARED_STATE": "mongo"}
+        self.procesos[worker_port] = subprocess.Popen(
+            [sys.executable, "-m", "src.cluster", "worker", "--port", str(worker_port)],
+            env=env,
+        )
+
+    async def _supervise(self):
+        """Reinicia los workers que terminan (un fallo no deja el puerto sin atender)"""
+        while True:
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+            for worker_port, proceso in list(self.procesos.items()):
+                if proceso.poll() is not None:
+                    print(f"⚠️ Worker :{worker_port} terminó (código {proceso.returncode}); reiniciando")
+                    self._start_worker(worker_port)
+
+    def stop(self):
+        for proceso in self.procesos.values():
+            proceso.terminate()
+        for proceso in self.procesos.values():
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+    # --- Proxy ---
+
+    def _candidates(self, peer_ip):
+        """Orden de workers a probar: el elegido primero y el resto como respaldo"""
+        n = len(self.worker_ports)
+        if self.balance == "ip":
+            inicio = int(hashlib.md5(peer_ip.encode()).hexdigest(), 16) % n
+        else:
+            inicio = next(self._turno) % n
+        return [self.worker_ports[(inicio + i) % n] for i in range(n)]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(PROXY_BUFFER)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _handle(self, client_reader, client_writer):
+        peer_ip = (client_writer.get_extra_info("peername") or ("?",))[0]
+        for worker_port in self._candidates(peer_ip):
+            try:
+                worker_reader, worker_writer = await asyncio.open_connection("127.0.0.1", worker_port)
+                break
+            except OSError:
+                continue  # worker caído o reiniciando: se prueba el siguiente
+        else:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            self._pipe(client_reader, worker_writer),
+            self._pipe(worker_reader, client_writer),
+        )
+
+    async def serve(self):
+        for worker_port in self.worker_ports:
+            self._start_worker(worker_port)
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"✅ Clúster: {len(self.worker_ports)} workers en :{self.worker_ports[0]}-{self.worker_ports[-1]}, "
+              f"proxy en {self.host}:{self.port} (balance={self.balance})")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._supervise())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.cluster", description="LoteTracker con varios workers")
+    sub = parser.add_subparsers(dest="comando")
+
+    worker = sub.add_parser("worker", help="Proceso worker (lo lanza el clúster)")
+    worker.add_argument("--port", type=int, required=True)
+
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Número de workers")
+    parser.add_argument("--port", type=int, default=8550, help="Puerto público del proxy")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--balance", choices=("ip", "round_robin"), default="ip",
+                        help="ip: sesiones pegajosas por IP del cliente; round_robin: por conexión (benchmarks)")
+    args = parser.parse_args(argv)
+
+    if args.comando == "worker":
+        run_worker(args.port)
+        return
+
+    cluster = Cluster(args.workers, args.port, host=args.host, balance=args.balance)
+    try:
+        asyncio.run(cluster.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cluster.stop()
+
+
+if __name__ == "__main__":
+    main()
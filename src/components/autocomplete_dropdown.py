@@ -1,6 +1,11 @@
+from itertools import compress, islice, repeat
+from operator import contains
+
 import flet as ft
+from src.storage import CATALOG_SEARCH_LIMIT
+from src.utils import normalize_key
 
-def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
+def create_autocomplete_dropdown(label, hint_text, options=None, on_change=None, search=None):
     """
     Crea un TextField con autocompletado tipo combo box que:
     - Muestra todas las opciones al hacer clic
@@ -10,13 +15,19 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
     Args:
         label: Etiqueta del campo
         hint_text: Texto de ayuda
-        options: Lista de opciones para sugerir
+        options: Lista de opciones para sugerir (modo en memoria), o función sin argumentos
+            que la retorna (p. ej. el snapshot vigente del catálogo compartido)
         on_change: Función callback cuando cambia el valor
+        search: Función search(texto) -> lista de sugerencias. Si se indica,
+            se usa en lugar de `options` (modo búsqueda en el servidor)
     
     Returns:
         TextField con funcionalidad de combo box
     """
-    
+    get_options = options if callable(options) else (lambda: options or [])
+    # Claves normalizadas de las opciones, recalculadas solo cuando cambia la lista (nuevo snapshot)
+    claves_cache = {"options": None, "claves": ()}
+
     # TextField principal que permite entrada libre
     text_field = ft.TextField(
         label=label,
@@ -51,15 +62,34 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
         height=0,
     )
     
-    def show_all_options():
-        """Muestra todas las opciones disponibles"""
-        if not options or len(options) == 0:
-            return
-        
+    def get_claves(options):
+        if claves_cache["options"] is not options:
+            claves_cache["claves"] = tuple(normalize_key(opt) for opt in options)
+            claves_cache["options"] = options
+        return claves_cache["claves"]
+
+    def get_matches(query):
+        """
+        Devuelve hasta CATALOG_SEARCH_LIMIT coincidencias, en memoria o consultando al servidor.
+        En memoria el texto puede estar en cualquier parte del nombre ("012" encuentra "OP-012"),
+        sin distinguir mayúsculas ni tildes; `search` decide su propia regla (el catálogo del
+        servidor busca por prefijo de la clave, que es lo que su índice resuelve).
+        """
+        if search is not None:
+            return list(search(query))[:CATALOG_SEARCH_LIMIT]
+        options = get_options()
+        texto = normalize_key(query)
+        if not texto:
+            return list(options[:CATALOG_SEARCH_LIMIT])
+        # compress + map(contains) recorre las claves sin un bucle de Python por opción
+        coincidencias = compress(options, map(contains, get_claves(options), repeat(texto)))
+        return list(islice(coincidencias, CATALOG_SEARCH_LIMIT))
+
+    def render_suggestions(items):
+        """Reconstruye la lista de sugerencias con los elementos dados"""
         suggestions_column.controls.clear()
         
-        # Mostrar todas las opciones (máximo 8 para no hacer el dropdown muy largo)
-        for option in options[:8]:
+        for suggestion in items:
             def make_click_handler(text):
                 def handler(e):
                     text_field.value = text
@@ -76,7 +106,7 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
             
             suggestion_item = ft.Container(
                 content=ft.Text(
-                    option, 
+                    suggestion, 
                     size=14, 
                     color="#2D3748",
                     weight=ft.FontWeight.W_400
@@ -84,9 +114,9 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
                 bgcolor="#ffffff",
                 padding=12,
                 border=ft.border.only(bottom=ft.BorderSide(1, "#f0f0f0")),
-                on_click=make_click_handler(option),
+                on_click=make_click_handler(suggestion),
                 ink=True,
-                on_hover=lambda e, item=option: (
+                on_hover=lambda e, item=suggestion: (
                     setattr(e.control, 'bgcolor', '#f7fafc' if e.data == "true" else '#ffffff'),
                     e.control.update()
                 )
@@ -94,10 +124,17 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
             
             suggestions_column.controls.append(suggestion_item)
         
-        # Calcular altura basada en número de opciones
-        num_options = min(len(options), 8)
-        suggestions_container.height = num_options * 45
+        # Calcular altura basada en número de sugerencias
+        suggestions_container.height = len(items) * 45
         suggestions_container.visible = True
+
+    def show_all_options():
+        """Muestra todas las opciones disponibles (máximo 8 para no hacer el dropdown muy largo)"""
+        items = get_matches("")
+        if not items:
+            return
+        
+        render_suggestions(items)
         
         try:
             suggestions_container.update()
@@ -117,51 +154,10 @@ def create_autocomplete_dropdown(label, hint_text, options, on_change=None):
             show_all_options()
         else:
             # Filtrar opciones que coincidan
-            filtered = [opt for opt in options if query in opt.lower()]
+            filtered = get_matches(query)
             
             if filtered and len(filtered) > 0:
-                suggestions_column.controls.clear()
-                
-                # Limitar a 8 sugerencias
-                for suggestion in filtered[:8]:
-                    def make_click_handler(text):
-                        def handler(e):
-                            text_field.value = text
-                            suggestions_container.visible = False
-                            suggestions_container.height = 0
-                            if on_change:
-                                class FakeEvent:
-                                    pass
-                                fake_e = FakeEvent()
-                                on_change(fake_e)
-                            text_field.update()
-                            suggestions_container.update()
-                        return handler
-                    
-                    suggestion_item = ft.Container(
-                        content=ft.Text(
-                            suggestion, 
-                            size=14, 
-                            color="#2D3748",
-                            weight=ft.FontWeight.W_400
-                        ),
-                        bgcolor="#ffffff",
-                        padding=12,
-                        border=ft.border.only(bottom=ft.BorderSide(1, "#f0f0f0")),
-                        on_click=make_click_handler(suggestion),
-                        ink=True,
-                        on_hover=lambda e, item=suggestion: (
-                            setattr(e.control, 'bgcolor', '#f7fafc' if e.data == "true" else '#ffffff'),
-                            e.control.update()
-                        )
-                    )
-                    
-                    suggestions_column.controls.append(suggestion_item)
-                
-                # Calcular altura basada en número de sugerencias
-                num_suggestions = min(len(filtered), 8)
-                suggestions_container.height = num_suggestions * 45
-                suggestions_container.visible = True
+                render_suggestions(filtered)
             else:
                 # No hay coincidencias, ocultar dropdown
                 suggestions_container.visible = False
@@ -1,5 +1,6 @@
 import flet as ft
 from datetime import datetime
+from src.utils import DATE_FORMAT
 
 def create_date_time_picker(on_change=None):
     """
@@ -151,11 +152,11 @@ def create_date_time_picker(on_change=None):
         fill_color="#38A169"
     )
     
-    def get_datetime_string():
-        """Convierte los valores de los campos a string de fecha/hora"""
+    def get_datetime():
+        """Convierte los valores de los campos a un datetime"""
         # Si está marcado "Usar actual", devolver datetime.now() fresco
         if use_current_time_checkbox.value:
-            return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return datetime.now().replace(microsecond=0)
             
         try:
             day = int(day_field.value or 1)
@@ -173,11 +174,14 @@ def create_date_time_picker(on_change=None):
                 hour_24 = 0
             
             # Validar y crear fecha
-            dt = datetime(year, month, day, hour_24, minute, 0)
-            return dt.strftime("%Y-%m-%d %H:%M:%S")
+            return datetime(year, month, day, hour_24, minute, 0)
         except ValueError:
             # Si hay error, retornar fecha/hora actual
-            return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return datetime.now().replace(microsecond=0)
+
+    def get_datetime_string():
+        """Convierte los valores de los campos a string de fecha/hora"""
+        return get_datetime().strftime(DATE_FORMAT)
     
     # Container principal
     container = ft.Container(
@@ -220,6 +224,7 @@ def create_date_time_picker(on_change=None):
     
     # Exponer método para obtener el valor y campos
     container.get_value = get_datetime_string
+    container.get_datetime = get_datetime
     container.day_field = day_field
     container.month_field = month_field
     container.year_field = year_field
@@ -9,7 +9,8 @@ def create_qr_display_card(
     quantity_display,
     supplier_display,
     date_display,
-    download_button_click_handler
+    download_button_click_handler,
+    print_button_click_handler=None
 ):
     """Crea y retorna la Card de display del QR con los controles dados"""
 
@@ -82,6 +83,19 @@ def create_qr_display_card(
                             ),
                             width=300,
                         ),
+                        # Impresión directa en la Zebra (solo con ZPL_PRINTER)
+                        ft.ElevatedButton(
+                            "Imprimir etiqueta (Zebra)",
+                            icon=ft.Icons.PRINT,
+                            on_click=print_button_click_handler,
+                            visible=print_button_click_handler is not None,
+                            style=ft.ButtonStyle(
+                                color="#22543D",
+                                bgcolor="#ffffff",
+                                side=ft.BorderSide(1, "#e0e0e0"),
+                            ),
+                            width=300,
+                        ),
 
                         # 👇 TEXTO DE AYUDA ACTUALIZADO 👇
                         ft.Text(
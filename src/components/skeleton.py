@@ -0,0 +1,37 @@
+# src/components/skeleton.py
+import flet as ft
+
+def create_skeleton_card(lines=4, width=600):
+    """Crea una Card de marcador de posición (barras grises) mientras carga una sección"""
+    bar_widths = [0.9, 0.7, 0.8, 0.6]
+    return ft.Card(
+        elevation=4,
+        content=ft.Container(
+            padding=24,
+            border_radius=16,
+            width=width,
+            bgcolor="#FFFFFF",
+            content=ft.Column(
+                spacing=12,
+                controls=[
+                    ft.Row(
+                        [
+                            ft.Container(width=width * 0.4, height=20, bgcolor="#E6EDF0", border_radius=6),
+                            ft.ProgressRing(width=18, height=18, stroke_width=2, color="#38A169"),
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
+                    ft.Divider(),
+                    *[
+                        ft.Container(
+                            width=(width - 48) * bar_widths[i % len(bar_widths)],
+                            height=14,
+                            bgcolor="#EDF2F7",
+                            border_radius=6,
+                        )
+                        for i in range(lines)
+                    ],
+                ],
+            ),
+        ),
+    )
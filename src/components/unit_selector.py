@@ -1,4 +1,5 @@
 import flet as ft
+from src.units import UNITS, DEFAULT_UNIT
 
 def create_unit_selector(on_change=None):
     """
@@ -11,12 +12,10 @@ def create_unit_selector(on_change=None):
         ft.Dropdown con unidades de medida
     """
     
-    units = ["kg", "libras", "litros", "unidades", "toneladas", "cajas", "sacos"]
-    
     dropdown = ft.Dropdown(
         label="Unidad",
-        value="kg",  # Valor por defecto
-        options=[ft.dropdown.Option(unit) for unit in units],
+        value=DEFAULT_UNIT,  # Valor por defecto
+        options=[ft.dropdown.Option(unit) for unit in UNITS],
         bgcolor="#f3f3f5",
         border_color="#e0e0e0",
         focused_border_color="#38A169",
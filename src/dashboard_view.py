@@ -1,9 +1,27 @@
+import threading
+import time
+from datetime import date, timedelta
 import flet as ft
-from src.database_manager import DatabaseManager
+from src.database_manager import DatabaseManager, DASHBOARD_TOP_N, PRODUCTION_CHART_DAYS
+from src.events import get_event_bus, TOPIC_STOCK
+from src.ui_batch import batch_updates, request_update
+from src.metrics import span
+from src.components.skeleton import create_skeleton_card
+
+# Espera antes de recargar el gráfico de stock cuando un evento cambia "Otros" (agrupa ráfagas)
+STATS_RELOAD_DELAY = 2.0
+MSG_LOTE_NO_ENCONTRADO = "❌ Error: Lote no encontrado. Es posible que el ID no exista o sea incorrecto."
+MSG_LOTE_SIN_DB = "⚠️ No se pudo consultar el lote (base de datos no disponible). Intenta de nuevo en unos segundos."
 
 def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
     """
     Crea la vista del Dashboard corregida y compatible con Flet.
+
+    La vista se retorna de inmediato con marcadores de posición; los datos se cargan
+    después con `view.load_data()` (el enrutador lo lanza en segundo plano una vez montada):
+    primero el lote y luego las estadísticas, cada sección con su propio manejo de errores.
+    `view.refresh()` vuelve a cargar los datos de una vista reutilizada desde la caché de rutas.
+    Mientras la vista existe, los eventos de stock del bus se aplican como deltas (sin recargar).
     """
 
     # Colores (hex para evitar problemas con constantes no disponibles)
@@ -12,6 +30,7 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
     COLOR_BORDER = "#E6EDF0"
     COLOR_BAR_COLORS = ["#48BB78", "#4299E1", "#F6AD55", "#F56565"]
     COLOR_ERROR = "#D53F3F"
+    COLOR_OTROS = "#A0AEC0"
 
     # --- Controles de texto (referencias) ---
     product_txt = ft.Text("N/A", size=14)
@@ -26,11 +45,11 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
     total_lotes_txt = ft.Text("0", size=14)
 
     # Un contenedor donde pondremos las barras (se actualizará más abajo)
-    bars_row = ft.Row(spacing=12, alignment=ft.MainAxisAlignment.CENTER)
+    bars_row = ft.Row(spacing=12, alignment=ft.MainAxisAlignment.CENTER, scroll=ft.ScrollMode.AUTO)
 
     # Error text
     error_text = ft.Text(
-        "❌ Error: Lote no encontrado. Es posible que el ID no exista o sea incorrecto.",
+        MSG_LOTE_NO_ENCONTRADO,
         size=14,
         color=COLOR_ERROR,
         weight=ft.FontWeight.BOLD,
@@ -64,8 +83,21 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
         )
     )
 
+    # --- Marcadores de posición mientras cargan las secciones ---
+    lote_skeleton = create_skeleton_card(lines=8)
+    lote_skeleton.visible = bool(lote_id)
+    stats_skeleton = create_skeleton_card(lines=4)
+
+    stats_error = ft.Text(
+        "⚠️ No se pudieron cargar las estadísticas. Intente recargar más tarde.",
+        size=14,
+        color=COLOR_ERROR,
+        visible=False
+    )
+
     # --- Stats card (total + gráfico simple) ---
     stats_card = ft.Card(
+        visible=False,
         elevation=4,
         content=ft.Container(
             padding=24,
@@ -81,7 +113,7 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
                         ft.Text("Total de Lotes Registrados:", weight=ft.FontWeight.BOLD),
                         total_lotes_txt
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                    ft.Text("Stock Total por Producto:", weight=ft.FontWeight.BOLD),
+                    ft.Text(f"Stock Total por Producto (top {DASHBOARD_TOP_N}):", weight=ft.FontWeight.BOLD),
                     ft.Container(  # contenedor del "chart"
                         padding=12,
                         border_radius=8,
@@ -97,13 +129,37 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
         )
     )
 
+    # --- Producción por día (totales diarios de produccion_diaria) ---
+    produccion_row = ft.Row(
+        spacing=6, alignment=ft.MainAxisAlignment.CENTER, vertical_alignment=ft.CrossAxisAlignment.END
+    )
+    produccion_card = ft.Card(
+        visible=False,
+        elevation=4,
+        content=ft.Container(
+            padding=24,
+            border_radius=16,
+            width=600,
+            bgcolor=COLOR_CARD_BG,
+            content=ft.Column(
+                spacing=12,
+                controls=[
+                    ft.Text(f"Lotes producidos (últimos {PRODUCTION_CHART_DAYS} días)", size=20,
+                            weight=ft.FontWeight.W_500, color=COLOR_PRIMARY),
+                    ft.Divider(),
+                    ft.Container(padding=12, border_radius=8, bgcolor="#FAFAFA", content=produccion_row),
+                ]
+            )
+        )
+    )
+
     # --- Funciones para cargar datos ---
-    def load_lote_data(lote_id_param):
-        lote_data = db.get_lote_by_id(lote_id_param)
+    def show_lote(lote_data, mensaje=MSG_LOTE_NO_ENCONTRADO):
         if lote_data:
             product_txt.value = lote_data.get("productType", "N/A")
             estado_txt.value = lote_data.get("estado", "N/A")
             cant_inicial_txt.value = str(lote_data.get("cantidad_inicial", "0"))
+            medida_txt.value = lote_data.get("unit", "Unidades")
             cant_restante_txt.value = str(lote_data.get("cantidad_restante", "0"))
             proveedor_txt.value = lote_data.get("supplier", "N/A")
             operador_txt.value = lote_data.get("operatorName", "N/A")
@@ -112,45 +168,225 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
             error_text.visible = False
         else:
             lote_card.visible = False
+            error_text.value = mensaje
             error_text.visible = True
-        # actualizar UI
-        page.update()
 
-    def load_stats_data():
-        stats = db.get_dashboard_stats()
-        total_lotes = stats.get("total_lotes", 0)
-        total_lotes_txt.value = str(total_lotes)
+    def load_lote_data(lote_id_param):
+        try:
+            with span("db_read"):
+                lote_data = db.get_lote_by_id(lote_id_param)
+            show_lote(lote_data)
+        except Exception as ex:
+            # Un fallo del lote no impide que carguen las estadísticas
+            print(f"Error al cargar el lote: {ex}")
+            show_lote(None, MSG_LOTE_SIN_DB)
+        lote_skeleton.visible = False
+        # actualizar solo esta sección
+        request_update(page, lote_skeleton, lote_card, error_text)
 
-        stock_list = stats.get("stock_por_producto", [])
-        # calcular máximo para escala
-        max_qty = max([item.get("cantidad_total", 0) for item in stock_list], default=1)
+    # Estado del gráfico: (productKey, unidad) -> {"producto", "cantidad"} para los top-N,
+    # y unidad -> {"cantidad", "productos"} para el resto ("Otros").
+    # Se llena con la agregación y luego se mantiene con los eventos de stock.
+    stock_state = {}
+    otros_state = {}
+    stats_state = {"total": 0, "loaded": False, "desde": 0, "recarga": None}
+    stats_lock = threading.Lock()
 
-        # reconstruir barras
-        bars_row.controls.clear()
-        for i, item in enumerate(stock_list):
-            qty = item.get("cantidad_total", 0)
-            # escala de altura entre 30 y 140 px
-            height = 30 if max_qty == 0 else int(30 + (qty / max_qty) * 110)
-            color = COLOR_BAR_COLORS[i % len(COLOR_BAR_COLORS)]
-            label = str(item.get("_id", "producto"))
-            bar = ft.Column(
-                [
-                    ft.Container(width=36, height=height, bgcolor=color, border_radius=6),
-                    ft.Text(label, size=12, text_align=ft.TextAlign.CENTER),
-                    ft.Text(str(qty), size=11, color="#4A5568", text_align=ft.TextAlign.CENTER)
-                ],
+    # Barras reutilizables: se crean una vez y en cada refresco solo cambian sus propiedades,
+    # así el árbol de controles del gráfico no crece con el tamaño del catálogo.
+    bar_pool = []
+
+    def get_bar(i):
+        while len(bar_pool) <= i:
+            rect = ft.Container(width=36, height=30, border_radius=6)
+            label = ft.Text("", size=12, text_align=ft.TextAlign.CENTER)
+            qty_text = ft.Text("", size=11, color="#4A5568", text_align=ft.TextAlign.CENTER)
+            column = ft.Column(
+                [rect, label, qty_text],
                 spacing=6,
                 alignment=ft.MainAxisAlignment.END,
                 horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                visible=False,
+            )
+            bar_pool.append((column, rect, label, qty_text))
+            bars_row.controls.append(column)
+        return bar_pool[i]
+
+    def render_bars():
+        """Dibuja las barras a partir de stock_state y otros_state"""
+        items = [
+            (item["producto"], item["cantidad"], unidad, COLOR_BAR_COLORS[i % len(COLOR_BAR_COLORS)])
+            for i, ((_, unidad), item) in enumerate(
+                sorted(stock_state.items(), key=lambda kv: -kv[1]["cantidad"])
             )
-            bars_row.controls.append(bar)
+        ]
+        items += [
+            (f"Otros ({otro['productos']})", otro["cantidad"], unidad, COLOR_OTROS)
+            for unidad, otro in sorted(otros_state.items(), key=lambda kv: -kv[1]["cantidad"])
+            if otro["cantidad"] > 0
+        ]
+        # calcular máximo para escala
+        max_qty = max([qty for _, qty, _, _ in items], default=1)
+
+        for i, (producto, qty, unidad, color) in enumerate(items):
+            column, rect, label, qty_text = get_bar(i)
+            # escala de altura entre 30 y 140 px
+            rect.height = 30 if max_qty == 0 else int(30 + (qty / max_qty) * 110)
+            rect.bgcolor = color
+            label.value = producto
+            qty_text.value = f"{qty:g} {unidad or ''}".strip()
+            column.visible = True
+        for column, _, _, _ in bar_pool[len(items):]:
+            column.visible = False
+
+    # Lotes por día (date -> n) y una columna fija por día del gráfico
+    produccion_state = {"dias": {}, "loaded": False}
+    produccion_pool = []
 
-        page.update()
+    def render_produccion():
+        """Dibuja los últimos PRODUCTION_CHART_DAYS días a partir de produccion_state"""
+        hoy = date.today()
+        dias = [hoy - timedelta(days=i) for i in range(PRODUCTION_CHART_DAYS - 1, -1, -1)]
+        max_lotes = max([produccion_state["dias"].get(d, 0) for d in dias] + [1])
+        while len(produccion_pool) < len(dias):
+            rect = ft.Container(width=22, border_radius=4, bgcolor=COLOR_BAR_COLORS[1])
+            cantidad = ft.Text("", size=10, color="#4A5568")
+            etiqueta = ft.Text("", size=10)
+            produccion_pool.append((rect, cantidad, etiqueta))
+            produccion_row.controls.append(ft.Column(
+                [cantidad, rect, etiqueta], spacing=4, horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            ))
+        for (rect, cantidad, etiqueta), dia in zip(produccion_pool, dias):
+            lotes = produccion_state["dias"].get(dia, 0)
+            rect.height = 4 + int(lotes / max_lotes * 100)
+            cantidad.value = str(lotes)
+            etiqueta.value = dia.strftime("%d/%m")
 
-    # --- Carga inicial ---
-    if lote_id:
-        load_lote_data(lote_id)
-    load_stats_data()
+    def schedule_stats_reload():
+        """Una recarga de las estadísticas por ráfaga de eventos (se llama con stats_lock tomado)"""
+        if stats_state["recarga"] is None:
+            timer = threading.Timer(STATS_RELOAD_DELAY, reload_stats)
+            timer.daemon = True
+            stats_state["recarga"] = timer
+            timer.start()
+
+    def reload_stats():
+        with stats_lock:
+            stats_state["recarga"] = None
+        with batch_updates(page, "reload_stats"):
+            load_stats_data()
+
+    def on_stock_event(event):
+        """Aplica el delta de un evento de stock sin volver a consultar la base de datos"""
+        # La vista puede estar en la caché de rutas sin estar montada: el lote no envía
+        # sus controles, el estado queda actualizado y se mostrará cuando vuelva a verse
+        with batch_updates(page, "on_stock_event"):
+            apply_stock_event(event)
+
+    def apply_stock_event(event):
+        with stats_lock:
+            # Eventos anteriores a la agregación ya están incluidos en ella
+            if not stats_state["loaded"] or event.get("ts", 0) < stats_state["desde"]:
+                return
+            if event["tipo"] == "lote_creado":
+                stats_state["total"] += 1
+                total_lotes_txt.value = str(stats_state["total"])
+                if produccion_state["loaded"] and event.get("dia"):
+                    dia = date.fromisoformat(event["dia"])
+                    produccion_state["dias"][dia] = produccion_state["dias"].get(dia, 0) + 1
+                    render_produccion()
+            key = (event.get("productKey"), event.get("unidad"))
+            if key in stock_state or len(stock_state) < DASHBOARD_TOP_N:
+                item = stock_state.setdefault(key, {"producto": event.get("producto") or key[0], "cantidad": 0})
+                item["cantidad"] = round(item["cantidad"] + event.get("delta", 0), 2)
+                if item["cantidad"] <= 0:
+                    del stock_state[key]
+                    if otros_state:
+                        # Queda un hueco en el top-N que debe ocupar el primero de "Otros"
+                        schedule_stats_reload()
+            else:
+                # Fuera del top-N el delta va a "Otros" en el momento, pero cuántos productos
+                # hay en "Otros" solo lo sabe la agregación (uno nuevo lo aumenta, uno agotado
+                # lo reduce): el gráfico se marca como viejo y se recarga
+                otro = otros_state.setdefault(key[1], {"cantidad": 0, "productos": 0})
+                otro["cantidad"] = round(otro["cantidad"] + event.get("delta", 0), 2)
+                schedule_stats_reload()
+            render_bars()
+        request_update(page, total_lotes_txt, bars_row, produccion_row)
+
+        if lote_id and event.get("lote_id") == lote_id and event["tipo"] == "despacho":
+            if "restante" in event:
+                cant_restante_txt.value = str(event["restante"])
+                estado_txt.value = event.get("estado", estado_txt.value)
+            else:
+                show_lote(db.get_lote_by_id(lote_id))
+            request_update(page, lote_card)
+
+    unsubscribe_stock = get_event_bus().subscribe(TOPIC_STOCK, on_stock_event)
+
+    def load_stats_data():
+        consulta_desde = time.time()
+        try:
+            with span("db_read"):
+                stats = db.get_dashboard_stats()
+        except Exception as ex:
+            print(f"Error al cargar estadísticas: {ex}")
+            stats_skeleton.visible = False
+            stats_error.visible = True
+            request_update(page, stats_skeleton, stats_error)
+            return
+        with stats_lock:
+            stats_state["total"] = stats.get("total_lotes", 0)
+            total_lotes_txt.value = str(stats_state["total"])
+            stock_state.clear()
+            for item in stats.get("stock_por_producto", []):
+                key = (item.get("productKey"), item.get("unidad"))
+                stock_state[key] = {
+                    "producto": str(item.get("producto") or item.get("productKey") or "producto"),
+                    "cantidad": item.get("cantidad_total", 0),
+                }
+            otros_state.clear()
+            for otro in stats.get("otros", []):
+                otros_state[otro.get("unidad")] = {
+                    "cantidad": otro.get("cantidad_total", 0),
+                    "productos": otro.get("productos", 0),
+                }
+            with span("render_bars"):
+                render_bars()
+            stats_state["loaded"] = True
+            stats_state["desde"] = consulta_desde
+
+        stats_skeleton.visible = False
+        stats_card.visible = True
+        request_update(page, stats_skeleton, stats_card)
+
+    def load_production_data():
+        try:
+            with span("db_read"):
+                serie = db.get_daily_lots(PRODUCTION_CHART_DAYS)
+        except Exception as ex:
+            # El gráfico es secundario: si falla (p. ej. rollup sin MongoDB 5) no se muestra
+            print(f"Error al cargar la producción diaria: {ex}")
+            produccion_card.visible = False
+            request_update(page, produccion_card)
+            return
+        with stats_lock:
+            produccion_state["dias"] = {d["dia"].date(): d["lotes"] for d in serie}
+            produccion_state["loaded"] = True
+            render_produccion()
+        produccion_card.visible = True
+        request_update(page, produccion_card)
+
+    def load_sections():
+        """Carga progresiva: primero el lote (lo que busca quien escanea), después las estadísticas"""
+        # Un lote por sección: cada una se envía en cuanto está lista
+        if lote_id:
+            with batch_updates(page, "load_lote"):
+                load_lote_data(lote_id)
+        with batch_updates(page, "load_stats"):
+            load_stats_data()
+        with batch_updates(page, "load_production"):
+            load_production_data()
 
     # --- Construir content principal ---
     header_text = f"Detalle del Lote: {lote_id}" if lote_id else "Dashboard General"
@@ -175,15 +411,26 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
             controls=[
                 ft.Text(header_text, size=16, italic=True),
                 error_text,
+                lote_skeleton,
                 lote_card,
-                stats_card
+                stats_skeleton,
+                stats_error,
+                stats_card,
+                produccion_card,
             ],
         ),
     )
 
-    return ft.View(
+    view = ft.View(
         route=f"/lote/{lote_id}" if lote_id else "/dashboard",
-        appbar=ft.AppBar(title=ft.Text("Dashboard de Trazabilidad"), bgcolor="#C6F6D5"),
+        appbar=ft.AppBar(
+            title=ft.Text("Dashboard de Trazabilidad"),
+            bgcolor="#C6F6D5",
+            actions=[
+                # La vista se reutiliza desde la caché de rutas: los datos se refrescan a pedido
+                ft.IconButton(ft.Icons.REFRESH, tooltip="Actualizar", on_click=lambda e: page.run_thread(load_sections)),
+            ],
+        ),
         padding=0,
         scroll=ft.ScrollMode.AUTO,
         controls=[
@@ -197,3 +444,15 @@ def create_dashboard_view(page: ft.Page, db: DatabaseManager, lote_id=None):
             )
         ]
     )
+    view.load_data = load_sections
+    view.refresh = load_sections
+    def dispose():
+        # Al salir de la caché de rutas o cerrar la sesión se deja de escuchar el bus
+        unsubscribe_stock()
+        with stats_lock:
+            if stats_state["recarga"] is not None:
+                stats_state["recarga"].cancel()
+                stats_state["recarga"] = None
+
+    view.dispose = dispose
+    return view
@@ -1,32 +1,132 @@
-import os
-from pymongo import MongoClient, errors
+import heapq
+import re
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+from pymongo import MongoClient, errors, ReturnDocument, UpdateOne, UpdateMany, DeleteMany
 from pymongo.collection import Collection
-from dotenv import load_dotenv
 from bson import ObjectId #Importante para buscar por _id
+from src.cache import LRUCache
+from src.utils import normalize_key, parse_date
+from src.units import UNIT_CONVERSIONS, DEFAULT_UNIT, to_base
+from src.events import get_event_bus, TOPIC_CACHE
+from src.shared_state import PROCESS_ID, get_shared_store
+from src.settings import get_settings
+from src.db_monitoring import get_command_monitor
+from src.storage import (
+    StorageBackend, STORAGE_MONGO, STORAGE_SQLITE, CATALOG_SEARCH_LIMIT, DASHBOARD_TOP_N,
+    PRODUCTION_CHART_DAYS, ESTADO_DESPACHO_PARCIAL, ESTADO_DESPACHADO,
+    STATS_CACHE_TTL, STATS_CACHE_PREFIX, _broadcast_invalidation,
+)
 
-class DatabaseManager:
+# Caché por proceso de las últimas búsquedas de catálogo: {(colección, prefijo): [nombres]}
+_catalog_search_cache = LRUCache(maxsize=512)
+
+# Caché por proceso de lotes por _id (escaneos repetidos del mismo pallet no van a la DB).
+# Los "no encontrado" también se guardan, pero por menos tiempo.
+LOTE_CACHE_SIZE = 4096
+LOTE_CACHE_TTL = 60
+LOTE_CACHE_NOT_FOUND_TTL = 5
+_LOTE_NO_ENCONTRADO = object()
+_lote_cache = LRUCache(maxsize=LOTE_CACHE_SIZE, ttl=LOTE_CACHE_TTL)
+
+# Lotes cerrados y antiguos que archive_closed_lots saca de "registros" (ver get_lote_by_id)
+ARCHIVE_COLLECTION = "registros_archivo"
+# Los totales diarios se recalculan a lo sumo cada ROLLUP_INTERVAL segundos, entre todos los
+# workers (marca con TTL en el almacén compartido), desde el primer día que pudo cambiar
+ROLLUP_INTERVAL = 300
+ROLLUP_MARK = "rollup_produccion"
+# Estado del rollup en MongoDB: primer día calculado, día de la última ejecución y el día más
+# antiguo con lotes nuevos anteriores a ayer (fecha elegida en el formulario o sincronizados tarde)
+ROLLUP_STATE_COLLECTION = "rollup_estado"
+ROLLUP_STATE_ID = "produccion_diaria"
+# Índice por "nombre" con collation (es, strength 1) de versiones anteriores: la búsqueda usa "clave"
+LEGACY_CATALOG_INDEX = "nombre_es_ci"
+
+_cache_listener_lock = threading.Lock()
+_cache_listener_ready = False
+
+
+def _start_of_day(fecha):
+    return datetime(fecha.year, fecha.month, fecha.day)
+
+
+def _date_order(registro):
+    fecha = registro.get("fecha_produccion")
+    # Sin fecha (o sin migrar) van primero, como ordena MongoDB los null frente a las fechas
+    return (True, fecha) if isinstance(fecha, datetime) else (False, datetime.min)
+
+
+def _merge_by_date(cursores):
+    """Intercala cursores ya ordenados por fecha_produccion"""
+    return heapq.merge(*cursores, key=_date_order)
+
+
+def _on_cache_event(event):
+    """Aplica en este proceso las invalidaciones publicadas por otros workers"""
+    if event.get("origen") == PROCESS_ID:
+        return
+    if event.get("cache") == "lotes":
+        _lote_cache.delete(event.get("key"))
+    elif event.get("cache") == "catalogo":
+        coleccion = event.get("coleccion")
+        _catalog_search_cache.invalidate(lambda key: key[0] == coleccion)
+
+
+def _listen_cache_invalidations():
+    global _cache_listener_ready
+    with _cache_listener_lock:
+        if not _cache_listener_ready:
+            get_event_bus().subscribe(TOPIC_CACHE, _on_cache_event)
+            _cache_listener_ready = True
+
+
+class DatabaseManager(StorageBackend):
     """Maneja la conexión y operaciones con MongoDB"""
+
+    backend = STORAGE_MONGO
+
+    # Los índices se crean una sola vez por proceso, no en cada sesión
+    _indexes_ready = False
     
-    def __init__(self):
-        load_dotenv()
-        self.mongo_uri = os.getenv("MONGO_URI")
-        self.db_name = os.getenv("DB_NAME", "lotetracker_db")
+    def __init__(self, client=None, db_name=None):
+        """
+        `client` permite inyectar un cliente ya creado (p. ej. mongomock en los benchmarks);
+        sin él se conecta a MONGO_URI.
+        """
+        settings = get_settings()
+        self.mongo_uri = settings.mongo_uri
+        self.db_name = db_name or settings.db_name
         
-        if not self.mongo_uri:
+        if client is None and not self.mongo_uri:
             print("Error: MONGO_URI no encontrada. Asegúrate de crear un archivo .env")
             self.client = None
             self.db = None
             return
 
         try:
-            self.client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000)
-            self.client.server_info()
-            print(f"✅ Conectado exitosamente a MongoDB en {self.db_name}")
+            if client is None:
+                # DB_MONITORING=1: duración de cada comando, log de lentos y explain opcional
+                monitor = get_command_monitor()
+                self.client = MongoClient(
+                    self.mongo_uri, serverSelectionTimeoutMS=5000,
+                    event_listeners=[monitor] if monitor else None,
+                )
+                if monitor:
+                    monitor.client = self.client
+                self.client.server_info()
+                print(f"✅ Conectado exitosamente a MongoDB en {self.db_name}")
+            else:
+                self.client = client
             
             self.db = self.client[self.db_name]
             self.registros: Collection = self.db.registros
             self.productos: Collection = self.db.productos
             self.proveedores: Collection = self.db.proveedores
+            self.movimientos: Collection = self.db.movimientos
+            self.archivo: Collection = self.db[ARCHIVE_COLLECTION]
+            self._ensure_indexes()
+            _listen_cache_invalidations()
             
         except errors.ServerSelectionTimeoutError as err:
             print(f"❌ Error de conexión a MongoDB: {err}")
@@ -37,84 +137,357 @@ class DatabaseManager:
             self.client = None
             self.db = None
 
-    def add_product(self, product_name):
-        if self.db is None: return
-        self.productos.find_one_and_update(
-            {"nombre": product_name},
-            {"$set": {"nombre": product_name}},
-            upsert=True
+    def is_available(self):
+        return self.db is not None
+
+    def warm_up(self):
+        if self.client is not None:
+            self.client.admin.command("ping")
+
+    def _ensure_indexes(self):
+        """Crea los índices necesarios (idempotente, una vez por proceso)"""
+        if DatabaseManager._indexes_ready:
+            return
+        for coleccion in (self.productos, self.proveedores):
+            if LEGACY_CATALOG_INDEX in coleccion.index_information():
+                coleccion.drop_index(LEGACY_CATALOG_INDEX)
+            # Único y parcial: los documentos aún sin migrar (sin clave) no bloquean el índice
+            coleccion.create_index(
+                "clave",
+                unique=True,
+                partialFilterExpression={"clave": {"$type": "string"}},
+                name="clave_unica"
+            )
+        self.registros.create_index("productKey")
+        self.registros.create_index("supplierKey")
+        self.registros.create_index("fecha_produccion")
+        self.registros.create_index([("productKey", 1), ("fecha_produccion", 1)])
+        # Cubre el $match + $group del stock: no hace falta leer los documentos completos
+        self.registros.create_index(
+            [("cantidad_base_restante", 1), ("productKey", 1), ("unidad_base", 1)]
         )
+        # El $unionWith de rollup_production filtra el archivo por fecha: sin índice lo leería entero
+        self.archivo.create_index("fecha_produccion")
+        self.db.produccion_diaria.create_index("_id.dia")
+        self.movimientos.create_index([("lote_id", 1), ("fecha", 1)])
+        DatabaseManager._indexes_ready = True
 
-    def add_supplier(self, supplier_name):
-        if self.db is None: return
-        self.proveedores.find_one_and_update(
-            {"nombre": supplier_name},
-            {"$set": {"nombre": supplier_name}},
-            upsert=True
+    def _upsert_catalog(self, coleccion, name):
+        """
+        Inserta el nombre en el catálogo si su clave normalizada no existe.
+        Retorna el nombre canónico guardado ("curcuma" -> "Cúrcuma" si ya existía así).
+        """
+        clave = normalize_key(name)
+        if not clave:
+            return name
+        nombre = " ".join(name.split())
+        # BEFORE: si no existía retorna None, y solo entonces hay que invalidar las cachés
+        doc = coleccion.find_one_and_update(
+            {"clave": clave},
+            {"$setOnInsert": {"clave": clave, "nombre": nombre}},
+            upsert=True,
+            projection={"nombre": 1, "_id": 0},
+            return_document=ReturnDocument.BEFORE
         )
+        if doc is None:
+            self._invalidate_catalog(coleccion.name)
+            return nombre
+        return doc["nombre"]
+
+    def _invalidate_catalog(self, nombre_coleccion):
+        _catalog_search_cache.invalidate(lambda key: key[0] == nombre_coleccion)
+        _broadcast_invalidation("catalogo", coleccion=nombre_coleccion)
+
+    def add_product(self, product_name):
+        """Registra el producto (deduplicado por clave) y retorna su nombre canónico"""
+        if self.db is None: return product_name
+        return self._upsert_catalog(self.productos, product_name)
+
+    def add_supplier(self, supplier_name):
+        """Registra el proveedor (deduplicado por clave) y retorna su nombre canónico"""
+        if self.db is None: return supplier_name
+        return self._upsert_catalog(self.proveedores, supplier_name)
 
     def add_history_record(self, record):
         """Añade un nuevo registro de QR al historial"""
         if self.db is None: return
-        
+
         # NUEVO ESQUEMA: Añadimos los campos de estado y stock
-        try:
-            """
-            #Por el momenot solo nos
-            # interesa extraer el numero poesteriormente y 
-            # Agroamisgo desea se cambia
-            """
-            cantidad_num = float(record.get("quantity", 0).split(" ")[0])
-        except ValueError:
-            cantidad_num = 0.0
-
-        record_con_estado = {
-            **record,
-            "cantidad_inicial": cantidad_num,
-            "cantidad_restante": cantidad_num, # Inicialmente es la misma
-            "estado": "Almacenado" # Estado inicial por defecto
-        }
-        
+        record_con_estado = self.build_lote_document(record)
+
         # Insertamos el documento y retornamos el resultado
-        return self.registros.insert_one(record_con_estado)
+        result = self.registros.insert_one(record_con_estado)
+        self.note_backdated_production(record_con_estado["fecha_produccion"])
+        self._publish_stock_event(
+            "lote_creado", record_con_estado, record_con_estado["cantidad_base_inicial"],
+            dia=record_con_estado["fecha_produccion"].strftime("%Y-%m-%d")
+        )
+        return result
 
     # ⭐️ NUEVO MÉTODO: Para buscar un lote por su ID de MongoDB
     def get_lote_by_id(self, lote_id):
-        """Obtiene un registro de lote específico por su _id"""
+        """
+        Obtiene un registro de lote específico por su _id (pasando por la caché de lotes).
+        Retorna None si no existe; los errores de MongoDB (PyMongoError) se propagan.
+        """
         if self.db is None: return None
-        
+
+        # Un ID mal formado no puede existir: se descarta sin consultar ni ensuciar el log
+        if not ObjectId.is_valid(lote_id):
+            return None
+
+        key = str(lote_id)
+        cached = _lote_cache.get(key)
+        if cached is _LOTE_NO_ENCONTRADO:
+            return None
+        if cached is not None:
+            return dict(cached)  # copia: la entrada de la caché es compartida entre sesiones
+
         try:
             # Convertimos el string del ID a un objeto ObjectId de Mongo
-            oid = ObjectId(lote_id)
-            return self.registros.find_one({"_id": oid})
-        except Exception as e:
+            lote = self.registros.find_one({"_id": ObjectId(lote_id)})
+            if lote is None:
+                # Los QR de lotes ya archivados siguen resolviendo
+                lote = self.archivo.find_one({"_id": ObjectId(lote_id)})
+        except errors.PyMongoError as e:
+            # No se cachean y se propagan: "no existe" y "no se pudo consultar" son respuestas distintas
             print(f"Error al buscar lote por ID: {e}")
+            raise
+
+        if lote is None:
+            _lote_cache.set(key, _LOTE_NO_ENCONTRADO, ttl=LOTE_CACHE_NOT_FOUND_TTL)
             return None
+        _lote_cache.set(key, lote)
+        return dict(lote)
+
+    def get_cache_stats(self):
+        """Contadores (hits/misses/evictions) de las cachés del proceso"""
+        return {
+            "lotes": _lote_cache.stats(),
+            "catalogo": _catalog_search_cache.stats(),
+        }
+
+    def _dispatch_pipeline(self, qty):
+        """
+        Actualización (pipeline) que descuenta `qty` y recalcula el estado en la misma operación.
+        Equivale a un $inc negativo, pero permite derivar "estado" del nuevo stock de forma atómica.
+        """
+        factor = {"$ifNull": ["$factor_base", 1]}
+        return [
+            {"$set": {
+                # Redondeo para que 0.1 + 0.2 no deje restos como 5.5e-17
+                "cantidad_restante": {"$round": [{"$subtract": ["$cantidad_restante", qty]}, 6]},
+                "cantidad_base_restante": {
+                    "$round": [{"$subtract": ["$cantidad_base_restante", {"$multiply": [qty, factor]}]}, 6]
+                },
+            }},
+            {"$set": {
+                "estado": {
+                    "$cond": [{"$lte": ["$cantidad_restante", 0]}, ESTADO_DESPACHADO, ESTADO_DESPACHO_PARCIAL]
+                }
+            }},
+        ]
+
+    @staticmethod
+    def _movement_marker(mov_id):
+        """Etapa de pipeline que añade el id del movimiento a "movimientos_pendientes" """
+        return {"$set": {"movimientos_pendientes": {
+            "$concatArrays": [{"$ifNull": ["$movimientos_pendientes", []]}, [mov_id]]
+        }}}
+
+    def _movement(self, mov_id, lote, qty, operador, restante=None):
+        """Documento del libro de movimientos"""
+        movimiento = {
+            "_id": mov_id,
+            "lote_id": lote["_id"],
+            "tipo": "despacho",
+            "cantidad": qty,
+            "unidad": lote.get("unit"),
+            "cantidad_base": qty * lote.get("factor_base", 1),
+            "operador": operador,
+            "fecha": datetime.now(),
+        }
+        if restante is not None:
+            movimiento["restante"] = restante
+        return movimiento
+
+    def dispatch(self, lote_id, qty, operador=None):
+        """
+        Despacha `qty` (en la unidad del lote) de forma atómica.
+        La guarda cantidad_restante >= qty va en el filtro del mismo find_one_and_update,
+        así dos operadores despachando a la vez nunca venden más de lo que hay.
+        El stock y el libro son dos escrituras: la misma actualización deja el id del movimiento
+        en "movimientos_pendientes" y se retira después de insertarlo, así un lote que conserva
+        la marca señala un despacho que no llegó al libro.
+        Retorna el lote actualizado, o None si no existe o no hay stock suficiente.
+        """
+        if self.db is None: return None
+        if qty <= 0 or not ObjectId.is_valid(lote_id):
+            return None
+
+        mov_id = ObjectId()
+        lote = self.registros.find_one_and_update(
+            {"_id": ObjectId(lote_id), "cantidad_restante": {"$gte": qty}},
+            self._dispatch_pipeline(qty) + [self._movement_marker(mov_id)],
+            projection={"movimientos_pendientes": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if lote is None:
+            return None
+        # El stock cambió: la caché se actualiza con el documento ya modificado
+        _lote_cache.set(str(lote["_id"]), lote)
+        _broadcast_invalidation("lotes", key=str(lote["_id"]))
+
+        movimiento = self._movement(mov_id, lote, qty, operador, restante=lote["cantidad_restante"])
+        self.movimientos.insert_one(movimiento)
+        self.registros.update_one({"_id": lote["_id"]}, {"$pull": {"movimientos_pendientes": mov_id}})
+        self._publish_stock_event(
+            "despacho", lote, -movimiento["cantidad_base"],
+            restante=lote["cantidad_restante"], estado=lote["estado"]
+        )
+        return lote
+
+    def dispatch_many(self, despachos, operador=None):
+        """
+        Despacho masivo en un solo bulk_write. `despachos` es una lista de (lote_id, qty)
+        y cada operación lleva la misma guarda atómica que dispatch().
+        bulk_write no dice qué operaciones coincidieron, así que cada una deja su id de
+        movimiento en "movimientos_pendientes"; con esas marcas se escribe el libro y luego se retiran.
+        Retorna los ids de los movimientos aplicados.
+        """
+        if self.db is None: return []
+
+        operaciones, solicitados, lote_ids = [], {}, set()
+        for lote_id, qty in despachos:
+            if qty <= 0 or not ObjectId.is_valid(lote_id):
+                continue
+            mov_id = ObjectId()
+            solicitados[mov_id] = qty
+            lote_ids.add(ObjectId(lote_id))
+            operaciones.append(UpdateOne(
+                {"_id": ObjectId(lote_id), "cantidad_restante": {"$gte": qty}},
+                self._dispatch_pipeline(qty) + [self._movement_marker(mov_id)]
+            ))
+        if not operaciones:
+            return []
+
+        self.registros.bulk_write(operaciones, ordered=False)
+        for oid in lote_ids:
+            _lote_cache.delete(str(oid))
+            _broadcast_invalidation("lotes", key=str(oid))
+
+        ids = list(solicitados)
+        lote_ids = list(lote_ids)
+        aplicados = self.registros.find(
+            {"_id": {"$in": lote_ids}, "movimientos_pendientes": {"$in": ids}},
+            {"movimientos_pendientes": 1, "unit": 1, "factor_base": 1,
+             "productKey": 1, "productType": 1, "unidad_base": 1}
+        )
+        libro, lotes_del_libro = [], []
+        for lote in aplicados:
+            for mov_id in lote["movimientos_pendientes"]:
+                if mov_id in solicitados:
+                    libro.append(self._movement(mov_id, lote, solicitados[mov_id], operador))
+                    lotes_del_libro.append(lote)
+        if libro:
+            self.movimientos.insert_many(libro, ordered=False)
+        for lote, movimiento in zip(lotes_del_libro, libro):
+            self._publish_stock_event("despacho", lote, -movimiento["cantidad_base"])
+        self.registros.update_many(
+            {"_id": {"$in": lote_ids}},
+            {"$pull": {"movimientos_pendientes": {"$in": ids}}}
+        )
+        return [m["_id"] for m in libro]
+
+    def get_movements(self, lote_id):
+        """Obtiene el libro de movimientos de un lote, del más antiguo al más reciente"""
+        if self.db is None or not ObjectId.is_valid(lote_id): return []
+        return list(self.movimientos.find({"lote_id": ObjectId(lote_id)}).sort("fecha", 1))
 
     # ⭐️ NUEVO MÉTODO: Para estadísticas generales del dashboard
-    def get_dashboard_stats(self):
-        """Obtiene estadísticas generales para el dashboard"""
-        if self.db is None: return {"total_lotes": 0, "stock_por_producto": []}
+    def get_dashboard_stats(self, top_n=DASHBOARD_TOP_N):
+        """
+        Obtiene estadísticas generales para el dashboard.
+        El stock se limita a los `top_n` productos con más existencias; el resto se resume
+        en "otros" (uno por unidad base), así el gráfico tiene tamaño acotado sin importar el catálogo.
+        El resultado se comparte entre sesiones (y workers) hasta el próximo cambio de stock.
+        """
+        if self.db is None: return {"total_lotes": 0, "stock_por_producto": [], "otros": []}
+
+        cache_key = f"{STATS_CACHE_PREFIX}{top_n}"
+        cached = get_shared_store().get(cache_key)
+        if cached is not None:
+            return cached
 
-        # 1. Total de lotes
-        total_lotes = self.registros.count_documents({})
+        # 1. Total de lotes (los archivados se cuentan por los metadatos de su colección)
+        total_lotes = self.registros.count_documents({}) + self.archivo.estimated_document_count()
         
-        # 2. Stock agrupado por producto (Ej: Cúrcuma, Jengibre)
+        # 2. Stock agrupado por producto (Ej: Cúrcuma, Jengibre) y unidad base
+        # Se agrupa por la clave normalizada para que "Cúrcuma" y "curcuma" sumen juntos,
+        # y por unidad base para no sumar kg con cajas. El nombre visible sale del catálogo
+        # (el $lookup se hace solo para los top_n, después del $limit).
         pipeline = [
+            {"$match": {"cantidad_base_restante": {"$gt": 0}}},
             {
                 "$group": {
-                    "_id": "$productType", # Agrupar por nombre de producto
-                    "cantidad_total": {"$sum": "$cantidad_restante"}
+                    "_id": {"productKey": "$productKey", "unidad": "$unidad_base"},
+                    "cantidad_total": {"$sum": "$cantidad_base_restante"}
+                }
+            },
+            {"$sort": {"cantidad_total": -1, "_id.productKey": 1}},
+            {
+                "$facet": {
+                    "top": [
+                        {"$limit": top_n},
+                        {
+                            "$lookup": {
+                                "from": "productos",
+                                "localField": "_id.productKey",
+                                "foreignField": "clave",
+                                "as": "catalogo"
+                            }
+                        },
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "productKey": "$_id.productKey",
+                                "unidad": "$_id.unidad",
+                                "producto": {"$ifNull": [{"$first": "$catalogo.nombre"}, "$_id.productKey"]},
+                                "cantidad_total": {"$round": ["$cantidad_total", 2]}
+                            }
+                        },
+                    ],
+                    "otros": [
+                        {"$skip": top_n},
+                        {
+                            "$group": {
+                                "_id": "$_id.unidad",
+                                "cantidad_total": {"$sum": "$cantidad_total"},
+                                "productos": {"$sum": 1}
+                            }
+                        },
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "unidad": "$_id",
+                                "productos": 1,
+                                "cantidad_total": {"$round": ["$cantidad_total", 2]}
+                            }
+                        },
+                        {"$sort": {"cantidad_total": -1}},
+                    ],
                 }
             },
-            {"$sort": {"_id": 1}}
         ]
-        stock_por_producto = list(self.registros.aggregate(pipeline))
+        resultado = next(self.registros.aggregate(pipeline), {"top": [], "otros": []})
         
-        return {
+        stats = {
             "total_lotes": total_lotes,
-            "stock_por_producto": stock_por_producto # Ej: [{'_id': 'Cúrcuma', 'cantidad_total': 500}]
+            "stock_por_producto": resultado["top"], # Ej: [{'productKey': 'curcuma', 'producto': 'Cúrcuma', 'unidad': 'kg', 'cantidad_total': 500}]
+            "otros": resultado["otros"] # Ej: [{'unidad': 'kg', 'productos': 37, 'cantidad_total': 1200}]
         }
+        get_shared_store().set(cache_key, stats, ttl=STATS_CACHE_TTL)
+        return stats
 
     def get_history(self):
         """Obtiene los últimos 10 registros del historial"""
@@ -123,6 +496,207 @@ class DatabaseManager:
         records_cursor = self.registros.find().sort("_id", -1).limit(10)
         return list(records_cursor)
     
+    def _records_query(self, desde=None, hasta=None, product=None, supplier=None):
+        query = {}
+        if desde or hasta:
+            query["fecha_produccion"] = {}
+            if desde:
+                query["fecha_produccion"]["$gte"] = desde
+            if hasta:
+                query["fecha_produccion"]["$lt"] = hasta
+        if product:
+            query["productKey"] = normalize_key(product)
+        if supplier:
+            query["supplierKey"] = normalize_key(supplier)
+        return query
+
+    def get_records_between(self, desde, hasta, product=None, supplier=None, limit=0):
+        """
+        Obtiene los registros con fecha de producción en [desde, hasta), incluidos los archivados.
+        Opcionalmente filtra por producto y/o proveedor (se comparan por clave normalizada).
+        """
+        if self.db is None: return []
+
+        query = self._records_query(desde, hasta, product, supplier)
+        cursores = [c.find(query).sort("fecha_produccion", 1).limit(limit) for c in (self.registros, self.archivo)]
+        registros = _merge_by_date(cursores)
+        return list(islice(registros, limit) if limit else registros)
+
+    def iter_records(self, desde=None, hasta=None, product=None, supplier=None, fields=None, batch_size=1000):
+        """
+        Recorre los registros (para exportar) con un cursor del servidor: se traen `batch_size`
+        documentos por viaje y solo los campos de `fields`, sin cargar la colección en memoria.
+        El orden por fecha_produccion lo resuelve el índice (o el compuesto con productKey).
+        Los lotes archivados se leen con un segundo cursor y se intercalan por fecha: las
+        auditorías necesitan justamente los lotes cerrados.
+        """
+        if self.db is None: return
+
+        query = self._records_query(desde, hasta, product, supplier)
+        # fecha_produccion hace falta para intercalar los dos cursores aunque no se exporte
+        projection = {campo: 1 for campo in [*fields, "fecha_produccion"]} if fields else None
+        cursores = [
+            c.find(query, projection, batch_size=batch_size).sort("fecha_produccion", 1)
+            for c in (self.registros, self.archivo)
+        ]
+        try:
+            yield from _merge_by_date(cursores)
+        finally:
+            for cursor in cursores:
+                cursor.close()
+
+    def rollup_production(self, desde=None):
+        """
+        Recalcula los totales diarios por producto, proveedor y unidad base y los fusiona ($merge)
+        en la colección "produccion_diaria". Con `desde` solo se recalculan los días a partir de esa fecha.
+        Las fechas se guardan sin zona horaria (hora local), por eso $dateTrunc corta por día local.
+        """
+        if self.db is None: return
+
+        ejecucion = _start_of_day(datetime.now())
+        inicio_dia = datetime.min
+        match = {"fecha_produccion": {"$type": "date"}}
+        if desde:
+            # Se recalculan días completos para que el reemplazo del $merge sea correcto
+            inicio_dia = _start_of_day(desde)
+            match = {"fecha_produccion": {"$gte": inicio_dia}}
+
+        pipeline = [
+            {"$match": match},
+            # Los lotes archivados siguen contando en la producción de su día
+            {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": match}]}},
+            {
+                "$group": {
+                    "_id": {
+                        "dia": {"$dateTrunc": {"date": "$fecha_produccion", "unit": "day"}},
+                        "productKey": "$productKey",
+                        "supplierKey": "$supplierKey",
+                        "unidad": "$unidad_base",
+                    },
+                    "producto": {"$first": "$productType"},
+                    "proveedor": {"$first": "$supplier"},
+                    "lotes": {"$sum": 1},
+                    "cantidad_total": {"$sum": "$cantidad_base_inicial"},
+                }
+            },
+            {
+                "$merge": {
+                    "into": "produccion_diaria",
+                    "on": "_id",
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert",
+                }
+            },
+        ]
+        self.registros.aggregate(pipeline)
+        self.db[ROLLUP_STATE_COLLECTION].update_one(
+            {"_id": ROLLUP_STATE_ID},
+            {"$min": {"calculado_desde": inicio_dia}, "$max": {"ultima_ejecucion": ejecucion}},
+            upsert=True,
+        )
+
+    def note_backdated_production(self, fecha):
+        """
+        Anota un lote con fecha de producción anterior a ayer (elegida en el formulario o subido
+        tarde por una estación SQLite): el siguiente rollup de get_daily_lots empieza ese día.
+        """
+        if self.db is None or not isinstance(fecha, datetime): return
+
+        if fecha >= _start_of_day(datetime.now()) - timedelta(days=1):
+            return
+        self.db[ROLLUP_STATE_COLLECTION].update_one(
+            {"_id": ROLLUP_STATE_ID}, {"$min": {"pendiente_desde": _start_of_day(fecha)}}, upsert=True
+        )
+
+    def _incremental_rollup(self, inicio_grafico):
+        """
+        Recalcula desde el primer día que pudo cambiar: ayer, el día de la última ejecución (si
+        hubo días sin rollup), el más antiguo anotado por note_backdated_production y, si
+        "produccion_diaria" aún no cubre el gráfico, su primer día.
+        """
+        estado = self.db[ROLLUP_STATE_COLLECTION].find_one({"_id": ROLLUP_STATE_ID}) or {}
+        desde = _start_of_day(datetime.now()) - timedelta(days=1)
+        if estado.get("calculado_desde") is None or estado["calculado_desde"] > inicio_grafico:
+            desde = min(desde, inicio_grafico)
+        if estado.get("ultima_ejecucion"):
+            desde = min(desde, estado["ultima_ejecucion"])
+        pendiente = estado.get("pendiente_desde")
+        if pendiente:
+            desde = min(desde, pendiente)
+            # Se borra antes de recalcular: lo que se anote mientras tanto queda para la próxima vez
+            self.db[ROLLUP_STATE_COLLECTION].update_one(
+                {"_id": ROLLUP_STATE_ID, "pendiente_desde": pendiente}, {"$unset": {"pendiente_desde": ""}}
+            )
+        try:
+            self.rollup_production(desde=desde)
+        except Exception:
+            if pendiente:
+                self.db[ROLLUP_STATE_COLLECTION].update_one(
+                    {"_id": ROLLUP_STATE_ID}, {"$min": {"pendiente_desde": pendiente}}, upsert=True
+                )
+            raise
+
+    def archive_closed_lots(self, older_than_days, batch_size=1000):
+        """
+        Mueve a "registros_archivo" los lotes sin stock (cantidad_restante <= 0) producidos hace más
+        de `older_than_days` días, así "registros" y sus índices se quedan con los lotes vivos.
+        Va en tandas de `batch_size`: cada tanda se copia con $merge (reemplaza si ya estaba) y solo
+        se borran de "registros" los que ya están en el archivo. Si se interrumpe, la siguiente
+        ejecución retoma sin duplicar ni perder lotes. Retorna cuántos se archivaron.
+        """
+        if self.db is None: return 0
+
+        limite = datetime.now() - timedelta(days=older_than_days)
+        filtro = {"fecha_produccion": {"$lt": limite}, "cantidad_restante": {"$lte": 0}}
+        archivados = 0
+        while True:
+            ids = [d["_id"] for d in self.registros.find(filtro, {"_id": 1}).sort("fecha_produccion", 1).limit(batch_size)]
+            if not ids:
+                break
+            self.registros.aggregate([
+                {"$match": {"_id": {"$in": ids}}},
+                {"$merge": {"into": ARCHIVE_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+            ])
+            copiados = [d["_id"] for d in self.archivo.find({"_id": {"$in": ids}}, {"_id": 1})]
+            if not copiados:
+                print("❌ El $merge no copió ningún lote al archivo; se detiene el archivado")
+                break
+            archivados += self.registros.delete_many(
+                {"_id": {"$in": copiados}, "cantidad_restante": {"$lte": 0}}
+            ).deleted_count
+            if len(ids) < batch_size:
+                break
+        return archivados
+
+    def get_daily_lots(self, dias=PRODUCTION_CHART_DAYS):
+        """
+        Lotes por día para el gráfico del dashboard, leídos de "produccion_diaria".
+        El rollup es incremental: si el último tiene más de ROLLUP_INTERVAL segundos se
+        recalculan antes de leer los días que pudieron cambiar (ver _incremental_rollup).
+        """
+        if self.db is None: return []
+
+        inicio = _start_of_day(datetime.now()) - timedelta(days=dias - 1)
+        store = get_shared_store()
+        if store.get(ROLLUP_MARK) is None:
+            self._incremental_rollup(inicio)
+            store.set(ROLLUP_MARK, True, ROLLUP_INTERVAL)
+        pipeline = [
+            {"$match": {"_id.dia": {"$gte": inicio}}},
+            {"$group": {"_id": "$_id.dia", "lotes": {"$sum": "$lotes"}}},
+            {"$sort": {"_id": 1}},
+        ]
+        return [{"dia": d["_id"], "lotes": d["lotes"]} for d in self.db.produccion_diaria.aggregate(pipeline)]
+
+    def get_production_series(self, desde, hasta, product=None):
+        """Lee los totales diarios ya calculados por rollup_production (no recorre "registros")"""
+        if self.db is None: return []
+
+        query = {"_id.dia": {"$gte": desde, "$lt": hasta}}
+        if product:
+            query["_id.productKey"] = normalize_key(product)
+        return list(self.db.produccion_diaria.find(query).sort("_id.dia", 1))
+
     def get_products(self):
         """Obtiene lista de nombres de productos únicos"""
         if self.db is None: return []
@@ -137,6 +711,35 @@ class DatabaseManager:
         suppliers = self.proveedores.find({}, {"nombre": 1, "_id": 0})
         return [s["nombre"] for s in suppliers]
     
+    def search_products(self, prefix):
+        """Busca productos que empiecen por el prefijo (sin distinguir mayúsculas ni tildes)"""
+        return self._search_catalog(self.productos, prefix) if self.db is not None else []
+
+    def search_suppliers(self, prefix):
+        """Busca proveedores que empiecen por el prefijo (sin distinguir mayúsculas ni tildes)"""
+        return self._search_catalog(self.proveedores, prefix) if self.db is not None else []
+
+    def _search_catalog(self, coleccion, prefix):
+        """
+        Consulta por prefijo sobre la clave normalizada.
+        Un $regex anclado (^...) sobre el índice de "clave" se resuelve como rango del índice.
+        """
+        prefix = normalize_key(prefix)
+        key = (coleccion.name, prefix)
+        cached = _catalog_search_cache.get(key)
+        if cached is not None:
+            return cached
+
+        query = {"clave": {"$regex": "^" + re.escape(prefix)}} if prefix else {}
+        cursor = (
+            coleccion.find(query, {"nombre": 1, "_id": 0})
+            .sort("clave", 1)
+            .limit(CATALOG_SEARCH_LIMIT)
+        )
+        results = [doc["nombre"] for doc in cursor]
+        _catalog_search_cache.set(key, results)
+        return results
+
     def get_operators(self):
         """Obtiene lista de operadores únicos con sus códigos"""
         if self.db is None: return {}
@@ -154,4 +757,118 @@ class DatabaseManager:
         
         operators = self.registros.aggregate(pipeline)
         # Retornar diccionario {nombre: código}
-        return {op["_id"]: op["codigo"] for op in operators if op["_id"]}
\ No newline at end of file
+        return {op["_id"]: op["codigo"] for op in operators if op["_id"]}
+
+    def migrate_catalog_keys(self):
+        """
+        Migración única: calcula la clave normalizada de productos y proveedores,
+        fusiona los duplicados ("agro sur " / "Agro Sur") y rellena productKey/supplierKey
+        en los registros existentes. Todo se aplica con bulk_write.
+        """
+        if self.db is None: return {}
+        resumen = {}
+
+        for coleccion in (self.productos, self.proveedores):
+            grupos = {}
+            for doc in coleccion.find({}, {"nombre": 1, "clave": 1}).sort("_id", 1):
+                clave = normalize_key(doc.get("nombre"))
+                if clave:
+                    grupos.setdefault(clave, []).append(doc)
+
+            borrar, actualizar = [], []
+            for clave, docs in grupos.items():
+                # Se conserva el más antiguo; los demás se eliminan
+                conservar, duplicados = docs[0], docs[1:]
+                if duplicados:
+                    borrar.append(DeleteMany({"_id": {"$in": [d["_id"] for d in duplicados]}}))
+                nombre = " ".join(conservar["nombre"].split())
+                if conservar.get("clave") != clave or conservar["nombre"] != nombre:
+                    actualizar.append(UpdateOne(
+                        {"_id": conservar["_id"]},
+                        {"$set": {"clave": clave, "nombre": nombre}}
+                    ))
+
+            # Primero los borrados para no chocar con el índice único de "clave"
+            if borrar or actualizar:
+                coleccion.bulk_write(borrar + actualizar, ordered=True)
+            resumen[coleccion.name] = {"fusionados": sum(len(d) - 1 for d in grupos.values())}
+            self._invalidate_catalog(coleccion.name)
+
+        operaciones = []
+        for campo, campo_clave in (("productType", "productKey"), ("supplier", "supplierKey")):
+            for valor in self.registros.distinct(campo):
+                if isinstance(valor, str):
+                    operaciones.append(UpdateMany(
+                        {campo: valor, campo_clave: {"$ne": normalize_key(valor)}},
+                        {"$set": {campo_clave: normalize_key(valor)}}
+                    ))
+        if operaciones:
+            resultado = self.registros.bulk_write(operaciones, ordered=False)
+            resumen["registros"] = {"actualizados": resultado.modified_count}
+
+        return resumen
+
+    def migrate_record_dates(self, batch_size=1000):
+        """Migración única: rellena "fecha_produccion" a partir del string "date" de registros antiguos"""
+        if self.db is None: return 0
+        actualizados = 0
+        operaciones = []
+        cursor = self.registros.find({"fecha_produccion": {"$exists": False}}, {"date": 1})
+        for doc in cursor:
+            fecha = parse_date(doc.get("date"))
+            if fecha is None:
+                continue
+            operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"fecha_produccion": fecha}}))
+            if len(operaciones) >= batch_size:
+                actualizados += self.registros.bulk_write(operaciones, ordered=False).modified_count
+                operaciones = []
+        if operaciones:
+            actualizados += self.registros.bulk_write(operaciones, ordered=False).modified_count
+        return actualizados
+
+    def migrate_quantities(self):
+        """
+        Migración única: añade unidad base y cantidades base a los registros antiguos.
+        Se resuelve en el servidor con una actualización por unidad (pipeline), sin parsear en Python.
+        """
+        if self.db is None: return 0
+        pendientes = {"unidad_base": {"$exists": False}}
+
+        operaciones = [UpdateMany(
+            {**pendientes, "unit": {"$exists": False}},
+            {"$set": {"unit": DEFAULT_UNIT}}
+        )]
+        unidades = set(UNIT_CONVERSIONS) | set(u for u in self.registros.distinct("unit", pendientes) if u)
+        for unidad in unidades:
+            unidad_base, factor = to_base(unidad)
+            operaciones.append(UpdateMany({**pendientes, "unit": unidad}, [
+                {"$set": {
+                    "unidad_base": unidad_base,
+                    "factor_base": factor,
+                    "cantidad_base_inicial": {"$multiply": [{"$ifNull": ["$cantidad_inicial", 0]}, factor]},
+                    "cantidad_base_restante": {"$multiply": [{"$ifNull": ["$cantidad_restante", 0]}, factor]},
+                }}
+            ]))
+        return self.registros.bulk_write(operaciones, ordered=True).modified_count
+
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_database_manager():
+    """
+    Almacenamiento compartido por todas las sesiones del proceso: un solo MongoClient
+    (y su pool de conexiones) en lugar de uno por pestaña abierta, o con STORAGE=sqlite
+    la base local con sincronización a MongoDB (src/sqlite_backend.py).
+    Si no se pudo abrir, se reintenta en la siguiente llamada.
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None or not _shared_manager.is_available():
+            if get_settings().storage == STORAGE_SQLITE:
+                from src.sqlite_backend import SQLiteBackend
+                _shared_manager = SQLiteBackend()
+            else:
+                _shared_manager = DatabaseManager()
+        return _shared_manager
@@ -0,0 +1,280 @@
+"""
+Monitoreo de los comandos que DatabaseManager envía a MongoDB (DB_MONITORING=1).
+
+Un CommandListener de pymongo registra la duración de cada comando por colección y operación
+(y por "forma": el filtro o pipeline con los valores reemplazados por "?"), la exporta en
+/metrics y /api/db, y avisa de los comandos que superan SLOW_QUERY_MS junto con su forma.
+
+Con EXPLAIN_SLOW, la primera vez que una forma es lenta (y luego como mucho una vez cada
+EXPLAIN_INTERVAL segundos) un hilo en segundo plano ejecuta explain("executionStats") con el
+mismo comando y guarda el resultado: EXPLAIN_SLOW=db en la colección diagnostico_consultas,
+o EXPLAIN_SLOW=<archivo.jsonl> en un archivo. Los aggregate con $merge o $out no se explican:
+executionStats ejecuta el pipeline y volvería a escribir en la colección de destino. Así se ve qué consulta (get_operators,
+get_dashboard_stats, los upserts del catálogo...) se degrada al crecer los datos y por qué.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from bson import json_util
+from pymongo import monitoring
+
+from src.metrics import MONGO_METRIC, observe
+from src.settings import get_settings
+
+DIAGNOSTICS_COLLECTION = "diagnostico_consultas"
+EXPLAIN_INTERVAL = 600
+EXPLAIN_QUEUE_SIZE = 100
+MAX_SHAPES = 500
+
+# Campo del comando con el filtro, por operación (aggregate usa el pipeline completo)
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Etapas de aggregate que escriben: explain("executionStats") las volvería a ejecutar
+WRITE_STAGES = {"$merge", "$out"}
+# Comandos propios del monitoreo o del driver que no interesa medir
+IGNORED = {"explain", "hello", "isMaster", "ismaster", "ping", "buildInfo", "endSessions", "saslStart",
+           "saslContinue", "killCursors"}
+# Campos que añade el driver y que explain no acepta
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "writeConcern",
+                 "apiVersion", "apiStrict", "apiDeprecationErrors"}
+
+
+def query_shape(valor):
+    """El filtro sin sus valores: conserva campos y operadores, los valores pasan a "?" """
+    if isinstance(valor, dict):
+        return {k: query_shape(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        formas = [query_shape(v) for v in valor]
+        # Listas de valores ($in, $nin...) se reducen a una sola forma
+        if formas and all(f == "?" for f in formas):
+            return ["?"]
+        return formas
+    return "?"
+
+
+def command_shape(nombre, comando):
+    if nombre == "aggregate":
+        objetivo = comando.get("pipeline", [])
+    elif nombre in ("update", "delete"):
+        lista = comando.get("updates" if nombre == "update" else "deletes") or [{}]
+        objetivo = lista[0].get("q", {})
+    else:
+        objetivo = comando.get(FILTER_FIELDS.get(nombre, "filter"), {})
+    return json.dumps(query_shape(objetivo), sort_keys=True, ensure_ascii=False, default=str)
+
+
+def writes_output(nombre, comando):
+    """True si es un aggregate con $merge o $out (p. ej. el archivado o el rollup de producción)"""
+    if nombre != "aggregate":
+        return False
+    return any(isinstance(etapa, dict) and not WRITE_STAGES.isdisjoint(etapa)
+               for etapa in comando.get("pipeline") or ())
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "slow", "failed")
+
+    def __init__(self):
+        self.count = self.slow = self.failed = 0
+        self.total = self.max = 0.0
+
+    def add(self, segundos, lento):
+        self.count += 1
+        self.total += segundos
+        self.max = max(self.max, segundos)
+        self.slow += lento
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(1000 * self.total / self.count, 2) if self.count else 0.0,
+            "max_ms": round(1000 * self.max, 2),
+            "total_ms": round(1000 * self.total, 1),
+            "slow": self.slow,
+            "failed": self.failed,
+        }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Listener de pymongo: duraciones por comando y forma, log de lentos y explain opcional"""
+
+    def __init__(self, slow_ms=100.0, explain_target=None):
+        self.slow = slow_ms / 1000
+        self.explain_target = explain_target  # None | "db" | ruta de archivo
+        self.client = None  # se asigna al crear el MongoClient (explain usa el mismo)
+        self._lock = threading.Lock()
+        self._pending = {}   # (conexión, request_id) -> (colección, comando, forma, documento)
+        self._commands = {}  # (colección, comando) -> _Stat
+        self._shapes = {}    # (colección, comando, forma) -> _Stat
+        self._explained = {}  # (colección, comando, forma) -> último explain (monotonic)
+        self._explain_queue = None
+
+    # --- Eventos de pymongo (se ejecutan en el hilo que envía el comando: deben ser baratos) ---
+
+    def started(self, event):
+        nombre = event.command_name
+        if nombre in IGNORED:
+            return
+        comando = event.command
+        coleccion = comando.get(nombre) if nombre != "getMore" else comando.get("collection")
+        if not isinstance(coleccion, str) or coleccion == DIAGNOSTICS_COLLECTION:
+            return
+        forma = command_shape(nombre, comando) if nombre in EXPLAINABLE else ""
+        explicable = self.explain_target and nombre in EXPLAINABLE and not writes_output(nombre, comando)
+        documento = comando if explicable else None
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                f"{event.database_name}.{coleccion}", nombre, forma, documento
+            )
+
+    def succeeded(self, event):
+        self._finish(event, fallido=False)
+
+    def failed(self, event):
+        self._finish(event, fallido=True)
+
+    def _finish(self, event, fallido):
+        segundos = event.duration_micros / 1e6
+        lento = segundos >= self.slow
+        with self._lock:
+            info = self._pending.pop((event.connection_id, event.request_id), None)
+            if info is None:
+                return
+            coleccion, nombre, forma, documento = info
+            stat = self._commands.get((coleccion, nombre))
+            if stat is None:
+                stat = self._commands[(coleccion, nombre)] = _Stat()
+            stat.add(segundos, lento)
+            stat.failed += fallido
+            clave = (coleccion, nombre, forma)
+            por_forma = self._shapes.get(clave)
+            if por_forma is None and len(self._shapes) < MAX_SHAPES:
+                por_forma = self._shapes[clave] = _Stat()
+            if por_forma is not None:
+                por_forma.add(segundos, lento)
+                por_forma.failed += fallido
+            explicar = (
+                lento and not fallido and documento is not None
+                and time.monotonic() - self._explained.get(clave, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL
+            )
+            if explicar:
+                self._explained[clave] = time.monotonic()
+        observe(MONGO_METRIC, (("collection", coleccion), ("command", nombre)), segundos)
+        if lento:
+            print(f"🐢 Comando lento: {coleccion}.{nombre} {segundos * 1000:.1f} ms forma={forma or '-'}")
+        if explicar:
+            self._enqueue_explain(coleccion, nombre, forma, documento, segundos)
+
+    # --- explain en segundo plano ---
+
+    def _enqueue_explain(self, coleccion, nombre, forma, documento, segundos):
+        if self._explain_queue is None:
+            with self._lock:
+                if self._explain_queue is None:
+                    self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+                    threading.Thread(target=self._explain_loop, daemon=True, name="explain-lentos").start()
+        comando = {k: v for k, v in documento.items() if k not in DRIVER_FIELDS}
+        try:
+            self._explain_queue.put_nowait((coleccion, nombre, forma, comando, segundos))
+        except queue.Full:
+            pass  # ya hay muchos pendientes: esta forma se reintentará en el próximo intervalo
+
+    def _explain_loop(self):
+        while True:
+            coleccion, nombre, forma, comando, segundos = self._explain_queue.get()
+            if self.client is None:
+                continue
+            base = coleccion.split(".", 1)[0]
+            try:
+                explain = self.client[base].command({"explain": comando, "verbosity": "executionStats"})
+            except Exception as e:
+                print(f"❌ Error al ejecutar explain de {coleccion}.{nombre}: {e}")
+                continue
+            self._store_explain({
+                "fecha": datetime.now(),
+                "coleccion": coleccion,
+                "comando": nombre,
+                "forma": forma,
+                "duracion_ms": round(segundos * 1000, 1),
+                "resumen": summarize_explain(explain),
+                "explain": explain,
+            }, base)
+
+    def _store_explain(self, registro, base):
+        try:
+            if self.explain_target == "db":
+                # El plan completo como texto: sus claves pueden llevar "$" y "."
+                registro = {**registro, "explain": json_util.dumps(registro["explain"])}
+                self.client[base][DIAGNOSTICS_COLLECTION].insert_one(registro)
+            else:
+                with open(self.explain_target, "a", encoding="utf-8") as f:
+                    f.write(json_util.dumps(registro, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"❌ Error al guardar el explain de {registro['coleccion']}: {e}")
+
+    # --- Consulta ---
+
+    def stats(self, top=20):
+        with self._lock:
+            comandos = [
+                {"coleccion": c, "comando": n, **s.as_dict()} for (c, n), s in self._commands.items()
+            ]
+            formas = [
+                {"coleccion": c, "comando": n, "forma": f, **s.as_dict()}
+                for (c, n, f), s in self._shapes.items()
+            ]
+        comandos.sort(key=lambda d: -d["total_ms"])
+        formas.sort(key=lambda d: -d["total_ms"])
+        return {"slow_ms": self.slow * 1000, "comandos": comandos, "formas": formas[:top]}
+
+
+def summarize_explain(explain):
+    """Lo esencial de executionStats: documentos y claves examinados y etapas del plan ganador"""
+    stats = explain.get("executionStats")
+    if stats is None:
+        # aggregate: las estadísticas vienen en la primera etapa ($cursor) o en "stages"
+        etapas = explain.get("stages") or []
+        cursor = etapas[0].get("$cursor", {}) if etapas else {}
+        stats = cursor.get("executionStats", {})
+        planner = cursor.get("queryPlanner", {})
+    else:
+        planner = explain.get("queryPlanner", {})
+    etapas, plan = [], planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)  # formato del motor SBE
+    while plan:
+        etapa = plan.get("stage", "?")
+        if plan.get("indexName"):
+            etapa += f" {plan['indexName']}"
+        etapas.append(etapa)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return {
+        "plan": " <- ".join(etapas),
+        "nReturned": stats.get("nReturned"),
+        "executionTimeMillis": stats.get("executionTimeMillis"),
+        "totalKeysExamined": stats.get("totalKeysExamined"),
+        "totalDocsExamined": stats.get("totalDocsExamined"),
+    }
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_command_monitor():
+    """Monitor del proceso, o None si DB_MONITORING no está activo"""
+    global _monitor
+    settings = get_settings()
+    if not settings.db_monitoring:
+        return None
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = CommandMonitor(settings.slow_query_ms, settings.explain_slow)
+    return _monitor
@@ -0,0 +1,146 @@
+"""
+Bus de eventos en proceso para avisar cambios de stock a los dashboards abiertos.
+
+Los cambios (lote creado, despacho) se publican como eventos pequeños y cada dashboard
+suscrito aplica el delta a sus controles, sin volver a ejecutar agregaciones ni recargar.
+Con SHARED_STATE=mongo (clúster de workers) los eventos viajan entre procesos por MongoDB.
+"""
+import queue
+import threading
+import time
+
+from pymongo import CursorType, errors
+
+from src.shared_state import PROCESS_ID, SHARED_STATE_MONGO, get_shared_mongo_db, get_shared_state_mode
+
+# Tema de los cambios de stock. Eventos:
+#   {"tipo": "lote_creado", "lote_id", "productKey", "producto", "unidad", "delta", "dia" (AAAA-MM-DD)}
+#   {"tipo": "despacho", "lote_id", "productKey", "producto", "unidad", "delta", "restante"?, "estado"?}
+# "delta" va en unidad base (positivo al crear, negativo al despachar).
+TOPIC_STOCK = "stock"
+
+# Tema de invalidación de cachés por proceso (modo clúster):
+#   {"cache": "lotes", "key": lote_id, "origen"} | {"cache": "catalogo", "coleccion", "origen"}
+TOPIC_CACHE = "cache"
+
+
+class EventBus:
+    """Interfaz mínima de publicación/suscripción"""
+
+    def publish(self, topic, event):
+        raise NotImplementedError
+
+    def subscribe(self, topic, handler):
+        """Suscribe handler(event) al tema y retorna una función para cancelar la suscripción"""
+        raise NotImplementedError
+
+
+class LocalEventBus(EventBus):
+    """
+    Bus en memoria del proceso: llega a todas las sesiones de un mismo servidor.
+    La entrega se hace en un hilo propio para que quien publica (p. ej. el operador que
+    genera un QR) no espere a que se actualicen los dashboards de otras sesiones.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._deliver_loop, name="event-bus", daemon=True)
+        self._worker.start()
+
+    def publish(self, topic, event):
+        self._queue.put((topic, event))
+
+    def subscribe(self, topic, handler):
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+
+        def unsubscribe():
+            with self._lock:
+                handlers = self._handlers.get(topic, [])
+                if handler in handlers:
+                    handlers.remove(handler)
+
+        return unsubscribe
+
+    def _deliver(self, topic, event):
+        with self._lock:
+            handlers = list(self._handlers.get(topic, []))
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                # Un suscriptor con error (p. ej. sesión cerrada) no afecta a los demás
+                print(f"Error en suscriptor de '{topic}': {e}")
+
+    def _deliver_loop(self):
+        while True:
+            topic, event = self._queue.get()
+            self._deliver(topic, event)
+
+
+class MongoEventBus(LocalEventBus):
+    """
+    Bus entre procesos (workers del clúster) sobre una colección capada de MongoDB.
+    Publicar es insertar un documento; cada proceso sigue la colección con un cursor
+    tailable y entrega los eventos a sus suscriptores, incluidos los que publicó él mismo.
+    """
+
+    COLLECTION = "eventos"
+    CAPPED_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, db):
+        self._coleccion = self._ensure_collection(db)
+        self._desde = time.time()
+        super().__init__()
+        self._tail = threading.Thread(target=self._tail_loop, name="event-bus-tail", daemon=True)
+        self._tail.start()
+
+    def _ensure_collection(self, db):
+        if self.COLLECTION not in db.list_collection_names():
+            try:
+                db.create_collection(self.COLLECTION, capped=True, size=self.CAPPED_SIZE)
+            except errors.CollectionInvalid:
+                pass  # otro worker la creó primero
+        return db[self.COLLECTION]
+
+    def publish(self, topic, event):
+        try:
+            self._coleccion.insert_one({"topic": topic, "event": event, "ts": time.time(), "origen": PROCESS_ID})
+        except errors.PyMongoError as e:
+            # Sin Mongo al menos las sesiones de este proceso reciben el evento
+            print(f"Error al publicar evento en '{topic}': {e}")
+            super().publish(topic, event)
+
+    def _tail_loop(self):
+        while True:
+            try:
+                cursor = self._coleccion.find(
+                    {"ts": {"$gt": self._desde}},
+                    cursor_type=CursorType.TAILABLE_AWAIT,
+                    max_await_time_ms=1000,
+                )
+                while cursor.alive:
+                    for doc in cursor:
+                        self._desde = max(self._desde, doc["ts"])
+                        self._queue.put((doc["topic"], doc["event"]))
+            except errors.PyMongoError as e:
+                print(f"Error siguiendo el bus de eventos: {e}")
+            # Cursor muerto (colección vacía o error): se reabre desde el último evento visto
+            time.sleep(1)
+
+
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus():
+    """Bus compartido por todas las sesiones (del proceso, o del clúster con SHARED_STATE=mongo)"""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                db = get_shared_mongo_db() if get_shared_state_mode() == SHARED_STATE_MONGO else None
+                _event_bus = MongoEventBus(db) if db is not None else LocalEventBus()
+    return _event_bus
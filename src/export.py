@@ -0,0 +1,198 @@
+"""
+Exportación masiva de lotes (auditorías) a CSV o Parquet.
+
+Uso:
+    python -m src.export lotes.csv [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--producto P] [--proveedor P]
+    python -m src.export lotes.parquet --campos _id,fecha_produccion,productType,cantidad_restante
+
+Los lotes se leen con iter_records (cursor del servidor, `--batch-size` documentos por viaje y
+solo los campos pedidos) y se escriben a medida que llegan: el CSV fila a fila y el Parquet en
+un grupo de filas por lote leído, así la memoria no crece con el tamaño de la exportación.
+Parquet requiere pyarrow (opcional). Con EXPORT_TOKEN, GET /api/export sirve el mismo CSV en streaming.
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+DEFAULT_FIELDS = [
+    "_id", "fecha_produccion", "date", "productType", "supplier", "operatorName", "operatorCode",
+    "cantidad_inicial", "cantidad_restante", "unit", "cantidad_base_restante", "unidad_base", "estado",
+]
+NUMERIC_FIELDS = {
+    "cantidad_inicial", "cantidad_restante", "cantidad_base_inicial", "cantidad_base_restante", "factor_base",
+}
+DATETIME_FIELDS = {"fecha_produccion"}
+DEFAULT_BATCH_SIZE = 1000
+PROGRESS_EVERY = 50_000
+FORMATOS = ("csv", "parquet")
+
+
+def _csv_value(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+class CSVExportWriter:
+    def __init__(self, salida, campos):
+        self.campos = campos
+        self.writer = csv.writer(salida)
+        self.writer.writerow(campos)
+
+    def write_batch(self, filas):
+        self.writer.writerows([[_csv_value(fila.get(c)) for c in self.campos] for fila in filas])
+
+    def close(self):
+        pass
+
+
+class ParquetExportWriter:
+    """Un grupo de filas de Parquet por lote leído (columnas tipadas: fechas y cantidades)"""
+
+    def __init__(self, salida, campos):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportar a Parquet requiere pyarrow: pip install pyarrow") from None
+        self.pa = pa
+        self.campos = campos
+        self.schema = pa.schema([
+            (c, pa.float64() if c in NUMERIC_FIELDS else pa.timestamp("s") if c in DATETIME_FIELDS else pa.string())
+            for c in campos
+        ])
+        self.writer = pq.ParquetWriter(salida, self.schema, compression="zstd")
+
+    def _column(self, campo, filas):
+        valores = [fila.get(campo) for fila in filas]
+        if campo in NUMERIC_FIELDS:
+            return [float(v) if isinstance(v, (int, float)) else None for v in valores]
+        if campo in DATETIME_FIELDS:
+            return [v if isinstance(v, datetime) else None for v in valores]
+        return [None if v is None else str(v) for v in valores]
+
+    def write_batch(self, filas):
+        columnas = [self._column(c, filas) for c in self.campos]
+        self.writer.write_table(self.pa.Table.from_arrays(columnas, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def _batches(registros, batch_size):
+    lote = []
+    for registro in registros:
+        if isinstance(registro.get("_id"), ObjectId):
+            registro["_id"] = str(registro["_id"])
+        lote.append(registro)
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def export_records(db, salida, formato="csv", campos=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, **filtros):
+    """
+    Escribe en `salida` (archivo de texto para CSV, ruta o archivo binario para Parquet) los lotes
+    que cumplen `filtros` (desde, hasta, product, supplier). `progress(filas, segundos)` se llama
+    cada PROGRESS_EVERY filas. Retorna {"filas", "segundos", "filas_por_segundo"}.
+    """
+    campos = campos or DEFAULT_FIELDS
+    writer = (ParquetExportWriter if formato == "parquet" else CSVExportWriter)(salida, campos)
+    inicio = time.perf_counter()
+    filas = siguiente_aviso = 0
+    try:
+        registros = db.iter_records(fields=campos, batch_size=batch_size, **filtros)
+        for lote in _batches(registros, batch_size):
+            writer.write_batch(lote)
+            filas += len(lote)
+            if progress and filas >= siguiente_aviso + PROGRESS_EVERY:
+                siguiente_aviso = filas
+                progress(filas, time.perf_counter() - inicio)
+    finally:
+        writer.close()
+    segundos = time.perf_counter() - inicio
+    return {"filas": filas, "segundos": round(segundos, 2), "filas_por_segundo": round(filas / segundos) if segundos else 0}
+
+
+class _Buffer:
+    """Destino de csv.writer que acumula el texto escrito hasta que se lo retira"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, texto):
+        self.partes.append(texto)
+
+    def take(self):
+        texto, self.partes = "".join(self.partes), []
+        return texto
+
+
+def iter_csv(db, campos=None, batch_size=DEFAULT_BATCH_SIZE, **filtros):
+    """El CSV en trozos (uno por lote leído), para una respuesta HTTP en streaming"""
+    campos = campos or DEFAULT_FIELDS
+    buffer = _Buffer()
+    writer = CSVExportWriter(buffer, campos)
+    inicio, filas = time.perf_counter(), 0
+    for lote in _batches(db.iter_records(fields=campos, batch_size=batch_size, **filtros), batch_size):
+        writer.write_batch(lote)
+        filas += len(lote)
+        yield buffer.take()
+    yield buffer.take()
+    segundos = time.perf_counter() - inicio
+    print(f"📤 Exportación CSV: {filas} filas en {segundos:.1f} s ({filas / segundos if segundos else 0:.0f} filas/s)")
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.export", description="Exporta los lotes a CSV o Parquet")
+    parser.add_argument("salida", help="Archivo de salida (.csv o .parquet)")
+    parser.add_argument("--formato", choices=FORMATOS, help="Por defecto, según la extensión de la salida")
+    parser.add_argument("--desde", type=_fecha, help="Fecha de producción desde (AAAA-MM-DD, incluida)")
+    parser.add_argument("--hasta", type=_fecha, help="Fecha de producción hasta (AAAA-MM-DD, excluida)")
+    parser.add_argument("--producto")
+    parser.add_argument("--proveedor")
+    parser.add_argument("--campos", type=lambda v: [c.strip() for c in v.split(",") if c.strip()],
+                        help=f"Campos separados por comas (por defecto: {','.join(DEFAULT_FIELDS)})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Documentos por viaje al servidor y por grupo de filas")
+    args = parser.parse_args(argv)
+    formato = args.formato or ("parquet" if args.salida.endswith(".parquet") else "csv")
+
+    from src.database_manager import get_database_manager
+    db = get_database_manager()
+    if not db.is_available():
+        print("❌ No se pudo abrir la base de datos")
+        return 1
+
+    def progress(filas, segundos):
+        print(f"… {filas} filas ({filas / segundos:.0f} filas/s)")
+
+    filtros = {"desde": args.desde, "hasta": args.hasta, "product": args.producto, "supplier": args.proveedor}
+    try:
+        if formato == "parquet":
+            resumen = export_records(db, args.salida, "parquet", args.campos, args.batch_size, progress, **filtros)
+        else:
+            with open(args.salida, "w", newline="", encoding="utf-8") as salida:
+                resumen = export_records(db, salida, "csv", args.campos, args.batch_size, progress, **filtros)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {resumen['filas']} filas exportadas a {args.salida} en {resumen['segundos']} s "
+          f"({resumen['filas_por_segundo']} filas/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
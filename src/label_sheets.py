@@ -0,0 +1,231 @@
+"""
+Hojas de etiquetas para imprimir (PDF, A4 de stickers).
+
+Uso:
+    python -m src.label_sheets etiquetas.pdf --desde 2024-05-01 --hasta 2024-05-02 [--producto P] [--proveedor P]
+    python -m src.label_sheets etiquetas.pdf --ids 665f...,6660... [--columnas 3 --filas 4]
+
+Cada etiqueta es la misma del generador (render_qr_png, con el mismo texto y URL que el QR
+original) reducida al tamaño de su celda. El render se reparte en un pool de procesos y las
+páginas se escriben en el PDF a medida que llegan: cada imagen va al archivo en cuanto está
+lista y solo se guardan en memoria las que están en curso (una ventana de unas pocas páginas),
+así una tirada de cientos de etiquetas no crece en memoria.
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from src.lotes import iter_lotes, lote_qr_payload
+from src.render_service import RENDER_WORKERS
+from src.settings import get_settings
+from src.utils import render_qr_png
+
+MM = 72 / 25.4
+A4 = (595.28, 841.89)  # puntos
+DEFAULT_DPI = 300
+DEFAULT_COLUMNS = 3
+DEFAULT_ROWS = 4
+DEFAULT_MARGIN_MM = 10
+DEFAULT_GAP_MM = 4
+PAGES_AHEAD = 2  # páginas de render en vuelo por delante de la que se escribe
+
+
+class PDFStreamWriter:
+    """
+    Escritor PDF mínimo que no guarda el documento en memoria: cada objeto se escribe en cuanto
+    se añade y solo se recuerdan su posición (para la tabla xref) y los ids de las páginas.
+    Imágenes RGB y contenidos comprimidos con FlateDecode.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, salida):
+        self.salida = salida
+        self.posicion = 0
+        self.offsets = {}
+        self.siguiente = 3  # 1 y 2 se reservan para el catálogo y el árbol de páginas
+        self.paginas = []
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, datos):
+        self.salida.write(datos)
+        self.posicion += len(datos)
+
+    def _object(self, cuerpo, stream=None, numero=None):
+        if numero is None:
+            numero, self.siguiente = self.siguiente, self.siguiente + 1
+        self.offsets[numero] = self.posicion
+        self._write(f"{numero} 0 obj\n".encode())
+        if stream is None:
+            self._write(cuerpo.encode() + b"\nendobj\n")
+        else:
+            self._write(f"{cuerpo[:-2].rstrip()} /Length {len(stream)} >>\nstream\n".encode())
+            self._write(stream)
+            self._write(b"\nendstream\nendobj\n")
+        return numero
+
+    def add_image(self, ancho, alto, rgb_comprimido):
+        """Imagen RGB de 8 bits ya comprimida con zlib; retorna su número de objeto"""
+        return self._object(
+            f"<< /Type /XObject /Subtype /Image /Width {ancho} /Height {alto} "
+            "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode >>",
+            stream=rgb_comprimido,
+        )
+
+    def add_page(self, ancho, alto, contenido, imagenes):
+        """`imagenes` es {nombre: número de objeto} tal como las usa `contenido`"""
+        contenido_id = self._object("<< /Filter /FlateDecode >>", stream=zlib.compress(contenido.encode()))
+        xobjects = " ".join(f"/{nombre} {numero} 0 R" for nombre, numero in imagenes.items())
+        self.paginas.append(self._object(
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {ancho:.2f} {alto:.2f}] "
+            f"/Resources << /XObject << {xobjects} >> >> /Contents {contenido_id} 0 R >>"
+        ))
+
+    def close(self):
+        kids = " ".join(f"{p} 0 R" for p in self.paginas)
+        self._object(f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>", numero=self.PAGES)
+        self._object(f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>", numero=self.CATALOG)
+        inicio_xref = self.posicion
+        total = self.siguiente
+        lineas = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        lineas += [f"{self.offsets[n]:010d} 00000 n \n" for n in range(1, total)]
+        lineas.append(f"trailer\n<< /Size {total} /Root {self.CATALOG} 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        self._write("".join(lineas).encode())
+
+
+def sheet_layout(columnas=DEFAULT_COLUMNS, filas=DEFAULT_ROWS, margen_mm=DEFAULT_MARGIN_MM,
+                 separacion_mm=DEFAULT_GAP_MM, pagina=A4):
+    """Lado de cada etiqueta (cuadrada) y posición de su esquina inferior izquierda, en puntos"""
+    ancho, alto = pagina
+    margen, separacion = margen_mm * MM, separacion_mm * MM
+    lado = min(
+        (ancho - 2 * margen - (columnas - 1) * separacion) / columnas,
+        (alto - 2 * margen - (filas - 1) * separacion) / filas,
+    )
+    if lado <= 0:
+        raise ValueError("Las etiquetas no caben en la página con esos márgenes")
+    # La grilla se centra en la página; la primera celda es la de arriba a la izquierda
+    x0 = (ancho - columnas * lado - (columnas - 1) * separacion) / 2
+    y0 = (alto + filas * lado + (filas - 1) * separacion) / 2
+    celdas = [
+        (x0 + c * (lado + separacion), y0 - (f + 1) * lado - f * separacion)
+        for f in range(filas) for c in range(columnas)
+    ]
+    return lado, celdas
+
+
+def _init_worker():
+    render_qr_png("warmup")  # carga qrcode, PIL y las fuentes una vez por proceso
+
+
+def _render_label(payload, pixeles):
+    """Se ejecuta en el pool: la etiqueta del generador al tamaño de la celda, RGB comprimido"""
+    from PIL import Image
+    imagen = Image.open(BytesIO(render_qr_png(payload))).convert("RGB")
+    imagen = imagen.resize((pixeles, pixeles), Image.Resampling.LANCZOS)
+    return pixeles, pixeles, zlib.compress(imagen.tobytes(), 6)
+
+
+def _render_in_order(executor, payloads, pixeles, ventana):
+    """Resultados en el orden de `payloads`, con como mucho `ventana` renders en vuelo"""
+    en_vuelo = deque()
+    for payload in payloads:
+        en_vuelo.append(executor.submit(_render_label, payload, pixeles))
+        if len(en_vuelo) >= ventana:
+            yield en_vuelo.popleft().result()
+    while en_vuelo:
+        yield en_vuelo.popleft().result()
+
+
+def write_label_sheets(salida, payloads, columnas=DEFAULT_COLUMNS, filas=DEFAULT_ROWS,
+                       margen_mm=DEFAULT_MARGIN_MM, separacion_mm=DEFAULT_GAP_MM, dpi=DEFAULT_DPI, workers=None):
+    """
+    Escribe en `salida` (archivo binario) un PDF con una etiqueta por payload, columnas x filas
+    por página. Retorna {"etiquetas", "paginas", "segundos"}.
+    """
+    lado, celdas = sheet_layout(columnas, filas, margen_mm, separacion_mm)
+    pixeles = round(lado / 72 * dpi)
+    por_pagina = len(celdas)
+    workers = workers or get_settings().render_workers or RENDER_WORKERS
+    pdf = PDFStreamWriter(salida)
+    inicio, etiquetas = time.perf_counter(), 0
+
+    def cerrar_pagina(imagenes):
+        contenido = "\n".join(
+            f"q {lado:.2f} 0 0 {lado:.2f} {x:.2f} {y:.2f} cm /{nombre} Do Q"
+            for nombre, (x, y) in zip(imagenes, celdas)
+        )
+        pdf.add_page(A4[0], A4[1], contenido, imagenes)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        imagenes = {}
+        for ancho, alto, datos in _render_in_order(executor, payloads, pixeles, por_pagina * PAGES_AHEAD):
+            imagenes[f"Im{len(imagenes)}"] = pdf.add_image(ancho, alto, datos)
+            etiquetas += 1
+            if len(imagenes) == por_pagina:
+                cerrar_pagina(imagenes)
+                imagenes = {}
+        if imagenes:
+            cerrar_pagina(imagenes)
+    pdf.close()
+    return {"etiquetas": etiquetas, "paginas": len(pdf.paginas), "segundos": round(time.perf_counter() - inicio, 2)}
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.label_sheets", description="Hojas A4 de etiquetas QR en PDF")
+    parser.add_argument("salida", help="Archivo PDF de salida")
+    parser.add_argument("--ids", type=lambda v: [i.strip() for i in v.split(",") if i.strip()],
+                        help="IDs de lotes separados por comas (en ese orden)")
+    parser.add_argument("--desde", type=_fecha, help="Fecha de producción desde (AAAA-MM-DD, incluida)")
+    parser.add_argument("--hasta", type=_fecha, help="Fecha de producción hasta (AAAA-MM-DD, excluida)")
+    parser.add_argument("--producto")
+    parser.add_argument("--proveedor")
+    parser.add_argument("--columnas", type=int, default=DEFAULT_COLUMNS)
+    parser.add_argument("--filas", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--margen", type=float, default=DEFAULT_MARGIN_MM, help="Margen de la hoja en mm")
+    parser.add_argument("--separacion", type=float, default=DEFAULT_GAP_MM, help="Separación entre etiquetas en mm")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--workers", type=int, help="Procesos de render (por defecto RENDER_WORKERS)")
+    args = parser.parse_args(argv)
+    if not (args.ids or args.desde or args.hasta or args.producto or args.proveedor):
+        parser.error("indica --ids o un filtro (--desde, --hasta, --producto, --proveedor)")
+
+    base_url = get_settings().base_url
+    if not base_url:
+        print("❌ BASE_URL no está configurada: el QR no tendría la URL del lote")
+        return 1
+    from src.database_manager import get_database_manager
+    db = get_database_manager()
+    if not db.is_available():
+        print("❌ No se pudo abrir la base de datos")
+        return 1
+
+    lotes = iter_lotes(db, args.ids, desde=args.desde, hasta=args.hasta, product=args.producto,
+                       supplier=args.proveedor)
+    payloads = (lote_qr_payload(lote, base_url) for lote in lotes)
+    try:
+        with open(args.salida, "wb") as salida:
+            resumen = write_label_sheets(salida, payloads, args.columnas, args.filas, args.margen,
+                                         args.separacion, args.dpi, args.workers)
+    except ValueError as e:
+        os.remove(args.salida)
+        print(f"❌ {e}")
+        return 1
+    por_segundo = resumen["etiquetas"] / resumen["segundos"] if resumen["segundos"] else 0
+    print(f"✅ {resumen['etiquetas']} etiquetas en {resumen['paginas']} páginas ({args.salida}) "
+          f"en {resumen['segundos']} s ({por_segundo:.1f} etiquetas/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Alta de lotes: validación, guardado y etiqueta QR.
+
+Es el mismo flujo para el formulario del generador (src/app.py) y para POST /api/lotes
+(src/scan_server.py), así el arnés de carga (scripts/load_test.py) ejercita exactamente
+el camino que recorren los operadores.
+"""
+import base64
+from datetime import datetime
+
+from src.catalog import get_catalog_store
+from src.metrics import span
+from src.utils import DATE_FORMAT
+
+# (campo, aviso si falta), en el orden del formulario
+CAMPOS_REQUERIDOS = [
+    ("operatorName", "⚠️ Por favor, ingrese el nombre del operador"),
+    ("operatorCode", "⚠️ Por favor, ingrese el código del operador"),
+    ("productType", "⚠️ Por favor, ingrese el tipo de producto"),
+    ("quantity", "⚠️ Por favor, ingrese la cantidad"),
+    ("supplier", "⚠️ Por favor, ingrese el proveedor"),
+]
+
+
+class LoteInvalido(ValueError):
+    """Falta un campo obligatorio del formulario (el mensaje es el aviso para el operador)"""
+
+
+def validar_lote(datos):
+    for campo, aviso in CAMPOS_REQUERIDOS:
+        if not str(datos.get(campo) or "").strip():
+            raise LoteInvalido(aviso)
+
+
+def build_qr_data(operator_name, operator_code, product_type, quantity, supplier, date=None, unit=None):
+    """Datos del lote tal como los arma el formulario (cantidad como texto "<valor> <unidad>")"""
+    unit = unit or "kg"
+    return {
+        "operatorName": operator_name,
+        "operatorCode": operator_code,
+        "productType": product_type,
+        "quantity": f"{quantity} {unit}" if str(quantity or "").strip() else "",
+        "supplier": supplier,
+        "date": date or datetime.now().strftime(DATE_FORMAT),
+        "unit": unit,  # Guardar unidad por separado también
+    }
+
+
+def build_qr_payload(qr_data, qr_url):
+    """Texto de lectura offline + URL del dashboard en vivo"""
+    return f"""--- LoteTracker ---
+Producto: {qr_data['productType']}
+Cantidad: {qr_data['quantity']}
+Proveedor: {qr_data['supplier']}
+Fecha: {qr_data['date']}
+Operador: {qr_data['operatorName']}
+Código Op: {qr_data['operatorCode']}
+
+-------------------
+Ver Dashboard en Vivo:
+{qr_url}
+"""
+
+
+def lote_qr_payload(lote, base_url):
+    """El texto del QR de un lote ya guardado (el mismo que se imprimió al crearlo)"""
+    return build_qr_payload(
+        {campo: lote.get(campo, "") for campo in
+         ("productType", "quantity", "supplier", "date", "operatorName", "operatorCode")},
+        f"{base_url}/lote/{lote['_id']}",
+    )
+
+
+def iter_lotes(db, ids=None, **filtros):
+    """
+    Lotes a imprimir: los de `ids` en ese orden (avisa de los que no existen) o, sin ids,
+    los que cumplen `filtros` (desde, hasta, product, supplier) leídos con iter_records, archivados incluidos.
+    """
+    if not ids:
+        yield from db.iter_records(**filtros)
+        return
+    for lote_id in ids:
+        lote = db.get_lote_by_id(lote_id)
+        if lote is None:
+            print(f"⚠️ Lote no encontrado: {lote_id}")
+            continue
+        yield lote
+
+
+def generar_etiqueta(qr_data, lote_id, base_url, render_job):
+    """Etiqueta PNG en base64 de un lote ya guardado (también para reintentar un render fallido)"""
+    # El hilo espera al proceso de render sin retener el GIL
+    qr_payload_string = build_qr_payload(qr_data, f"{base_url}/lote/{lote_id}")
+    with span("render"):
+        png = render_job.render_png(qr_payload_string)
+    with span("encode"):
+        return base64.b64encode(png).decode()
+
+
+def crear_lote(db, qr_data, base_url, render_job):
+    """
+    Guarda el lote y genera su etiqueta con un cupo ya reservado del pool de render
+    (RenderService.reserve). Modifica qr_data con los nombres canónicos del catálogo.
+    Retorna (lote_id, etiqueta PNG en base64). Cualquier excepción posterior al alta
+    (RenderTimeout, BrokenProcessPool...) se propaga con el lote ya guardado en `lote_id`:
+    hay que reintentar solo la etiqueta (generar_etiqueta), no el alta.
+    """
+    validar_lote(qr_data)
+
+    # El catálogo devuelve el nombre canónico (deduplicado por clave)
+    with span("db_write"):
+        qr_data["productType"] = db.add_product(qr_data["productType"])
+        qr_data["supplier"] = db.add_supplier(qr_data["supplier"])
+        lote_id = db.add_history_record(qr_data).inserted_id
+
+    try:
+        get_catalog_store().note_operator(qr_data["operatorName"], qr_data["operatorCode"])
+        img_base64 = generar_etiqueta(qr_data, lote_id, base_url, render_job)
+    except Exception as e:
+        e.lote_id = lote_id
+        raise
+    return lote_id, img_base64
@@ -0,0 +1,55 @@
+"""
+Tareas de mantenimiento de la base de datos.
+
+Uso:
+    python -m src.maintenance catalogo    # normaliza y fusiona productos/proveedores duplicados
+    python -m src.maintenance fechas      # rellena fecha_produccion (datetime) en registros antiguos
+    python -m src.maintenance rollup [--desde AAAA-MM-DD]   # recalcula produccion_diaria
+    python -m src.maintenance cantidades  # añade unidad base y cantidades base a registros antiguos
+    python -m src.maintenance archivar [--dias N] [--lote N]   # mueve lotes cerrados a registros_archivo
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from src.database_manager import DatabaseManager
+from src.settings import get_settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.maintenance", description="Mantenimiento de LoteTracker")
+    sub = parser.add_subparsers(dest="tarea", required=True)
+    sub.add_parser("catalogo", help="Migración única de claves normalizadas del catálogo")
+    sub.add_parser("fechas", help="Migración única de fechas string a datetime")
+    sub.add_parser("cantidades", help="Migración única de cantidades a unidad base")
+    rollup = sub.add_parser("rollup", help="Recalcula los totales diarios de producción")
+    rollup.add_argument("--desde", type=lambda v: datetime.strptime(v, "%Y-%m-%d"),
+                        help="Solo recalcula a partir de este día (por defecto, todo)")
+    archivar = sub.add_parser("archivar", help="Mueve los lotes sin stock antiguos a registros_archivo")
+    archivar.add_argument("--dias", type=int, default=get_settings().archive_after_days,
+                          help="Antigüedad mínima (fecha de producción) en días (por defecto ARCHIVE_AFTER_DAYS)")
+    archivar.add_argument("--lote", type=int, default=1000, help="Lotes por tanda")
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager()
+    if db.db is None:
+        print("❌ No se pudo conectar a MongoDB")
+        return 1
+
+    if args.tarea == "catalogo":
+        resumen = db.migrate_catalog_keys()
+        print(f"✅ Catálogo migrado: {resumen}")
+    elif args.tarea == "fechas":
+        print(f"✅ Registros con fecha tipada: {db.migrate_record_dates()}")
+    elif args.tarea == "cantidades":
+        print(f"✅ Registros con cantidad base: {db.migrate_quantities()}")
+    elif args.tarea == "rollup":
+        db.rollup_production(desde=args.desde)
+        print("✅ produccion_diaria actualizada")
+    elif args.tarea == "archivar":
+        print(f"✅ Lotes archivados: {db.archive_closed_lots(args.dias, args.lote)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Latencia por etapa de las operaciones de la app (METRICS=1).
+
+    with trace("on_generate_qr"):
+        with span("db_write"):
+            ...
+
+Una operación es un handler o un loader (cada lote de batch_updates abre la suya); sus
+etapas con nombre alimentan histogramas por (operación, etapa) que se exportan en formato
+de texto de Prometheus en /metrics. Con METRICS_TRACE=<archivo> además se escribe una línea
+JSON por operación con la duración de cada etapa.
+
+Desactivado (por defecto), trace() y span() retornan un context manager vacío compartido:
+el costo es una llamada y una comparación. Un span fuera de una operación no se registra.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from src.settings import get_settings
+
+# Límites superiores de los buckets, en segundos (el último bucket es +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+OPERATION_METRIC = "lotetracker_operation_seconds"
+SPAN_METRIC = "lotetracker_span_seconds"
+MONGO_METRIC = "lotetracker_mongo_command_seconds"  # src/db_monitoring.py
+
+HELP = {
+    OPERATION_METRIC: "Duración total de cada operación (handler o loader)",
+    SPAN_METRIC: "Duración de cada etapa de una operación",
+    MONGO_METRIC: "Duración de los comandos enviados a MongoDB",
+}
+
+_local = threading.local()
+_enabled = None
+_trace_writer = None
+
+
+def metrics_enabled():
+    """Se consulta la configuración una sola vez (y no al importar: ver check_startup)"""
+    global _enabled, _trace_writer
+    if _enabled is None:
+        settings = get_settings()
+        if settings.metrics_trace:
+            _trace_writer = TraceWriter(settings.metrics_trace)
+        _enabled = settings.metrics_enabled
+    return _enabled
+
+
+class _NoOp:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+class Histogram:
+    """Buckets acumulables al exportar, suma y cantidad de observaciones"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, segundos):
+        self.counts[bisect_left(BUCKETS, segundos)] += 1
+        self.sum += segundos
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histogramas del proceso, por métrica y etiquetas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (métrica, ((etiqueta, valor), ...)) -> Histogram
+
+    def observe(self, metric, labels, segundos):
+        clave = (metric, labels)
+        with self._lock:
+            histogram = self._histograms.get(clave)
+            if histogram is None:
+                histogram = self._histograms[clave] = Histogram()
+            histogram.observe(segundos)
+
+    def render_prometheus(self):
+        """Formato de texto de Prometheus (versión 0.0.4)"""
+        lineas = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+        for metric, ayuda in HELP.items():
+            lineas.append(f"# HELP {metric} {ayuda}")
+            lineas.append(f"# TYPE {metric} histogram")
+            for (nombre, labels), histogram in items:
+                if nombre != metric:
+                    continue
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                acumulado = 0
+                for limite, cuenta in zip(BUCKETS + (None,), histogram.counts):
+                    acumulado += cuenta
+                    le = "+Inf" if limite is None else repr(limite)
+                    lineas.append(f'{metric}_bucket{{{base},le="{le}"}} {acumulado}')
+                lineas.append(f"{metric}_sum{{{base}}} {histogram.sum!r}")
+                lineas.append(f"{metric}_count{{{base}}} {histogram.count}")
+        return "\n".join(lineas) + "\n"
+
+
+def _escape(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TraceWriter:
+    """Archivo JSON-lines con una línea por operación (METRICS_TRACE)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, registro):
+        linea = json.dumps(registro, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(linea)
+            except OSError as e:
+                print(f"❌ Error al escribir la traza de métricas: {e}")
+
+
+class _Trace:
+    __slots__ = ("operation", "inicio", "spans")
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.spans = {}
+
+    def __enter__(self):
+        _local.trace = self
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self.inicio
+        _local.trace = None
+        _registry.observe(OPERATION_METRIC, (("operation", self.operation),), total)
+        if _trace_writer is not None:
+            registro = {
+                "ts": round(time.time() - total, 6),
+                "operation": self.operation,
+                "total_ms": round(total * 1000, 3),
+                "spans": {nombre: round(s * 1000, 3) for nombre, s in self.spans.items()},
+            }
+            if exc_type is not None:
+                registro["error"] = exc_type.__name__
+            _trace_writer.write(registro)
+        return False
+
+
+class _Span:
+    __slots__ = ("name", "trace", "inicio")
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        segundos = time.perf_counter() - self.inicio
+        trace = self.trace
+        trace.spans[self.name] = trace.spans.get(self.name, 0.0) + segundos
+        _registry.observe(SPAN_METRIC, (("operation", trace.operation), ("span", self.name)), segundos)
+        return False
+
+
+def trace(operation):
+    """Abre una operación en el hilo actual (anidada dentro de otra, cuenta como una etapa)"""
+    if not metrics_enabled():
+        return _NOOP
+    actual = getattr(_local, "trace", None)
+    if actual is not None:
+        return _Span(operation, actual)
+    return _Trace(operation)
+
+
+def span(name):
+    """Mide una etapa de la operación en curso"""
+    if not metrics_enabled():
+        return _NOOP
+    actual = getattr(_local, "trace", None)
+    if actual is None:
+        return _NOOP
+    return _Span(name, actual)
+
+
+_registry = MetricsRegistry()
+
+
+def observe(metric, labels, segundos):
+    """Registra una duración medida por otro módulo (p. ej. los comandos de MongoDB)"""
+    _registry.observe(metric, labels, segundos)
+
+
+def render_prometheus():
+    return _registry.render_prometheus()
@@ -0,0 +1,205 @@
+"""
+Servicio de render de etiquetas fuera del proceso de la app.
+
+generate_qr_image es trabajo de CPU (PIL) que retiene el GIL mientras dura; si se ejecuta en el
+hilo del handler de Flet, todas las sesiones del servidor se congelan cuando varios operadores
+pulsan "Generar" a la vez. Aquí el render se envía a un pool de procesos con las fuentes ya
+cargadas, con un número acotado de trabajos admitidos (backpressure), tiempo máximo por trabajo
+y métricas de cola y tiempo de servicio.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from src.settings import get_settings
+from src.utils import render_qr_png
+
+RENDER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+RENDER_TIMEOUT = 10.0
+
+
+class RenderQueueFull(Exception):
+    """No hay cupo en la cola de render: la UI debe pedir al operador que reintente"""
+
+
+class RenderTimeout(Exception):
+    """El render no terminó dentro del tiempo máximo por trabajo"""
+
+
+def _init_worker():
+    """Inicializa cada proceso del pool: el primer render carga qrcode, PIL y las fuentes"""
+    render_qr_png("warmup")
+
+
+def _render_job(payload):
+    """Se ejecuta en el proceso del pool; retorna (png, segundos de servicio)"""
+    inicio = time.perf_counter()
+    png = render_qr_png(payload)
+    return png, time.perf_counter() - inicio
+
+
+class RenderJob:
+    """Cupo reservado en el servicio; permite renderizar una etiqueta sin volver a hacer cola"""
+
+    def __init__(self, service):
+        self._service = service
+
+    def render_png(self, payload, timeout=None):
+        return self._service._run(payload, timeout)
+
+
+class RenderService:
+    """
+    Pool de procesos para el render de QR.
+    `max_pending` limita los trabajos admitidos (en curso + en cola); pasado ese límite
+    reserve()/render_png() lanzan RenderQueueFull en lugar de encolar sin fin.
+    """
+
+    def __init__(self, workers=RENDER_WORKERS, max_pending=None, timeout=RENDER_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.reserved = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.service_time_total = 0.0
+        self.service_time_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """Descarta un pool roto (p. ej. un proceso terminó de forma abrupta); el siguiente trabajo crea otro"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @contextmanager
+    def reserve(self):
+        """
+        Reserva un cupo antes de empezar el trabajo del operador.
+        Lanza RenderQueueFull de inmediato si el servicio está saturado.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise RenderQueueFull()
+        with self._lock:
+            self.reserved += 1
+        try:
+            yield RenderJob(self)
+        finally:
+            with self._lock:
+                self.reserved -= 1
+            self._slots.release()
+
+    def render_png(self, payload, timeout=None):
+        """Renderiza una etiqueta y retorna los bytes PNG"""
+        with self.reserve() as job:
+            return job.render_png(payload, timeout)
+
+    def _run(self, payload, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        executor = self._get_executor()
+        inicio = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            try:
+                # submit también lanza BrokenProcessPool si el pool se rompió estando ocioso
+                future = executor.submit(_render_job, payload)
+                png, servicio = future.result(timeout=timeout)
+            except FuturesTimeout:
+                # Si aún no empezó se descarta; si ya corre, el worker lo termina en segundo plano
+                future.cancel()
+                with self._lock:
+                    self.timeouts += 1
+                raise RenderTimeout(f"El render superó {timeout:g} s")
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                with self._lock:
+                    self.failed += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        latencia = time.perf_counter() - inicio
+        with self._lock:
+            self.completed += 1
+            self.service_time_total += servicio
+            self.service_time_max = max(self.service_time_max, servicio)
+            self.latency_total += latencia
+            self.latency_max = max(self.latency_max, latencia)
+        return png
+
+    def warm_up(self):
+        """Arranca todos los procesos del pool (cada uno carga fuentes y tablas en su inicializador)"""
+        executor = self._get_executor()
+        futures = [executor.submit(_render_job, "warmup") for _ in range(self.workers)]
+        for future in futures:
+            future.result(timeout=self.timeout * 3)
+
+    def stats(self):
+        """Métricas del servicio: profundidad de cola, trabajos en curso y tiempos (segundos)"""
+        with self._lock:
+            hechos = self.completed
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "reserved": self.reserved,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "completed": hechos,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "service_time_avg": round(self.service_time_total / hechos, 4) if hechos else 0.0,
+                "service_time_max": round(self.service_time_max, 4),
+                "latency_avg": round(self.latency_total / hechos, 4) if hechos else 0.0,
+                "latency_max": round(self.latency_max, 4),
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_render_service = None
+_render_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Servicio de render compartido por todas las sesiones del proceso"""
+    global _render_service
+    if _render_service is None:
+        with _render_service_lock:
+            if _render_service is None:
+                settings = get_settings()
+                _render_service = RenderService(
+                    workers=settings.render_workers or RENDER_WORKERS,
+                    max_pending=settings.render_max_pending,
+                    timeout=settings.render_timeout or RENDER_TIMEOUT,
+                )
+    return _render_service
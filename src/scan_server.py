@@ -0,0 +1,322 @@
+"""
+Servidor HTTP que acompaña a la app Flet.
+
+Cada teléfono que escanea una etiqueta abre BASE_URL/lote/<id>. En lugar de descargar el
+cliente web de Flet, abrir un websocket y construir el dashboard completo, esa ruta se responde
+aquí con una página HTML pequeña (o JSON) renderizada en el servidor a partir de una sola consulta.
+El resto de rutas (/, /dashboard, /ws, estáticos) las sigue sirviendo Flet.
+"""
+import hashlib
+import hmac
+import html
+import json
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import flet.fastapi as flet_fastapi
+from fastapi import Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from starlette.routing import Mount
+
+from src.render_service import RenderQueueFull, RenderTimeout, get_render_service
+from src.settings import get_settings
+from src.metrics import render_prometheus, span, trace
+from src.ui_batch import get_ui_stats
+from src.sessions import get_session_registry
+
+# Caché HTTP: el stock puede cambiar por despachos, así que se permite poco tiempo de frescura
+CACHE_CONTROL_FOUND = "public, max-age=30, stale-while-revalidate=60"
+CACHE_CONTROL_NOT_FOUND = "public, max-age=10"
+# Base de datos caída: no se cachea (un "no encontrado" cacheado duraría más que la caída)
+DB_UNAVAILABLE_HEADERS = {"Cache-Control": "no-store", "Retry-After": "5", "Vary": "Accept"}
+
+# Una exportación a la vez: cada una mantiene un cursor abierto mientras dura la descarga
+_export_slot = threading.BoundedSemaphore(1)
+
+LOTE_FIELDS = [
+    ("productType", "Producto"),
+    ("estado", "Estado"),
+    ("cantidad_inicial", "Cantidad Inicial"),
+    ("unit", "Medida"),
+    ("cantidad_restante", "Cantidad Restante"),
+    ("supplier", "Proveedor"),
+    ("operatorName", "Operador"),
+    ("date", "Fecha"),
+]
+
+def lote_to_dict(lote_id, lote):
+    """Campos públicos del lote, serializables a JSON"""
+    datos = {"id": str(lote_id)}
+    for campo, _ in LOTE_FIELDS:
+        valor = lote.get(campo)
+        datos[campo] = valor if isinstance(valor, (str, int, float)) or valor is None else str(valor)
+    return datos
+
+
+def render_lote_html(datos):
+    """Página mínima, sin JavaScript, con los mismos colores del dashboard"""
+    filas = "".join(
+        f"<tr><th>{html.escape(etiqueta)}</th><td>{html.escape(str(datos.get(campo) if datos.get(campo) is not None else 'N/A'))}</td></tr>"
+        for campo, etiqueta in LOTE_FIELDS
+    )
+    lote_id = html.escape(datos["id"])
+    return f"""<!doctype html>
+<html lang="es"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width,initial-scale=1">
+<title>Lote {lote_id} - LoteTracker</title>
+<style>
+body{{margin:0;font-family:system-ui,sans-serif;background:#F3F3F3;color:#2D3748}}
+header{{background:#C6F6D5;padding:14px 16px;font-size:18px;color:#22543D}}
+main{{max-width:600px;margin:16px auto;background:#fff;border-radius:16px;padding:20px;box-shadow:0 2px 8px #0001}}
+h1{{font-size:20px;font-weight:500;color:#22543D;margin:0 0 12px}}
+table{{width:100%;border-collapse:collapse}}th,td{{text-align:left;padding:8px 4px;border-bottom:1px solid #E6EDF0}}
+th{{width:45%}}a{{color:#38A169}}small{{color:#717182}}
+</style></head><body>
+<header>Dashboard de Trazabilidad</header>
+<main><h1>Detalle del Lote</h1><table>{filas}</table>
+<p><a href="/dashboard/lote/{lote_id}">Abrir dashboard completo</a></p>
+<small>ID: {lote_id}</small></main>
+</body></html>"""
+
+
+def render_not_found_html(lote_id):
+    return f"""<!doctype html>
+<html lang="es"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width,initial-scale=1"><title>Lote no encontrado</title></head>
+<body style="font-family:system-ui,sans-serif;padding:24px;color:#D53F3F">
+<b>❌ Error: Lote no encontrado. Es posible que el ID no exista o sea incorrecto.</b>
+<p style="color:#717182">{html.escape(lote_id)}</p></body></html>"""
+
+
+def render_unavailable_html(lote_id):
+    return f"""<!doctype html>
+<html lang="es"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width,initial-scale=1"><title>Servicio no disponible</title></head>
+<body style="font-family:system-ui,sans-serif;padding:24px;color:#D53F3F">
+<b>⚠️ No se pudo consultar la base de datos. Vuelve a escanear en unos segundos.</b>
+<p style="color:#717182">{html.escape(lote_id)}</p></body></html>"""
+
+
+def wants_json(request: Request):
+    if request.query_params.get("format") == "json":
+        return True
+    return "application/json" in request.headers.get("accept", "")
+
+
+def token_valido(request: Request, token):
+    """Authorization: Bearer <token> o ?token=, comparado en tiempo constante"""
+    autorizacion = request.headers.get("authorization", "")
+    recibido = autorizacion[7:] if autorizacion.lower().startswith("bearer ") else request.query_params.get("token", "")
+    return hmac.compare_digest(recibido.encode(), token.encode())
+
+
+def no_autorizado():
+    return JSONResponse({"error": "Token inválido"}, status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+
+def _crear_lote(cuerpo, incluir_qr):
+    from pymongo.errors import PyMongoError
+    from src.database_manager import get_database_manager
+    from src.lotes import LoteInvalido, build_qr_data, crear_lote, validar_lote
+
+    base_url = get_settings().base_url
+    if not base_url:
+        return JSONResponse({"error": "BASE_URL no está configurada"}, status_code=500)
+    qr_data = build_qr_data(
+        operator_name=cuerpo.get("operatorName"),
+        operator_code=cuerpo.get("operatorCode"),
+        product_type=cuerpo.get("productType"),
+        quantity=cuerpo.get("quantity"),
+        supplier=cuerpo.get("supplier"),
+        date=cuerpo.get("date"),
+        unit=cuerpo.get("unit"),
+    )
+    try:
+        with trace("api_lotes"):
+            with span("validate"):
+                validar_lote(qr_data)
+            with get_render_service().reserve() as render_job:
+                lote_id, img_base64 = crear_lote(get_database_manager(), qr_data, base_url, render_job)
+    except LoteInvalido as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except RenderQueueFull:
+        return JSONResponse({"error": "Pool de render lleno"}, status_code=503, headers={"Retry-After": "1"})
+    except RenderTimeout as e:
+        return JSONResponse({"error": "Render demasiado lento", "id": str(e.lote_id)}, status_code=504)
+    except BrokenProcessPool as e:
+        # El lote quedó guardado; el pool se recrea en el siguiente render
+        return JSONResponse({"error": "Falló el proceso de render", "id": str(e.lote_id)}, status_code=503)
+    except Exception as e:
+        if getattr(e, "lote_id", None) is not None:
+            # Falló la etiqueta de un lote ya guardado: el cliente no debe reintentar el alta
+            print(f"❌ Error al generar la etiqueta del lote {e.lote_id}: {e!r}")
+            return JSONResponse({"error": "No se generó la etiqueta", "id": str(e.lote_id)}, status_code=500)
+        if isinstance(e, PyMongoError):
+            print(f"❌ Error de base de datos en POST /api/lotes: {e}")
+            return JSONResponse({"error": "Base de datos no disponible"}, status_code=503)
+        raise
+
+    datos = {"id": str(lote_id), "url": f"{base_url}/lote/{lote_id}"}
+    if incluir_qr:
+        datos["qr"] = img_base64
+    return JSONResponse(datos, status_code=201)
+
+
+def create_asgi_app(session_handler):
+    """Crea la app ASGI: rutas ligeras de escaneo + la app Flet montada en "/" """
+    app = flet_fastapi.app(session_handler)
+
+    @app.get("/lote/{lote_id}")
+    def lote_scan(lote_id: str, request: Request):
+        # FastAPI ejecuta los handlers síncronos en un threadpool: pymongo no bloquea el event loop
+        from pymongo.errors import PyMongoError  # pymongo se carga con el primer escaneo
+        from src.database_manager import get_database_manager
+        as_json = wants_json(request)
+        try:
+            lote = get_database_manager().get_lote_by_id(lote_id)
+        except PyMongoError:
+            if as_json:
+                return JSONResponse({"error": "Base de datos no disponible", "id": lote_id}, status_code=503,
+                                    headers=DB_UNAVAILABLE_HEADERS)
+            return HTMLResponse(render_unavailable_html(lote_id), status_code=503, headers=DB_UNAVAILABLE_HEADERS)
+
+        if lote is None:
+            headers = {"Cache-Control": CACHE_CONTROL_NOT_FOUND, "Vary": "Accept"}
+            if as_json:
+                return JSONResponse({"error": "Lote no encontrado", "id": lote_id}, status_code=404, headers=headers)
+            return HTMLResponse(render_not_found_html(lote_id), status_code=404, headers=headers)
+
+        datos = lote_to_dict(lote_id, lote)
+        cuerpo = json.dumps(datos, ensure_ascii=False) if as_json else render_lote_html(datos)
+        etag = '"' + hashlib.sha1(cuerpo.encode("utf-8")).hexdigest() + '"'
+        headers = {"Cache-Control": CACHE_CONTROL_FOUND, "ETag": etag, "Vary": "Accept"}
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        media_type = "application/json" if as_json else "text/html; charset=utf-8"
+        return Response(cuerpo, media_type=media_type, headers=headers)
+
+    if get_settings().load_test_api:
+        # Escritura sin autenticación: solo existe con LOAD_TEST_API=1 (lo activa scripts/load_test.py)
+        @app.post("/api/lotes")
+        async def crear_lote_api(request: Request):
+            """
+            Alta de un lote con el mismo flujo que el formulario del generador (lo usa el arnés
+            de carga). Cuerpo JSON: operatorName, operatorCode, productType, quantity, unit,
+            supplier y date (opcional, por defecto ahora). Responde 201 con id, url y la etiqueta
+            PNG en base64 (omitida con ?qr=0); 503 con Retry-After si el pool de render está lleno.
+            """
+            from starlette.concurrency import run_in_threadpool
+            try:
+                cuerpo = await request.json()
+            except ValueError:
+                return JSONResponse({"error": "JSON inválido"}, status_code=400)
+            if not isinstance(cuerpo, dict):
+                return JSONResponse({"error": "JSON inválido"}, status_code=400)
+            # pymongo y el render bloquean: se ejecutan en el threadpool, como las rutas síncronas
+            return await run_in_threadpool(_crear_lote, cuerpo, request.query_params.get("qr") != "0")
+
+    export_token = get_settings().export_token
+    if export_token:
+        # Sin EXPORT_TOKEN la exportación masiva queda solo en la CLI (python -m src.export)
+        @app.get("/api/export")
+        def export_csv(request: Request):
+            """
+            Lotes en CSV, en streaming (src/export.py). Requiere el token (Authorization: Bearer
+            <EXPORT_TOKEN> o ?token=). Parámetros opcionales: desde y hasta (AAAA-MM-DD),
+            producto, proveedor, campos (separados por comas) y batch_size. 429 si ya hay una
+            exportación en curso.
+            """
+            from fastapi.responses import StreamingResponse
+            from src.database_manager import get_database_manager
+            from src.export import DEFAULT_BATCH_SIZE, iter_csv
+            params = request.query_params
+            if not token_valido(request, export_token):
+                return no_autorizado()
+            try:
+                filtros = {
+                    clave: datetime.strptime(params[clave], "%Y-%m-%d") for clave in ("desde", "hasta") if params.get(clave)
+                }
+                batch_size = int(params.get("batch_size", DEFAULT_BATCH_SIZE))
+            except ValueError:
+                return JSONResponse({"error": "Usa fechas AAAA-MM-DD y un batch_size entero"}, status_code=400)
+            db = get_database_manager()
+            if not db.is_available():
+                return JSONResponse({"error": "Base de datos no disponible"}, status_code=503)
+            if not _export_slot.acquire(blocking=False):
+                return JSONResponse({"error": "Ya hay una exportación en curso"}, status_code=429,
+                                    headers={"Retry-After": "30"})
+            campos = [c.strip() for c in params.get("campos", "").split(",") if c.strip()] or None
+
+            def contenido():
+                # El turno se libera al terminar, fallar o cerrarse la descarga (close() del generador)
+                try:
+                    yield from iter_csv(db, campos, max(1, batch_size), product=params.get("producto"),
+                                        supplier=params.get("proveedor"), **filtros)
+                finally:
+                    _export_slot.release()
+
+            # Generador síncrono: Starlette lo recorre en el threadpool, un trozo por lote leído
+            return StreamingResponse(contenido(), media_type="text/csv; charset=utf-8", headers={
+                "Content-Disposition": 'attachment; filename="lotes.csv"',
+            })
+
+    diagnostics_token = get_settings().diagnostics_token
+    if diagnostics_token:
+        # Sin DIAGNOSTICS_TOKEN no existen: exponen sesiones, colecciones y tiempos a cualquiera en la red
+        def diagnostico(ruta):
+            """Registra una ruta GET de diagnóstico que exige el token"""
+            def registrar(handler):
+                def protegido(request: Request):
+                    if not token_valido(request, diagnostics_token):
+                        return no_autorizado()
+                    return handler()
+                protegido.__name__, protegido.__doc__ = handler.__name__, handler.__doc__
+                return app.get(ruta)(protegido)
+            return registrar
+
+        @diagnostico("/metrics")
+        def metrics():
+            """Histogramas de latencia por operación y etapa, en formato Prometheus (requiere METRICS=1)"""
+            return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+        @diagnostico("/api/cache")
+        def cache_stats():
+            """Contadores de las cachés del proceso (hits, misses, evictions)"""
+            from src.database_manager import get_database_manager
+            return get_database_manager().get_cache_stats()
+
+        @diagnostico("/api/storage")
+        def storage_stats():
+            """Almacenamiento en uso; con STORAGE=sqlite, lo pendiente de subir y el estado de la sincronización"""
+            from src.database_manager import get_database_manager
+            return get_database_manager().storage_stats()
+
+        @diagnostico("/api/db")
+        def db_stats():
+            """Duración de los comandos de MongoDB por colección y por forma de consulta (DB_MONITORING=1)"""
+            from src.db_monitoring import get_command_monitor
+            monitor = get_command_monitor()
+            if monitor is None:
+                return JSONResponse({"error": "DB_MONITORING no está activo"}, status_code=404)
+            return monitor.stats()
+
+        @diagnostico("/api/render")
+        def render_stats():
+            """Métricas del pool de render (cola, trabajos en curso, tiempo de servicio)"""
+            return get_render_service().stats()
+
+        @diagnostico("/api/ui")
+        def ui_stats():
+            """Actualizaciones de UI y bytes enviados por evento (requiere UI_METRICS=1)"""
+            return get_ui_stats()
+
+        @diagnostico("/api/sessions")
+        def sessions_stats():
+            """Cantidad de sesiones, memoria estimada de cada una y RSS del proceso"""
+            return get_session_registry().stats()
+
+    # Las rutas propias deben evaluarse antes que el Mount("/") de los estáticos de Flet
+    app.router.routes.sort(key=lambda route: isinstance(route, Mount))
+    return app
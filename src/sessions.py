@@ -0,0 +1,117 @@
+"""
+Registro de sesiones abiertas del proceso y estimación de su memoria.
+
+Sirve para ver, en un servidor que corre toda la jornada, cuántas sesiones hay, cuáles
+siguen conectadas y cuánto ocupa cada una (sus vistas en caché y los datos que cuelgan de ellas).
+"""
+import sys
+import threading
+import time
+
+
+def estimate_view_bytes(view):
+    """
+    Estimación (no exacta) del tamaño de una vista: cada control del árbol más los
+    valores de sus propiedades (textos, imágenes en base64, filas de tablas...).
+    """
+    total, pendientes, vistos = 0, [view], set()
+    while pendientes:
+        control = pendientes.pop()
+        if id(control) in vistos:
+            continue
+        vistos.add(id(control))
+        total += sys.getsizeof(control)
+        for valor, _ in getattr(control, "_Control__attrs", {}).values():
+            total += sys.getsizeof(valor)
+        try:
+            pendientes.extend(control._get_children())
+        except Exception:
+            pass
+    return total
+
+
+def process_rss_bytes():
+    """Memoria residente actual del proceso (Linux); en otros sistemas, el máximo alcanzado"""
+    try:
+        with open("/proc/self/status") as status:
+            for linea in status:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo if sys.platform == "darwin" else maximo * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class SessionInfo:
+    __slots__ = ("created", "last_seen", "connected", "route", "view_cache")
+
+    def __init__(self, view_cache):
+        self.created = time.time()
+        self.last_seen = self.created
+        self.connected = True
+        self.route = None
+        self.view_cache = view_cache
+
+    def to_dict(self):
+        # Sin session_id ni IP: con ellos se podría reenganchar el websocket de otra sesión
+        vistas = self.view_cache.views()
+        return {
+            "connected": self.connected,
+            "route": self.route,
+            "created": round(self.created, 1),
+            "idle_seconds": round(time.time() - self.last_seen, 1),
+            "views": len(vistas),
+            "estimated_bytes": sum(estimate_view_bytes(v) for v in vistas),
+        }
+
+
+class SessionRegistry:
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def register(self, page, view_cache):
+        info = SessionInfo(view_cache)
+        with self._lock:
+            self._sessions[page.session_id] = info
+        return info
+
+    def unregister(self, page):
+        with self._lock:
+            self._sessions.pop(page.session_id, None)
+
+    def touch(self, page, route=None, connected=None):
+        with self._lock:
+            info = self._sessions.get(page.session_id)
+        if info is None:
+            return
+        info.last_seen = time.time()
+        if route is not None:
+            info.route = route
+        if connected is not None:
+            info.connected = connected
+
+    def stats(self):
+        with self._lock:
+            sesiones = list(self._sessions.values())
+        detalle = [s.to_dict() for s in sesiones]
+        return {
+            "rss_bytes": process_rss_bytes(),
+            "sessions": len(detalle),
+            "connected": sum(1 for s in detalle if s["connected"]),
+            "estimated_bytes": sum(s["estimated_bytes"] for s in detalle),
+            "detail": detalle,
+        }
+
+
+_registry = SessionRegistry()
+
+
+def get_session_registry():
+    """Registro de sesiones del proceso"""
+    return _registry
@@ -0,0 +1,94 @@
+"""
+Configuración de la app, leída una sola vez por proceso (.env + variables de entorno).
+
+Antes cada DatabaseManager y cada GeneratorPage volvía a leer el .env; ahora todos
+usan get_settings(), que lo carga la primera vez y reutiliza el resultado.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_uri: Optional[str]
+    db_name: str
+    base_url: Optional[str]
+    catalog_search: str        # "memory" | "server"
+    view_cache_size: int
+    shared_state: str          # "memory" | "mongo"
+    render_workers: Optional[int]
+    render_max_pending: Optional[int]
+    render_timeout: Optional[float]
+    ui_metrics: str            # "" | "1" | "log"
+    warmup: bool
+    metrics: bool
+    metrics_trace: Optional[str]
+    db_monitoring: bool
+    slow_query_ms: float
+    explain_slow: Optional[str]  # None | "db" | ruta de archivo .jsonl
+    storage: str               # "mongo" | "sqlite"
+    sqlite_path: str
+    sync_interval: float
+    sync_batch: int
+    zpl_printer: Optional[str]  # host:puerto o archivo (botón "Imprimir" del generador)
+    zpl_qr: str                # "bq" | "gf"
+    zpl_dpi: int
+    archive_after_days: int
+    load_test_api: bool        # POST /api/lotes (alta sin autenticación, solo para el arnés de carga)
+    export_token: Optional[str]  # GET /api/export solo existe con este token configurado
+    diagnostics_token: Optional[str]  # /metrics y /api/{cache,storage,db,render,ui,sessions}, ídem
+
+    @property
+    def server_side_search(self):
+        return self.catalog_search == "server"
+
+    @property
+    def ui_metrics_enabled(self):
+        return self.ui_metrics in ("1", "true", "yes", "log")
+
+    @property
+    def metrics_enabled(self):
+        return self.metrics or bool(self.metrics_trace)
+
+
+def _optional(nombre, tipo):
+    valor = os.getenv(nombre)
+    return tipo(valor) if valor else None
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    """Configuración del proceso (se carga en la primera llamada)"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return Settings(
+        mongo_uri=os.getenv("MONGO_URI"),
+        db_name=os.getenv("DB_NAME", "lotetracker_db"),
+        base_url=os.getenv("BASE_URL"),
+        catalog_search=os.getenv("CATALOG_SEARCH", "memory").strip().lower(),
+        view_cache_size=int(os.getenv("VIEW_CACHE_SIZE", "6")),
+        shared_state=os.getenv("SHARED_STATE", "memory").strip().lower(),
+        render_workers=_optional("RENDER_WORKERS", int),
+        render_max_pending=_optional("RENDER_MAX_PENDING", int),
+        render_timeout=_optional("RENDER_TIMEOUT", float),
+        ui_metrics=os.getenv("UI_METRICS", "").strip().lower(),
+        warmup=os.getenv("WARMUP", "0").strip().lower() in ("1", "true", "yes"),
+        metrics=os.getenv("METRICS", "0").strip().lower() in ("1", "true", "yes"),
+        metrics_trace=os.getenv("METRICS_TRACE") or None,
+        db_monitoring=os.getenv("DB_MONITORING", "0").strip().lower() in ("1", "true", "yes"),
+        slow_query_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+        explain_slow=os.getenv("EXPLAIN_SLOW") or None,
+        storage=os.getenv("STORAGE", "mongo").strip().lower(),
+        sqlite_path=os.getenv("SQLITE_PATH", "lotetracker.db"),
+        sync_interval=float(os.getenv("SYNC_INTERVAL", "5")),
+        sync_batch=int(os.getenv("SYNC_BATCH", "500")),
+        zpl_printer=os.getenv("ZPL_PRINTER") or None,
+        zpl_qr=os.getenv("ZPL_QR", "bq").strip().lower(),
+        zpl_dpi=int(os.getenv("ZPL_DPI", "203")),
+        archive_after_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "365")),
+        load_test_api=os.getenv("LOAD_TEST_API", "0").strip().lower() in ("1", "true", "yes"),
+        export_token=os.getenv("EXPORT_TOKEN") or None,
+        diagnostics_token=os.getenv("DIAGNOSTICS_TOKEN") or None,
+    )
@@ -0,0 +1,140 @@
+"""
+Estado compartido entre sesiones (cachés de estadísticas y bus de eventos).
+
+Con un solo proceso (`SHARED_STATE=memory`, por defecto) todo vive en memoria.
+En modo clúster (`python -m src.cluster`) cada worker es un proceso distinto, así que
+el estado que deben ver todas las sesiones pasa por MongoDB (`SHARED_STATE=mongo`).
+"""
+import os
+import re
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, errors
+
+from src.cache import LRUCache
+from src.settings import get_settings
+
+SHARED_STATE_MEMORY = "memory"
+SHARED_STATE_MONGO = "mongo"
+
+# Identifica a este proceso en los mensajes del bus (para ignorar los propios)
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def get_shared_state_mode():
+    return get_settings().shared_state
+
+
+_shared_db = None
+_shared_db_lock = threading.Lock()
+
+
+def get_shared_mongo_db():
+    """Conexión de proceso para el estado compartido; None si MongoDB no está disponible"""
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                settings = get_settings()
+                mongo_uri = settings.mongo_uri
+                if not mongo_uri:
+                    print("Error: MONGO_URI no encontrada; el estado compartido queda en memoria")
+                    return None
+                try:
+                    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+                    client.server_info()
+                except errors.PyMongoError as e:
+                    print(f"❌ Error de conexión a MongoDB para el estado compartido: {e}")
+                    return None
+                _shared_db = client[settings.db_name]
+    return _shared_db
+
+
+class SharedStore:
+    """Almacén clave/valor con caducidad, visible para todas las sesiones"""
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def invalidate(self, prefix=""):
+        """Borra las claves que empiezan por `prefix` (todas si está vacío)"""
+        raise NotImplementedError
+
+
+class MemoryStore(SharedStore):
+    """Implementación en memoria del proceso (un solo worker)"""
+
+    def __init__(self, maxsize=256):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key, default=None):
+        return self._cache.get(key, default)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def invalidate(self, prefix=""):
+        self._cache.invalidate(lambda key: key.startswith(prefix))
+
+
+class MongoStore(SharedStore):
+    """
+    Implementación sobre una colección de MongoDB, compartida por todos los workers.
+    El índice TTL limpia los documentos vencidos; como el monitor de TTL corre cada
+    ~60 s, la caducidad también se comprueba al leer.
+    """
+
+    def __init__(self, db, collection="estado_compartido"):
+        self._coleccion = db[collection]
+        self._coleccion.create_index("expira_en", expireAfterSeconds=0)
+
+    def get(self, key, default=None):
+        try:
+            doc = self._coleccion.find_one({"_id": key, "expira_en": {"$gt": _now()}})
+        except errors.PyMongoError as e:
+            print(f"Error al leer el estado compartido: {e}")
+            return default
+        return default if doc is None else doc["valor"]
+
+    def set(self, key, value, ttl):
+        try:
+            self._coleccion.replace_one(
+                {"_id": key},
+                {"_id": key, "valor": value, "expira_en": _now(ttl)},
+                upsert=True,
+            )
+        except errors.PyMongoError as e:
+            print(f"Error al guardar el estado compartido: {e}")
+
+    def invalidate(self, prefix=""):
+        filtro = {"_id": {"$regex": "^" + re.escape(prefix)}} if prefix else {}
+        try:
+            self._coleccion.delete_many(filtro)
+        except errors.PyMongoError as e:
+            print(f"Error al invalidar el estado compartido: {e}")
+
+
+def _now(offset=0):
+    # Fecha BSON (los índices TTL solo trabajan con fechas)
+    return datetime.utcnow() + timedelta(seconds=offset)
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Almacén compartido según SHARED_STATE (memoria o MongoDB)"""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                db = get_shared_mongo_db() if get_shared_state_mode() == SHARED_STATE_MONGO else None
+                _shared_store = MongoStore(db) if db is not None else MemoryStore()
+    return _shared_store
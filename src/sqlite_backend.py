@@ -0,0 +1,656 @@
+"""
+Almacenamiento local en SQLite con sincronización diferida a MongoDB (STORAGE=sqlite).
+
+Cada estación guarda sus lotes, catálogo y movimientos en un archivo SQLite (SQLITE_PATH, modo
+WAL, synchronous=FULL): generar una etiqueta cuesta una escritura en el disco local y la línea
+sigue trabajando aunque MongoDB no responda. Lo guardado es el diario que MongoSync sube en
+segundo plano, en lotes de SYNC_BATCH, cada SYNC_INTERVAL segundos (o enseguida tras escribir):
+  * el alta de un lote se sube una sola vez, con $setOnInsert (nunca pisa el documento central);
+  * el stock viaja como deltas: cada despacho local es un movimiento que se aplica en MongoDB con
+    un $inc guardado (cantidad_restante >= cantidad), así lo que otras estaciones despachan del
+    mismo lote se suma en lugar de perderse. Si la guarda falla (el lote ya se vendió en otra
+    estación) el movimiento queda en el libro con conflicto=True y no descuenta nada. Después se
+    trae el stock central a la copia local de los lotes tocados;
+  * catálogo y libro de movimientos se suben por clave / _id con upserts y se marcan como
+    sincronizados; repetir un envío (p. ej. tras caerse a mitad) es inocuo.
+Los _id son ObjectId generados aquí: la URL del QR es la misma antes y después de sincronizar.
+
+El documento del lote se guarda completo (JSON extendido de BSON) y los campos que se filtran,
+ordenan o cambian con los despachos van además en columnas indexadas. Los lotes que solo existen
+en MongoDB (creados en otra estación) se leen y despachan allí cuando hay conexión.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne, UpdateOne, errors
+from pymongo.results import InsertOneResult
+
+from src.settings import get_settings
+from src.storage import (
+    StorageBackend, STORAGE_SQLITE, CATALOG_SEARCH_LIMIT, DASHBOARD_TOP_N, PRODUCTION_CHART_DAYS,
+    ESTADO_DESPACHADO, ESTADO_DESPACHO_PARCIAL, _broadcast_invalidation,
+)
+from src.utils import normalize_key
+
+SYNC_DEBOUNCE = 0.5       # espera tras una escritura para subir varias juntas
+SYNC_MAX_BACKOFF = 60     # segundos entre reintentos de conexión, como máximo
+SYNC_EPSILON = 1e-6       # tolerancia de los $inc en coma flotante al comparar stock en MongoDB
+DUPLICATE_KEY = 11000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lotes (
+    id TEXT PRIMARY KEY,                 -- ObjectId en hex (el mismo _id en MongoDB)
+    doc TEXT NOT NULL,                   -- documento completo al crearse
+    product_key TEXT,
+    supplier_key TEXT,
+    operator_name TEXT,
+    operator_code TEXT,
+    fecha_produccion TEXT,               -- ISO 8601: se ordena como texto
+    factor_base REAL NOT NULL DEFAULT 1,
+    unidad_base TEXT,
+    cantidad_restante REAL NOT NULL,
+    cantidad_base_restante REAL NOT NULL,
+    estado TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,  -- sube con cada despacho local
+    version_sincronizada INTEGER NOT NULL DEFAULT 0  -- 0 = el alta aún no se subió a MongoDB
+);
+CREATE INDEX IF NOT EXISTS lotes_fecha ON lotes (fecha_produccion);
+CREATE INDEX IF NOT EXISTS lotes_producto_fecha ON lotes (product_key, fecha_produccion);
+CREATE INDEX IF NOT EXISTS lotes_proveedor ON lotes (supplier_key);
+CREATE INDEX IF NOT EXISTS lotes_operador ON lotes (operator_name);
+CREATE INDEX IF NOT EXISTS lotes_stock ON lotes (cantidad_base_restante, product_key, unidad_base);
+DROP INDEX IF EXISTS lotes_pendientes;
+CREATE INDEX IF NOT EXISTS lotes_sin_subir ON lotes (id) WHERE version_sincronizada = 0;
+
+CREATE TABLE IF NOT EXISTS movimientos (
+    id TEXT PRIMARY KEY,
+    lote_id TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    sincronizado INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS movimientos_lote ON movimientos (lote_id, fecha);
+CREATE INDEX IF NOT EXISTS movimientos_pendientes ON movimientos (id) WHERE sincronizado = 0;
+
+CREATE TABLE IF NOT EXISTS catalogo (
+    coleccion TEXT NOT NULL,             -- "productos" | "proveedores"
+    clave TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    sincronizado INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (coleccion, clave)
+);
+CREATE INDEX IF NOT EXISTS catalogo_pendiente ON catalogo (coleccion, clave) WHERE sincronizado = 0;
+"""
+
+# Columnas que cambian con los despachos: mandan sobre lo guardado en `doc`
+_COLUMNAS_LOTE = "id, doc, cantidad_restante, cantidad_base_restante, estado, version"
+
+
+def _row_to_lote(fila):
+    lote = json_util.loads(fila["doc"])
+    lote["cantidad_restante"] = fila["cantidad_restante"]
+    lote["cantidad_base_restante"] = fila["cantidad_base_restante"]
+    lote["estado"] = fila["estado"]
+    return lote
+
+
+class SQLiteBackend(StorageBackend):
+    """Lotes, catálogo y movimientos en un archivo local; MongoSync los sube a MongoDB"""
+
+    backend = STORAGE_SQLITE
+
+    def __init__(self, path=None, sync=True):
+        settings = get_settings()
+        self.path = path or settings.sqlite_path
+        self._local = threading.local()
+        try:
+            con = self._conn()
+            con.executescript(SCHEMA)
+            print(f"✅ Almacenamiento local en {os.path.abspath(self.path)}")
+            self.available = True
+        except sqlite3.Error as e:
+            print(f"❌ No se pudo abrir la base local {self.path}: {e}")
+            self.available = False
+        self.sync = MongoSync(self, settings.sync_interval, settings.sync_batch) if sync and self.available else None
+        if self.sync is not None:
+            self.sync.start()
+
+    def _conn(self):
+        """Una conexión por hilo: en WAL los lectores no bloquean al que escribe"""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=FULL")  # cada lote confirmado sobrevive a un corte de luz
+            self._local.con = con
+        return con
+
+    def _changed(self):
+        if self.sync is not None:
+            self.sync.notify()
+
+    def is_available(self):
+        return self.available
+
+    # --- Catálogo ---
+
+    def _upsert_catalog(self, coleccion, name):
+        clave = normalize_key(name)
+        if not clave:
+            return name
+        nombre = " ".join(name.split())
+        con = self._conn()
+        with con:
+            nuevo = con.execute(
+                "INSERT INTO catalogo (coleccion, clave, nombre) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                (coleccion, clave, nombre),
+            ).rowcount
+            if not nuevo:
+                return con.execute(
+                    "SELECT nombre FROM catalogo WHERE coleccion = ? AND clave = ?", (coleccion, clave)
+                ).fetchone()["nombre"]
+        _broadcast_invalidation("catalogo", coleccion=coleccion)
+        self._changed()
+        return nombre
+
+    def add_product(self, product_name):
+        return self._upsert_catalog("productos", product_name)
+
+    def add_supplier(self, supplier_name):
+        return self._upsert_catalog("proveedores", supplier_name)
+
+    def _catalog_names(self, coleccion):
+        filas = self._conn().execute("SELECT nombre FROM catalogo WHERE coleccion = ? ORDER BY rowid", (coleccion,))
+        return [f["nombre"] for f in filas]
+
+    def get_products(self):
+        return self._catalog_names("productos")
+
+    def get_suppliers(self):
+        return self._catalog_names("proveedores")
+
+    def _search_catalog(self, coleccion, prefix):
+        prefix = normalize_key(prefix)
+        # Rango [prefijo, prefijo + máximo) sobre la clave primaria: usa el índice
+        filas = self._conn().execute(
+            "SELECT nombre FROM catalogo WHERE coleccion = ? AND clave >= ? AND clave < ? ORDER BY clave LIMIT ?",
+            (coleccion, prefix, prefix + "\U0010ffff", CATALOG_SEARCH_LIMIT),
+        )
+        return [f["nombre"] for f in filas]
+
+    def search_products(self, prefix):
+        return self._search_catalog("productos", prefix)
+
+    def search_suppliers(self, prefix):
+        return self._search_catalog("proveedores", prefix)
+
+    def get_operators(self):
+        # El código del primer lote de cada operador, como el $first de MongoDB
+        filas = self._conn().execute(
+            "SELECT operator_name, operator_code FROM lotes WHERE rowid IN "
+            "(SELECT MIN(rowid) FROM lotes WHERE operator_name IS NOT NULL AND operator_name != '' "
+            "GROUP BY operator_name) ORDER BY operator_name"
+        )
+        return {f["operator_name"]: f["operator_code"] for f in filas}
+
+    # --- Lotes ---
+
+    def add_history_record(self, record):
+        lote = {"_id": ObjectId(), **self.build_lote_document(record)}
+        con = self._conn()
+        with con:
+            con.execute(
+                "INSERT INTO lotes (id, doc, product_key, supplier_key, operator_name, operator_code, "
+                "fecha_produccion, factor_base, unidad_base, cantidad_restante, cantidad_base_restante, estado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(lote["_id"]), json_util.dumps(lote), lote["productKey"], lote["supplierKey"],
+                    lote.get("operatorName"), lote.get("operatorCode"), lote["fecha_produccion"].isoformat(),
+                    lote["factor_base"], lote["unidad_base"], lote["cantidad_restante"],
+                    lote["cantidad_base_restante"], lote["estado"],
+                ),
+            )
+        self._changed()
+        self._publish_stock_event(
+            "lote_creado", lote, lote["cantidad_base_inicial"], dia=lote["fecha_produccion"].strftime("%Y-%m-%d")
+        )
+        return InsertOneResult(lote["_id"], acknowledged=True)
+
+    def get_lote_by_id(self, lote_id):
+        if not ObjectId.is_valid(lote_id):
+            return None
+        fila = self._conn().execute(f"SELECT {_COLUMNAS_LOTE} FROM lotes WHERE id = ?", (str(lote_id),)).fetchone()
+        if fila is not None:
+            return _row_to_lote(fila)
+        remoto = self.sync.remote() if self.sync else None
+        return remoto.get_lote_by_id(lote_id) if remoto else None
+
+    def _lotes(self, sql, params=()):
+        return [_row_to_lote(f) for f in self._conn().execute(sql, params)]
+
+    def get_history(self):
+        # El ObjectId en hex crece con el tiempo, igual que el orden por _id de MongoDB
+        return self._lotes(f"SELECT {_COLUMNAS_LOTE} FROM lotes ORDER BY id DESC LIMIT 10")
+
+    @staticmethod
+    def _records_query(desde, hasta, product, supplier):
+        condiciones, params = [], []
+        if desde:
+            condiciones.append("fecha_produccion >= ?")
+            params.append(desde.isoformat())
+        if hasta:
+            condiciones.append("fecha_produccion < ?")
+            params.append(hasta.isoformat())
+        if product:
+            condiciones.append("product_key = ?")
+            params.append(normalize_key(product))
+        if supplier:
+            condiciones.append("supplier_key = ?")
+            params.append(normalize_key(supplier))
+        sql = f"SELECT {_COLUMNAS_LOTE} FROM lotes"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        return sql + " ORDER BY fecha_produccion", params
+
+    def get_records_between(self, desde, hasta, product=None, supplier=None, limit=0):
+        sql, params = self._records_query(desde, hasta, product, supplier)
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._lotes(sql, params)
+
+    def iter_records(self, desde=None, hasta=None, product=None, supplier=None, fields=None, batch_size=1000):
+        sql, params = self._records_query(desde, hasta, product, supplier)
+        # Conexión propia: una respuesta en streaming puede reanudar el generador desde otro hilo
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        try:
+            cursor = con.execute(sql, params)
+            while True:
+                filas = cursor.fetchmany(batch_size)
+                if not filas:
+                    return
+                for fila in filas:
+                    lote = _row_to_lote(fila)
+                    yield {campo: lote[campo] for campo in fields if campo in lote} if fields else lote
+        finally:
+            con.close()
+
+    def get_dashboard_stats(self, top_n=DASHBOARD_TOP_N):
+        con = self._conn()
+        total_lotes = con.execute("SELECT COUNT(*) FROM lotes").fetchone()[0]
+        grupos = con.execute(
+            "SELECT s.product_key, s.unidad_base, s.total, c.nombre FROM ("
+            "  SELECT product_key, unidad_base, SUM(cantidad_base_restante) AS total FROM lotes"
+            "  WHERE cantidad_base_restante > 0 GROUP BY product_key, unidad_base"
+            ") s LEFT JOIN catalogo c ON c.coleccion = 'productos' AND c.clave = s.product_key "
+            "ORDER BY s.total DESC, s.product_key"
+        ).fetchall()
+        top = [
+            {"productKey": g["product_key"], "unidad": g["unidad_base"],
+             "producto": g["nombre"] or g["product_key"], "cantidad_total": round(g["total"], 2)}
+            for g in grupos[:top_n]
+        ]
+        otros = {}
+        for g in grupos[top_n:]:
+            resumen = otros.setdefault(g["unidad_base"], {"unidad": g["unidad_base"], "productos": 0, "cantidad_total": 0.0})
+            resumen["productos"] += 1
+            resumen["cantidad_total"] += g["total"]
+        for resumen in otros.values():
+            resumen["cantidad_total"] = round(resumen["cantidad_total"], 2)
+        return {
+            "total_lotes": total_lotes,
+            "stock_por_producto": top,
+            "otros": sorted(otros.values(), key=lambda o: -o["cantidad_total"]),
+        }
+
+    def get_daily_lots(self, dias=PRODUCTION_CHART_DAYS):
+        # Sin rollup: el índice por fecha_produccion deja contar los pocos días del gráfico al vuelo
+        desde = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias - 1)
+        filas = self._conn().execute(
+            "SELECT substr(fecha_produccion, 1, 10) AS dia, COUNT(*) AS lotes FROM lotes "
+            "WHERE fecha_produccion >= ? GROUP BY dia ORDER BY dia",
+            (desde.isoformat(),),
+        )
+        return [{"dia": datetime.fromisoformat(f["dia"]), "lotes": f["lotes"]} for f in filas]
+
+    # --- Despachos ---
+
+    def _dispatch_local(self, con, lote_id, qty, operador, mov_id=None):
+        """UPDATE condicional (guarda de stock en el WHERE) + movimiento, dentro de la transacción de `con`"""
+        fila = con.execute(
+            "UPDATE lotes SET "
+            "  cantidad_restante = round(cantidad_restante - ?1, 6),"
+            "  cantidad_base_restante = round(cantidad_base_restante - ?1 * factor_base, 6),"
+            "  estado = CASE WHEN round(cantidad_restante - ?1, 6) <= 0 THEN ?2 ELSE ?3 END,"
+            "  version = version + 1 "
+            f"WHERE id = ?4 AND cantidad_restante >= ?1 RETURNING {_COLUMNAS_LOTE}",
+            (qty, ESTADO_DESPACHADO, ESTADO_DESPACHO_PARCIAL, str(lote_id)),
+        ).fetchone()
+        if fila is None:
+            return None, None
+        lote = _row_to_lote(fila)
+        movimiento = {
+            "_id": mov_id or ObjectId(),
+            "lote_id": lote["_id"],
+            "tipo": "despacho",
+            "cantidad": qty,
+            "unidad": lote.get("unit"),
+            "cantidad_base": qty * lote.get("factor_base", 1),
+            "operador": operador,
+            "fecha": datetime.now(),
+            "restante": lote["cantidad_restante"],
+        }
+        con.execute(
+            "INSERT INTO movimientos (id, lote_id, fecha, doc) VALUES (?, ?, ?, ?)",
+            (str(movimiento["_id"]), str(lote["_id"]), movimiento["fecha"].isoformat(), json_util.dumps(movimiento)),
+        )
+        return lote, movimiento
+
+    def _is_local(self, lote_id):
+        return self._conn().execute("SELECT 1 FROM lotes WHERE id = ?", (str(lote_id),)).fetchone() is not None
+
+    def dispatch(self, lote_id, qty, operador=None):
+        if qty <= 0 or not ObjectId.is_valid(lote_id):
+            return None
+        if not self._is_local(lote_id):
+            remoto = self.sync.remote() if self.sync else None
+            return remoto.dispatch(lote_id, qty, operador) if remoto else None
+        con = self._conn()
+        with con:
+            lote, movimiento = self._dispatch_local(con, lote_id, qty, operador)
+        if lote is None:
+            return None
+        self._changed()
+        self._publish_stock_event(
+            "despacho", lote, -movimiento["cantidad_base"],
+            restante=lote["cantidad_restante"], estado=lote["estado"]
+        )
+        return lote
+
+    def dispatch_many(self, despachos, operador=None):
+        """Todos los despachos en una transacción; cada uno con su propia guarda de stock"""
+        aplicados = []
+        con = self._conn()
+        with con:
+            for lote_id, qty in despachos:
+                if qty <= 0 or not ObjectId.is_valid(lote_id):
+                    continue
+                lote, movimiento = self._dispatch_local(con, lote_id, qty, operador)
+                if lote is not None:
+                    aplicados.append((lote, movimiento))
+        if aplicados:
+            self._changed()
+        for lote, movimiento in aplicados:
+            self._publish_stock_event("despacho", lote, -movimiento["cantidad_base"])
+        return [m["_id"] for _, m in aplicados]
+
+    def get_movements(self, lote_id):
+        if not ObjectId.is_valid(lote_id):
+            return []
+        filas = self._conn().execute(
+            "SELECT doc FROM movimientos WHERE lote_id = ? ORDER BY fecha", (str(lote_id),)
+        )
+        return [json_util.loads(f["doc"]) for f in filas]
+
+    # --- Diagnóstico ---
+
+    def pending_counts(self):
+        con = self._conn()
+        return {
+            "lotes": con.execute("SELECT COUNT(*) FROM lotes WHERE version_sincronizada = 0").fetchone()[0],
+            "movimientos": con.execute("SELECT COUNT(*) FROM movimientos WHERE sincronizado = 0").fetchone()[0],
+            "catalogo": con.execute("SELECT COUNT(*) FROM catalogo WHERE sincronizado = 0").fetchone()[0],
+        }
+
+    def storage_stats(self):
+        return {
+            "backend": self.backend,
+            "path": os.path.abspath(self.path),
+            "pendientes": self.pending_counts(),
+            "sincronizacion": self.sync.stats() if self.sync else None,
+        }
+
+
+class MongoSync(threading.Thread):
+    """Sube a MongoDB lo pendiente de la base local (write-behind): altas, deltas de stock y catálogo"""
+
+    def __init__(self, local, interval, batch_size):
+        super().__init__(daemon=True, name="sync-mongo")
+        self.local = local
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._remote = None
+        self._backoff = 1
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+        self.synced = {"lotes": 0, "movimientos": 0, "catalogo": 0, "conflictos": 0}
+        self.last_sync = None
+        self.last_error = None
+
+    def notify(self):
+        self._wake.set()
+
+    def remote(self):
+        """DatabaseManager conectado, o None (sin MONGO_URI o sin conexión por ahora)"""
+        with self._lock:
+            if self._remote is not None:
+                return self._remote
+            if not get_settings().mongo_uri or time.monotonic() < self._next_attempt:
+                return None
+            from src.database_manager import DatabaseManager
+            remoto = DatabaseManager()
+            if not remoto.is_available():
+                self._next_attempt = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, SYNC_MAX_BACKOFF)
+                return None
+            self._remote, self._backoff = remoto, 1
+        self._pull_catalog(remoto)
+        return remoto
+
+    def _disconnect(self, error):
+        print(f"⚠️ Sincronización con MongoDB pausada: {error}")
+        with self._lock:
+            self._remote = None
+            self._next_attempt = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, SYNC_MAX_BACKOFF)
+        self.last_error = str(error)
+
+    def run(self):
+        while True:
+            if self._wake.wait(self.interval):
+                time.sleep(SYNC_DEBOUNCE)
+            self._wake.clear()
+            remoto = self.remote()
+            if remoto is None:
+                continue
+            try:
+                self.sync_once(remoto)
+            except errors.PyMongoError as e:
+                self._disconnect(e)
+            except Exception as e:
+                print(f"❌ Error al sincronizar con MongoDB: {e}")
+                self.last_error = str(e)
+
+    def sync_once(self, remoto):
+        """Sube todo lo pendiente en lotes de batch_size"""
+        con = self.local._conn()
+        while self._push_catalog(con, remoto) + self._push_lotes(con, remoto) + self._push_movements(con, remoto):
+            pass
+        self.last_sync = datetime.now().isoformat(timespec="seconds")
+        self.last_error = None
+
+    def _push_catalog(self, con, remoto):
+        filas = con.execute(
+            "SELECT coleccion, clave, nombre FROM catalogo WHERE sincronizado = 0 LIMIT ?", (self.batch_size,)
+        ).fetchall()
+        for coleccion in ("productos", "proveedores"):
+            operaciones = [
+                UpdateOne({"clave": f["clave"]}, {"$setOnInsert": {"clave": f["clave"], "nombre": f["nombre"]}}, upsert=True)
+                for f in filas if f["coleccion"] == coleccion
+            ]
+            if operaciones:
+                self._bulk(remoto.db[coleccion], operaciones)
+        with con:
+            con.executemany(
+                "UPDATE catalogo SET sincronizado = 1 WHERE coleccion = ? AND clave = ?",
+                [(f["coleccion"], f["clave"]) for f in filas],
+            )
+        self.synced["catalogo"] += len(filas)
+        return len(filas)
+
+    def _push_lotes(self, con, remoto):
+        """Altas: el documento tal como se creó, solo si el lote aún no existe en MongoDB"""
+        filas = con.execute(
+            "SELECT id, doc FROM lotes WHERE version_sincronizada = 0 LIMIT ?", (self.batch_size,)
+        ).fetchall()
+        if not filas:
+            return 0
+        operaciones, fechas = [], []
+        for fila in filas:
+            lote = json_util.loads(fila["doc"])
+            fechas.append(lote.get("fecha_produccion"))
+            # `doc` tiene el stock inicial: los despachos locales llegan después como movimientos
+            operaciones.append(UpdateOne({"_id": lote.pop("_id")}, {"$setOnInsert": lote}, upsert=True))
+        self._bulk(remoto.registros, operaciones)
+        # Lotes de días anteriores (estación sin red) que el rollup incremental no recalcularía
+        fechas = [f for f in fechas if isinstance(f, datetime)]
+        if fechas:
+            remoto.note_backdated_production(min(fechas))
+        with con:
+            con.executemany("UPDATE lotes SET version_sincronizada = 1 WHERE id = ?", [(f["id"],) for f in filas])
+        self.synced["lotes"] += len(filas)
+        return len(filas)
+
+    def _push_movements(self, con, remoto):
+        """
+        Despachos como deltas, en el orden en que se hicieron: $inc guardado por movimiento en un
+        bulk_write ordenado. Como en dispatch_many, cada operación deja su id en
+        "movimientos_pendientes" para saber cuáles coincidieron (y no aplicarlas dos veces si el
+        envío se repite); los que ya están en el libro de MongoDB se aplicaron en un envío anterior.
+        """
+        filas = con.execute(
+            "SELECT m.doc FROM movimientos m JOIN lotes l ON l.id = m.lote_id "
+            "WHERE m.sincronizado = 0 AND l.version_sincronizada > 0 ORDER BY m.fecha LIMIT ?",
+            (self.batch_size,),
+        ).fetchall()
+        if not filas:
+            return 0
+        movimientos = [json_util.loads(f["doc"]) for f in filas]
+        ids = [m["_id"] for m in movimientos]
+        lote_ids = list({m["lote_id"] for m in movimientos})
+        previos = {
+            d["_id"]: d.get("conflicto", False)
+            for d in remoto.movimientos.find({"_id": {"$in": ids}}, {"conflicto": 1})
+        }
+        nuevos = [m for m in movimientos if m["_id"] not in previos]
+        if nuevos:
+            remoto.registros.bulk_write([
+                UpdateOne(
+                    {"_id": m["lote_id"], "cantidad_restante": {"$gte": m["cantidad"] - SYNC_EPSILON},
+                     "movimientos_pendientes": {"$ne": m["_id"]}},
+                    {"$inc": {"cantidad_restante": -m["cantidad"], "cantidad_base_restante": -m["cantidad_base"]},
+                     "$push": {"movimientos_pendientes": m["_id"]}},
+                )
+                for m in nuevos
+            ], ordered=True)
+        marcados = {
+            mov_id
+            for lote in remoto.registros.find(
+                {"_id": {"$in": lote_ids}, "movimientos_pendientes": {"$in": ids}}, {"movimientos_pendientes": 1}
+            )
+            for mov_id in lote["movimientos_pendientes"]
+        }
+        aplicados = marcados | {mov_id for mov_id, conflicto in previos.items() if not conflicto}
+        for m in movimientos:
+            if m["_id"] not in aplicados:
+                m["conflicto"] = True
+                print(f"⚠️ Despacho {m['_id']} del lote {m['lote_id']} sin stock en MongoDB "
+                      f"(otra estación despachó antes): queda en el libro como conflicto")
+
+        tocados = list({m["lote_id"] for m in movimientos if m["_id"] in aplicados})
+        if tocados:
+            remoto.registros.update_many(
+                {"_id": {"$in": tocados}, "cantidad_restante": {"$lte": SYNC_EPSILON}},
+                {"$set": {"estado": ESTADO_DESPACHADO}},
+            )
+            remoto.registros.update_many(
+                {"_id": {"$in": tocados}, "cantidad_restante": {"$gt": SYNC_EPSILON}},
+                {"$set": {"estado": ESTADO_DESPACHO_PARCIAL}},
+            )
+        self._bulk(remoto.movimientos, [ReplaceOne({"_id": m["_id"]}, m, upsert=True) for m in movimientos])
+        remoto.registros.update_many(
+            {"_id": {"$in": lote_ids}}, {"$pull": {"movimientos_pendientes": {"$in": ids}}}
+        )
+        with con:
+            con.executemany(
+                "UPDATE movimientos SET sincronizado = 1, doc = ? WHERE id = ?",
+                [(json_util.dumps(m), str(m["_id"])) for m in movimientos],
+            )
+        self._refresh_stock(con, remoto, lote_ids)
+        self.synced["movimientos"] += len(movimientos)
+        self.synced["conflictos"] += len(movimientos) - len(aplicados & set(ids))
+        return len(movimientos)
+
+    def _refresh_stock(self, con, remoto, lote_ids):
+        """Trae el stock central (con lo despachado en otras estaciones) a los lotes sin despachos por subir"""
+        centrales = remoto.registros.find(
+            {"_id": {"$in": lote_ids}}, {"cantidad_restante": 1, "cantidad_base_restante": 1, "estado": 1}
+        )
+        cambiados = []
+        with con:
+            for lote in centrales:
+                cambiados += [str(lote["_id"])] * con.execute(
+                    "UPDATE lotes SET cantidad_restante = ?1, cantidad_base_restante = ?2, estado = ?3 "
+                    "WHERE id = ?4 AND (cantidad_restante != ?1 OR estado != ?3) AND NOT EXISTS "
+                    "(SELECT 1 FROM movimientos WHERE lote_id = lotes.id AND sincronizado = 0)",
+                    (round(lote["cantidad_restante"], 6), round(lote["cantidad_base_restante"], 6),
+                     lote["estado"], str(lote["_id"])),
+                ).rowcount
+        for lote_id in cambiados:
+            _broadcast_invalidation("lotes", key=lote_id)
+
+    @staticmethod
+    def _bulk(coleccion, operaciones):
+        try:
+            coleccion.bulk_write(operaciones, ordered=False)
+        except errors.BulkWriteError as e:
+            otros = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if otros:
+                raise
+
+    def _pull_catalog(self, remoto):
+        """Al conectar, trae el catálogo central para el autocompletado (sin pisar lo local)"""
+        try:
+            filas = [
+                (coleccion, doc["clave"], doc["nombre"])
+                for coleccion in ("productos", "proveedores")
+                for doc in remoto.db[coleccion].find({"clave": {"$type": "string"}}, {"clave": 1, "nombre": 1, "_id": 0})
+            ]
+        except errors.PyMongoError as e:
+            print(f"⚠️ No se pudo leer el catálogo de MongoDB: {e}")
+            return
+        con = self.local._conn()
+        with con:
+            nuevos = sum(
+                con.execute(
+                    "INSERT INTO catalogo (coleccion, clave, nombre, sincronizado) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT DO NOTHING", fila
+                ).rowcount
+                for fila in filas
+            )
+        if nuevos:
+            _broadcast_invalidation("catalogo", coleccion="productos")
+
+    def stats(self):
+        return {
+            "conectado": self._remote is not None,
+            "sincronizados": dict(self.synced),
+            "ultima": self.last_sync,
+            "ultimo_error": self.last_error,
+        }
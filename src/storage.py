@@ -0,0 +1,177 @@
+"""
+Interfaz de almacenamiento de la app.
+
+DatabaseManager (MongoDB, por defecto) y SQLiteBackend (archivo local con sincronización
+diferida a MongoDB, STORAGE=sqlite) implementan las mismas operaciones. Las vistas, la ruta
+de escaneo y el alta de lotes solo usan esta interfaz, a través de get_database_manager().
+Las migraciones y los totales diarios (src/maintenance.py) siguen siendo propios de MongoDB.
+"""
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from src.events import get_event_bus, TOPIC_STOCK, TOPIC_CACHE
+from src.shared_state import PROCESS_ID, get_shared_store
+from src.units import DEFAULT_UNIT, parse_quantity, to_base
+from src.utils import normalize_key, parse_date
+
+STORAGE_MONGO = "mongo"
+STORAGE_SQLITE = "sqlite"
+
+CATALOG_SEARCH_LIMIT = 8
+# Productos que se muestran como barra propia en el gráfico de stock; el resto va a "Otros"
+DASHBOARD_TOP_N = 8
+# Días del gráfico de producción del dashboard (hoy incluido)
+PRODUCTION_CHART_DAYS = 14
+
+# Estados del lote según su stock
+ESTADO_ALMACENADO = "Almacenado"
+ESTADO_DESPACHO_PARCIAL = "Despacho parcial"
+ESTADO_DESPACHADO = "Despachado"
+
+# Estadísticas del dashboard en el almacén compartido (memoria o MongoDB según SHARED_STATE).
+# Cada cambio de stock las invalida; el TTL solo acota carreras entre workers.
+STATS_CACHE_TTL = 10
+STATS_CACHE_PREFIX = "dashboard_stats:"
+
+
+def _broadcast_invalidation(cache, **datos):
+    """Avisa a los demás workers que descarten su copia local"""
+    get_event_bus().publish(TOPIC_CACHE, {"cache": cache, "origen": PROCESS_ID, **datos})
+
+
+class StorageBackend(ABC):
+    """Operaciones de lotes, catálogo y movimientos que usa la app"""
+
+    backend = None
+
+    @abstractmethod
+    def is_available(self):
+        """False si el almacenamiento no se pudo abrir (la app muestra el error de conexión)"""
+
+    def warm_up(self):
+        """Abre conexiones por adelantado (WARMUP=1)"""
+
+    # --- Catálogo ---
+
+    @abstractmethod
+    def add_product(self, product_name):
+        """Registra el producto (deduplicado por clave) y retorna su nombre canónico"""
+
+    @abstractmethod
+    def add_supplier(self, supplier_name):
+        """Registra el proveedor (deduplicado por clave) y retorna su nombre canónico"""
+
+    @abstractmethod
+    def get_products(self):
+        """Nombres de todos los productos"""
+
+    @abstractmethod
+    def get_suppliers(self):
+        """Nombres de todos los proveedores"""
+
+    @abstractmethod
+    def search_products(self, prefix):
+        """Hasta CATALOG_SEARCH_LIMIT productos cuya clave empieza por el prefijo normalizado"""
+
+    @abstractmethod
+    def search_suppliers(self, prefix):
+        """Hasta CATALOG_SEARCH_LIMIT proveedores cuya clave empieza por el prefijo normalizado"""
+
+    @abstractmethod
+    def get_operators(self):
+        """{nombre: código} de los operadores que aparecen en los lotes"""
+
+    # --- Lotes ---
+
+    @abstractmethod
+    def add_history_record(self, record):
+        """Guarda un lote nuevo (ver build_lote_document); retorna un InsertOneResult"""
+
+    @abstractmethod
+    def get_lote_by_id(self, lote_id):
+        """Lote por su _id (string), o None si no existe; si no se puede consultar, lanza la excepción"""
+
+    @abstractmethod
+    def get_history(self):
+        """Los últimos 10 lotes"""
+
+    @abstractmethod
+    def get_records_between(self, desde, hasta, product=None, supplier=None, limit=0):
+        """Lotes con fecha de producción en [desde, hasta) (también los archivados), opcionalmente por producto/proveedor"""
+
+    @abstractmethod
+    def iter_records(self, desde=None, hasta=None, product=None, supplier=None, fields=None, batch_size=1000):
+        """Generador de lotes por fecha de producción (también los archivados), leídos de a `batch_size` (exportación)"""
+
+    @abstractmethod
+    def get_dashboard_stats(self, top_n=DASHBOARD_TOP_N):
+        """{"total_lotes", "stock_por_producto" (top_n), "otros" (resto por unidad base)}"""
+
+    @abstractmethod
+    def get_daily_lots(self, dias=PRODUCTION_CHART_DAYS):
+        """[{"dia": datetime, "lotes": n}] de los últimos `dias` con producción, del más antiguo al más reciente"""
+
+    # --- Despachos ---
+
+    @abstractmethod
+    def dispatch(self, lote_id, qty, operador=None):
+        """Despacho atómico; retorna el lote actualizado o None si no hay stock suficiente"""
+
+    @abstractmethod
+    def dispatch_many(self, despachos, operador=None):
+        """Varios (lote_id, qty) con la misma guarda; retorna los ids de movimientos aplicados"""
+
+    @abstractmethod
+    def get_movements(self, lote_id):
+        """Libro de movimientos del lote, del más antiguo al más reciente"""
+
+    # --- Diagnóstico ---
+
+    def get_cache_stats(self):
+        return {}
+
+    def storage_stats(self):
+        return {"backend": self.backend}
+
+    # --- Comunes ---
+
+    @staticmethod
+    def build_lote_document(record):
+        """
+        Documento de un lote nuevo a partir de los datos del formulario.
+        La cantidad se guarda numérica en su unidad y también convertida a la unidad base,
+        para que el stock se agregue sin volver a parsear textos.
+        """
+        cantidad_num, unidad_texto = parse_quantity(record.get("quantity"))
+        unidad = record.get("unit") or unidad_texto or DEFAULT_UNIT
+        unidad_base, factor = to_base(unidad)
+        return {
+            **record,
+            "unit": unidad,
+            "productKey": normalize_key(record.get("productType")),
+            "supplierKey": normalize_key(record.get("supplier")),
+            # Fecha tipada (BSON datetime) para consultas por rango; "date" se mantiene para mostrar
+            "fecha_produccion": parse_date(record.get("date")) or datetime.now().replace(microsecond=0),
+            "cantidad_inicial": cantidad_num,
+            "cantidad_restante": cantidad_num, # Inicialmente es la misma
+            "unidad_base": unidad_base,
+            "factor_base": factor,
+            "cantidad_base_inicial": cantidad_num * factor,
+            "cantidad_base_restante": cantidad_num * factor,
+            "estado": ESTADO_ALMACENADO # Estado inicial por defecto
+        }
+
+    def _publish_stock_event(self, tipo, lote, delta, **extra):
+        """Avisa a los dashboards abiertos del cambio de stock (delta en unidad base)"""
+        get_shared_store().invalidate(STATS_CACHE_PREFIX)
+        get_event_bus().publish(TOPIC_STOCK, {
+            "tipo": tipo,
+            "lote_id": str(lote["_id"]),
+            "productKey": lote.get("productKey"),
+            "producto": lote.get("productType"),
+            "unidad": lote.get("unidad_base"),
+            "delta": delta,
+            "ts": time.time(),
+            **extra,
+        })
@@ -0,0 +1,207 @@
+"""
+Agrupación de actualizaciones de la UI.
+
+Cada page.update() es un viaje al cliente con un diff. Dentro de un handler se marcan los
+controles modificados con request_update() y al salir del lote se envían todos en una sola
+llamada page.update(*controles), sin diff de la página completa.
+
+    with batch_updates(page, "on_dispatch"):
+        texto.value = "..."
+        request_update(page, texto)
+
+Con UI_METRICS=1 se cuentan las actualizaciones y los bytes enviados por evento, y con
+METRICS=1 cada lote es una operación de src/metrics.py (el envío, su etapa "ui_flush").
+"""
+import functools
+import json
+import threading
+
+from src.metrics import span, trace
+from src.settings import get_settings
+
+_local = threading.local()
+
+
+class UpdateBatch:
+    """Controles pendientes de enviar de un handler"""
+
+    def __init__(self, page, name):
+        self.page = page
+        self.name = name
+        self.controls = []
+        self.full = False  # se pidió page.update() sin controles
+        self.updates = 0
+        self.bytes = 0
+
+    def add(self, controls):
+        for control in controls:
+            if not any(control is c for c in self.controls):
+                self.controls.append(control)
+
+    def pending(self):
+        """Controles a enviar: solo los montados y sin un ancestro que ya se envíe"""
+        marcados = {id(c) for c in self.controls}
+        resultado = []
+        for control in self.controls:
+            if control.page is None:
+                continue  # aún no montado: se enviará con su vista
+            padre = getattr(control, "parent", None)
+            while padre is not None and id(padre) not in marcados:
+                padre = getattr(padre, "parent", None)
+            if padre is None:
+                resultado.append(control)
+        return resultado
+
+    def flush(self):
+        if self.full:
+            self.page.update()
+        else:
+            controles = self.pending()
+            if controles:
+                self.page.update(*controles)
+        self.controls.clear()
+        self.full = False
+
+
+def current_batch(page):
+    batch = getattr(_local, "batch", None)
+    return batch if batch is not None and batch.page is page else None
+
+
+class batch_updates:
+    """Context manager: agrupa las actualizaciones del hilo actual y las envía una vez al salir"""
+
+    def __init__(self, page, name=None):
+        self.page = page
+        self.name = name
+        self._outer = None
+        self._batch = None
+        self._trace = None
+
+    def __enter__(self):
+        self._outer = getattr(_local, "batch", None)
+        if self._outer is not None and self._outer.page is self.page:
+            return self._outer  # lote anidado: se envía con el de fuera
+        self._trace = trace(self.name or "evento")
+        self._trace.__enter__()
+        self._batch = UpdateBatch(self.page, self.name)
+        _local.batch = self._batch
+        return self._batch
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._batch is None:
+            return False
+        try:
+            with span("ui_flush"):
+                self._batch.flush()
+        except Exception as e:
+            # La sesión pudo cerrarse mientras corría el handler
+            print(f"Error al actualizar la UI ({self.name}): {e}")
+        finally:
+            _local.batch = self._outer
+            self._trace.__exit__(exc_type, exc, tb)
+        _ui_stats.record_event(self._batch)
+        return False
+
+
+def request_update(page, *controls):
+    """
+    Marca controles para enviar (todos los de la página si no se pasa ninguno).
+    Fuera de un lote se envían en el momento.
+    """
+    batch = current_batch(page)
+    if batch is None:
+        page.update(*controls)
+    elif controls:
+        batch.add(controls)
+    else:
+        batch.full = True
+
+
+def batched(handler):
+    """Decorador para handlers de clases con atributo `page` (p. ej. GeneratorPage)"""
+
+    @functools.wraps(handler)
+    def wrapper(self, *args, **kwargs):
+        with batch_updates(self.page, handler.__name__):
+            return handler(self, *args, **kwargs)
+
+    return wrapper
+
+
+# --- Instrumentación ---
+
+def ui_metrics_enabled():
+    return get_settings().ui_metrics_enabled
+
+
+class UIStats:
+    """Totales del proceso: eventos agrupados, actualizaciones enviadas y bytes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = 0
+        self.updates = 0
+        self.bytes = 0
+
+    def record_send(self, nbytes):
+        with self._lock:
+            self.updates += 1
+            self.bytes += nbytes
+        batch = getattr(_local, "batch", None)
+        if batch is not None:
+            batch.updates += 1
+            batch.bytes += nbytes
+
+    def record_event(self, batch):
+        if not ui_metrics_enabled():
+            return
+        with self._lock:
+            self.events += 1
+        if get_settings().ui_metrics == "log":
+            print(f"📊 {batch.name or 'evento'}: {batch.updates} update(s), {batch.bytes} B")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "events": self.events,
+                "updates": self.updates,
+                "bytes": self.bytes,
+                "updates_per_event": round(self.updates / self.events, 2) if self.events else 0.0,
+                "bytes_per_event": round(self.bytes / self.events, 1) if self.events else 0.0,
+            }
+
+
+_ui_stats = UIStats()
+
+
+def get_ui_stats():
+    return _ui_stats.stats()
+
+
+def instrument_page(page):
+    """Con UI_METRICS=1, mide los comandos que la conexión de la página envía al cliente"""
+    if not ui_metrics_enabled():
+        return
+    conn = page.connection
+    if conn is None or getattr(conn, "_ui_batch_instrumented", False):
+        return
+    from flet.core.protocol import CommandEncoder
+
+    def size(commands):
+        return len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")).encode("utf-8"))
+
+    send_commands = conn.send_commands
+    send_command = conn.send_command
+
+    def counted_send_commands(session_id, commands):
+        _ui_stats.record_send(size(commands))
+        return send_commands(session_id, commands)
+
+    def counted_send_command(session_id, command):
+        _ui_stats.record_send(size(command))
+        return send_command(session_id, command)
+
+    conn.send_commands = counted_send_commands
+    conn.send_command = counted_send_command
+    conn._ui_batch_instrumented = True
@@ -0,0 +1,32 @@
+"""Unidades de medida y su conversión a una unidad base común"""
+
+# unidad -> (unidad base, factor para convertir a la unidad base)
+# Las unidades de empaque (cajas, sacos) no tienen un peso fijo, así que son su propia base.
+UNIT_CONVERSIONS = {
+    "kg": ("kg", 1.0),
+    "libras": ("kg", 0.45359237),
+    "litros": ("litros", 1.0),
+    "unidades": ("unidades", 1.0),
+    "toneladas": ("kg", 1000.0),
+    "cajas": ("cajas", 1.0),
+    "sacos": ("sacos", 1.0),
+}
+
+UNITS = list(UNIT_CONVERSIONS)
+DEFAULT_UNIT = "kg"
+
+
+def parse_quantity(text):
+    """Extrae (valor, unidad) de textos como "100 kg", "1,5 toneladas" o "1000" """
+    partes = str(text or "").split()
+    try:
+        valor = float(partes[0].replace(",", "."))
+    except (IndexError, ValueError):
+        valor = 0.0
+    unidad = partes[1] if len(partes) > 1 else None
+    return valor, unidad
+
+
+def to_base(unidad):
+    """Retorna (unidad base, factor) para una unidad; las desconocidas son su propia base"""
+    return UNIT_CONVERSIONS.get(unidad, (unidad, 1.0))
@@ -1,10 +1,50 @@
-import qrcode
 import base64
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
 
-def generate_qr_image(url_data):
-    """Genera imagen QR estética con badge central mostrando información esencial"""
+# qrcode y PIL se importan dentro de las funciones de render: este módulo también lo usa
+# database_manager (normalize_key, parse_date) y no debe cargarlos al arrancar.
+
+# Formato de fecha usado en la UI, el payload del QR y el campo "date" de los registros
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def normalize_key(text):
+    """Clave normalizada para catálogos: sin espacios sobrantes, en minúsculas y sin tildes"""
+    if not text:
+        return ""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+    )
+    return " ".join(sin_tildes.casefold().split())
+
+def parse_date(text):
+    """Convierte un string DATE_FORMAT a datetime; retorna None si no es válido"""
+    try:
+        return datetime.strptime(text.strip(), DATE_FORMAT)
+    except (AttributeError, ValueError):
+        return None
+
+@lru_cache(maxsize=16)
+def load_fonts(badge_size):
+    """Tipografías del badge (título, cuerpo, pie); se cargan una vez por tamaño y proceso"""
+    from PIL import ImageFont
+    try:
+        font_title = ImageFont.truetype("arialbd.ttf", int(badge_size * 0.13))
+        font_body  = ImageFont.truetype("arial.ttf", int(badge_size * 0.11))
+        font_small = ImageFont.truetype("arial.ttf", int(badge_size * 0.08))
+    except OSError:
+        # Fallback a fuente por defecto
+        font_title = ImageFont.load_default()
+        font_body = ImageFont.load_default()
+        font_small = ImageFont.load_default()
+    return font_title, font_body, font_small
+
+def render_qr_png(url_data):
+    """Genera imagen QR estética con badge central mostrando información esencial (bytes PNG)"""
+    import qrcode
+    from PIL import Image, ImageDraw
     
     # ============================
     # COLORES PREMIUM
@@ -78,15 +118,7 @@ def generate_qr_image(url_data):
     # ============================
     # 4. Tipografías limpias
     # ============================
-    try:
-        font_title = ImageFont.truetype("arialbd.ttf", int(badge_size * 0.13))
-        font_body  = ImageFont.truetype("arial.ttf", int(badge_size * 0.11))
-        font_small = ImageFont.truetype("arial.ttf", int(badge_size * 0.08))
-    except:
-        # Fallback a fuente por defecto
-        font_title = ImageFont.load_default()
-        font_body = ImageFont.load_default()
-        font_small = ImageFont.load_default()
+    font_title, font_body, font_small = load_fonts(badge_size)
     
     # ============================
     # 5. Función para centrar texto
@@ -135,10 +167,12 @@ def generate_qr_image(url_data):
     base.paste(badge, (pos_x, pos_y), badge)
     
     # ============================
-    # 8. Convertir a base64
+    # 8. Codificar como PNG
     # ============================
     buffered = BytesIO()
     base.save(buffered, format="PNG", quality=95)
-    img_base64 = base64.b64encode(buffered.getvalue()).decode()
-    
-    return img_base64
\ No newline at end of file
+    return buffered.getvalue()
+
+def generate_qr_image(url_data):
+    """Genera el QR con badge y lo retorna en base64 (listo para ft.Image.src_base64)"""
+    return base64.b64encode(render_qr_png(url_data)).decode()
\ No newline at end of file
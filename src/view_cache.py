@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+
+class ViewCache:
+    """
+    Caché de vistas de UNA sesión, indexada por ruta.
+
+    Volver a una ruta ya visitada reutiliza la misma ft.View (sin reconstruir controles
+    ni repetir consultas), así Flet solo envía las diferencias. Las rutas fijas ("/" y
+    "/dashboard") se conservan siempre; las de lotes se descartan por LRU al superar `max_views`.
+    """
+
+    def __init__(self, max_views=6, pinned=("/", "/dashboard")):
+        self.max_views = max_views
+        self.pinned = set(pinned)
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, route):
+        with self._lock:
+            view = self._views.get(route)
+            if view is not None:
+                self._views.move_to_end(route)
+            return view
+
+    def put(self, route, view):
+        """Guarda la vista y retorna las vistas descartadas (para liberarlas)"""
+        with self._lock:
+            self._views[route] = view
+            self._views.move_to_end(route)
+            evicted = []
+            unpinned = [r for r in self._views if r not in self.pinned]
+            while len(unpinned) > self.max_views:
+                evicted.append(self._views.pop(unpinned.pop(0)))
+            return evicted
+
+    def invalidate(self, route=None):
+        """Quita una ruta (o todas) para que se reconstruya en la próxima visita; retorna las vistas quitadas"""
+        with self._lock:
+            if route is None:
+                removed = list(self._views.values())
+                self._views.clear()
+                return removed
+            view = self._views.pop(route, None)
+            return [view] if view is not None else []
+
+    def invalidate_except(self, route):
+        """Quita todas las vistas salvo la de `route`; retorna las vistas quitadas"""
+        with self._lock:
+            removed = [v for r, v in self._views.items() if r != route]
+            kept = self._views.get(route)
+            self._views.clear()
+            if kept is not None:
+                self._views[route] = kept
+            return removed
+
+    def views(self):
+        with self._lock:
+            return list(self._views.values())
+
+    def __len__(self):
+        return len(self._views)
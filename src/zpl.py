@@ -0,0 +1,221 @@
+"""
+Etiquetas en ZPL para impresoras térmicas Zebra.
+
+Uso:
+    python -m src.zpl 192.168.1.50:9100 --ids 665f...,6660...       # directo al puerto raw de la impresora
+    python -m src.zpl etiquetas.zpl --desde 2024-05-01 [--qr gf] [--dpi 300]
+
+En lugar de la imagen PNG del generador (cientos de KB que la impresora tiene que rasterizar),
+la etiqueta se describe en ZPL: el QR con el comando nativo ^BQ (la impresora lo dibuja) o, con
+--qr gf, como gráfico ^GFA comprimido (:Z64:, para modelos sin ^BQ o si se quiere el módulo
+exacto), y producto, cantidad, proveedor, fecha y operador como texto nativo. Una etiqueta ocupa
+unos cientos de bytes. El QR lleva el mismo texto y URL que el del generador.
+"""
+import argparse
+import base64
+import re
+import socket
+import sys
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.lotes import iter_lotes, lote_qr_payload
+from src.settings import get_settings
+
+QR_NATIVO = "bq"
+QR_GRAFICO = "gf"
+DEFAULT_DPI = 203
+LABEL_MM = (100, 75)   # ancho x alto de la etiqueta
+QR_MAX_WIDTH = 0.5     # fracción del ancho para el QR; el resto es para el texto
+MARGIN_MM = 3
+RAW_PORT = 9100
+PRINTER_TIMEOUT = 5.0
+ESCAPE = "_"           # indicador de hexadecimal de ^FH
+MAX_MAGNIFICATION = 10  # límite de ^BQ
+
+_DESTINO_TCP = re.compile(r"^(?:tcp://)?([\w.-]+):(\d+)$|^tcp://([\w.-]+)$")
+
+
+def escape_field(texto):
+    """
+    Texto para ^FD con ^FH: los caracteres de control de ZPL (^ ~), el indicador "_" y todo lo
+    que no sea ASCII imprimible se envían como bytes UTF-8 en hexadecimal (_C3_BA = "ú").
+    """
+    partes = []
+    for c in str(texto):
+        if " " <= c <= "~" and c not in "^~" + ESCAPE:
+            partes.append(c)
+        else:
+            partes.extend(f"{ESCAPE}{b:02X}" for b in c.encode("utf-8"))
+    return "".join(partes)
+
+
+def crc16_ccitt(datos):
+    """CRC-16/CCITT (polinomio 0x1021, inicial 0) que ^GF espera tras los datos :Z64:"""
+    crc = 0
+    for byte in datos:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def _qr_matrix(payload):
+    """Módulos del QR (True = negro), sin borde; corrección M como el ^BQ de la etiqueta"""
+    import qrcode
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def graphic_field(matriz, modulo):
+    """^GFA comprimido: cada módulo como un cuadrado de `modulo` puntos, filas de bits empaquetadas"""
+    lado = len(matriz) * modulo
+    por_fila = (lado + 7) // 8
+    filas = bytearray()
+    for fila in matriz:
+        bits = 0
+        for negro in fila:
+            bits = (bits << modulo) | (((1 << modulo) - 1) if negro else 0)
+        bits <<= por_fila * 8 - lado  # relleno a la derecha hasta completar el byte
+        filas += bits.to_bytes(por_fila, "big") * modulo
+    datos = base64.b64encode(zlib.compress(bytes(filas), 9))
+    return f"^GFA,{len(filas)},{len(filas)},{por_fila},:Z64:{datos.decode()}:{crc16_ccitt(datos):04X}"
+
+
+def _dots(mm, dpi):
+    return round(mm / 25.4 * dpi)
+
+
+def zpl_label(datos, payload, qr=QR_NATIVO, dpi=DEFAULT_DPI):
+    """
+    Una etiqueta ^XA...^XZ: el QR de `payload` a la izquierda y los campos del lote
+    (productType, quantity, supplier, date, operatorName) a la derecha, en texto nativo.
+    """
+    ancho, alto = _dots(LABEL_MM[0], dpi), _dots(LABEL_MM[1], dpi)
+    margen = _dots(MARGIN_MM, dpi)
+    matriz = _qr_matrix(payload)
+    modulos = len(matriz)
+    lado_max = min(alto - 2 * margen, int(ancho * QR_MAX_WIDTH))
+    modulo = max(1, min(MAX_MAGNIFICATION, lado_max // modulos))
+    lado_qr = modulos * modulo
+
+    lineas = ["^XA", "^CI28", f"^PW{ancho}", f"^LL{alto}"]
+    if qr == QR_GRAFICO:
+        lineas.append(f"^FO{margen},{margen}{graphic_field(matriz, modulo)}^FS")
+    else:
+        # "M" = corrección media, "A" = modo de entrada automático
+        lineas.append(f"^FO{margen},{margen}^BQN,2,{modulo}^FH{ESCAPE}^FDMA,{escape_field(payload)}^FS")
+
+    x = margen * 2 + lado_qr
+    ancho_texto = ancho - x - margen
+    alto_titulo, alto_cuerpo = _dots(5, dpi), _dots(3.5, dpi)
+    y = margen
+    campos = [
+        ("AgroAmigos", alto_titulo),
+        (datos.get("productType"), alto_cuerpo),
+        (f"Cant: {datos['quantity']}" if datos.get("quantity") else "", alto_cuerpo),
+        (datos.get("supplier"), alto_cuerpo),
+        (datos.get("date"), alto_cuerpo),
+        (datos.get("operatorName"), alto_cuerpo),
+    ]
+    for texto, alto_letra in campos:
+        if texto:
+            # Sin ^FB el texto no se corta solo: se trunca según el ancho medio de la fuente 0
+            max_chars = max(4, int(ancho_texto / (alto_letra * 0.55)))
+            texto = str(texto) if len(str(texto)) <= max_chars else str(texto)[:max_chars - 2] + ".."
+            lineas.append(f"^FO{x},{y}^A0N,{alto_letra},{alto_letra}^FH{ESCAPE}^FD{escape_field(texto)}^FS")
+        y += round(alto_letra * 1.5)
+    lineas.append("^XZ")
+    return "\n".join(lineas) + "\n"
+
+
+def parse_destination(destino):
+    """(host, puerto) si el destino es una impresora en red (host:puerto o tcp://host), si no None"""
+    coincidencia = _DESTINO_TCP.match(destino.strip())
+    if coincidencia is None:
+        return None
+    host, puerto, solo_host = coincidencia.groups()
+    return (host, int(puerto)) if host else (solo_host, RAW_PORT)
+
+
+@contextmanager
+def printer_connection(destino, timeout=PRINTER_TIMEOUT):
+    """Función para enviar bytes a la impresora (socket raw, puerto 9100) o a un archivo"""
+    direccion = parse_destination(destino)
+    if direccion is None:
+        with open(destino, "ab") as archivo:
+            yield archivo.write
+        return
+    with socket.create_connection(direccion, timeout=timeout) as conexion:
+        yield conexion.sendall
+
+
+def send_zpl(destino, etiquetas):
+    """Envía las etiquetas (a medida que se generan) en una sola conexión; retorna los bytes enviados"""
+    total = 0
+    with printer_connection(destino) as enviar:
+        for etiqueta in etiquetas:
+            datos = etiqueta.encode("ascii")  # escape_field deja todo en ASCII
+            enviar(datos)
+            total += len(datos)
+    return total
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.zpl", description="Etiquetas ZPL para impresoras Zebra")
+    parser.add_argument("destino", help="host:puerto (p. ej. 192.168.1.50:9100) o archivo .zpl")
+    parser.add_argument("--ids", type=lambda v: [i.strip() for i in v.split(",") if i.strip()],
+                        help="IDs de lotes separados por comas (en ese orden)")
+    parser.add_argument("--desde", type=_fecha, help="Fecha de producción desde (AAAA-MM-DD, incluida)")
+    parser.add_argument("--hasta", type=_fecha, help="Fecha de producción hasta (AAAA-MM-DD, excluida)")
+    parser.add_argument("--producto")
+    parser.add_argument("--proveedor")
+    parser.add_argument("--qr", choices=(QR_NATIVO, QR_GRAFICO), help="^BQ nativo o gráfico ^GFA (por defecto ZPL_QR)")
+    parser.add_argument("--dpi", type=int, help="Resolución de la impresora (por defecto ZPL_DPI)")
+    args = parser.parse_args(argv)
+    if not (args.ids or args.desde or args.hasta or args.producto or args.proveedor):
+        parser.error("indica --ids o un filtro (--desde, --hasta, --producto, --proveedor)")
+
+    settings = get_settings()
+    if not settings.base_url:
+        print("❌ BASE_URL no está configurada: el QR no tendría la URL del lote")
+        return 1
+    from src.database_manager import get_database_manager
+    db = get_database_manager()
+    if not db.is_available():
+        print("❌ No se pudo abrir la base de datos")
+        return 1
+
+    lotes = iter_lotes(db, args.ids, desde=args.desde, hasta=args.hasta, product=args.producto,
+                       supplier=args.proveedor)
+    etiquetas = (
+        zpl_label(lote, lote_qr_payload(lote, settings.base_url), args.qr or settings.zpl_qr, args.dpi or settings.zpl_dpi)
+        for lote in lotes
+    )
+    cantidad = 0
+
+    def contar():
+        nonlocal cantidad
+        for etiqueta in etiquetas:
+            cantidad += 1
+            yield etiqueta
+
+    try:
+        total = send_zpl(args.destino, contar())
+    except OSError as e:
+        print(f"❌ No se pudo enviar a {args.destino}: {e}")
+        return 1
+    print(f"✅ {cantidad} etiquetas enviadas a {args.destino} ({total} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Fixtures de las pruebas.
+
+Se ejecutan con `python -m pytest tests` (pytest y mongomock) y usan mongomock como MongoDB
+central: no hace falta un servidor. Con TEST_MONGO_URI las pruebas de `backend` usan además
+un mongod real (base desechable lotetracker_test): mongomock no tiene $round y sin él se
+omiten las de despacho en MongoDB.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mongo():
+    """DatabaseManager sobre una base mongomock vacía"""
+    import mongomock
+    from src.database_manager import DatabaseManager
+    DatabaseManager._indexes_ready = False
+    return DatabaseManager(client=mongomock.MongoClient(), db_name="lotetracker_test")
+
+
+@pytest.fixture(params=["mongo", "sqlite"])
+def backend(request, tmp_path):
+    """Cada StorageBackend: DatabaseManager (mongod de TEST_MONGO_URI o mongomock) y SQLiteBackend sin sincronizar"""
+    if request.param == "sqlite":
+        from src.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(path=str(tmp_path / "estacion.db"), sync=False)
+    uri = os.getenv("TEST_MONGO_URI")
+    if not uri:
+        return request.getfixturevalue("mongo")
+    from pymongo import MongoClient
+    from src.database_manager import DatabaseManager
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    client.drop_database("lotetracker_test")
+    request.addfinalizer(lambda: client.drop_database("lotetracker_test"))
+    DatabaseManager._indexes_ready = False
+    return DatabaseManager(client=client, db_name="lotetracker_test")
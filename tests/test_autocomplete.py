@@ -0,0 +1,34 @@
+"""Filtro del autocompletado (src/components/autocomplete_dropdown.py)"""
+from src.components.autocomplete_dropdown import create_autocomplete_dropdown
+
+OPERADORES = ["Juan Pérez (OP-001)", "Ana Gómez (OP-012)", "Luis Torres (OP-120)"]
+
+
+def _sugerencias(campo, texto):
+    campo.value = texto
+    # Sin página: el .update() del componente falla en silencio
+    campo.on_change(None)
+    if not campo.suggestions_container.visible:
+        return []
+    return [item.content.value for item in campo.suggestions_column.controls]
+
+
+def test_en_memoria_busca_en_cualquier_parte_del_nombre():
+    campo = create_autocomplete_dropdown("Operador", "", options=OPERADORES)
+    assert _sugerencias(campo, "012") == ["Ana Gómez (OP-012)"]
+    assert _sugerencias(campo, "gomez") == ["Ana Gómez (OP-012)"]
+    assert _sugerencias(campo, "OP-1") == ["Luis Torres (OP-120)"]
+    assert _sugerencias(campo, "xyz") == []
+
+
+def test_con_search_usa_su_regla():
+    consultas = []
+
+    def search(texto):
+        consultas.append(texto)
+        return ["Cúrcuma"] if "cúrcuma".startswith(texto) else []
+
+    campo = create_autocomplete_dropdown("Producto", "", options=["Jengibre"], search=search)
+    assert _sugerencias(campo, "cúr") == ["Cúrcuma"]
+    assert _sugerencias(campo, "rcuma") == []
+    assert consultas == ["cúr", "rcuma"]
@@ -0,0 +1,62 @@
+"""Despacho atómico: muchos hilos sobre el mismo lote no venden más de lo que hay"""
+import random
+import threading
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from src.database_manager import DatabaseManager
+
+HILOS = 16
+STOCK = 200
+
+
+def _crear_lote(backend):
+    return backend.add_history_record({
+        "operatorName": "Ana Gómez", "operatorCode": "OP-002", "productType": "Cúrcuma",
+        "quantity": f"{STOCK} kg", "unit": "kg", "supplier": "Finca El Roble",
+    }).inserted_id
+
+
+def test_despachos_concurrentes_sin_sobreventa(backend):
+    lote_id = str(_crear_lote(backend))
+    try:
+        backend.dispatch(lote_id, 1)
+    except OperationFailure as e:
+        pytest.skip(f"mongomock no lo soporta ({e}); usar TEST_MONGO_URI")
+
+    barrera = threading.Barrier(HILOS)
+    errores = []
+
+    def trabajador(n):
+        rnd = random.Random(n)
+        barrera.wait()
+        fallos_seguidos = 0
+        try:
+            while fallos_seguidos < 5:
+                if rnd.random() < 0.2:
+                    despachos = [(lote_id, rnd.randint(1, 3)) for _ in range(rnd.randint(2, 5))]
+                    ok = bool(backend.dispatch_many(despachos))
+                else:
+                    ok = backend.dispatch(lote_id, rnd.randint(1, 5)) is not None
+                fallos_seguidos = 0 if ok else fallos_seguidos + 1
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+
+    if isinstance(backend, DatabaseManager):
+        # De la colección, no de la caché de lotes (la escriben todos los hilos)
+        lote = backend.registros.find_one({"_id": ObjectId(lote_id)})
+    else:
+        lote = backend.get_lote_by_id(lote_id)
+    despachado = sum(m["cantidad"] for m in backend.get_movements(lote_id))
+    assert lote["cantidad_restante"] >= 0
+    assert despachado == pytest.approx(STOCK - lote["cantidad_restante"])
+    assert not lote.get("movimientos_pendientes")
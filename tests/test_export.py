@@ -0,0 +1,77 @@
+"""Exportación masiva (src/export.py) sobre mongomock"""
+import csv
+import io
+from datetime import datetime
+
+from src.export import DEFAULT_FIELDS, export_records
+from src.lotes import iter_lotes
+
+LOTE = {
+    "operatorName": "Ana Gómez", "operatorCode": "OP-002", "productType": "Cúrcuma",
+    "quantity": "10 kg", "unit": "kg", "supplier": "Finca El Roble",
+}
+
+
+def _crear(mongo, fecha):
+    return mongo.add_history_record({**LOTE, "date": fecha}).inserted_id
+
+
+def _archivar(mongo, lote_id):
+    # Lo que hace archive_closed_lots con cada tanda (mongomock no tiene $merge)
+    mongo.archivo.insert_one(mongo.registros.find_one({"_id": lote_id}))
+    mongo.registros.delete_one({"_id": lote_id})
+
+
+def _exportar(mongo, **filtros):
+    salida = io.StringIO()
+    resumen = export_records(mongo, salida, "csv", batch_size=2, **filtros)
+    salida.seek(0)
+    return resumen, list(csv.DictReader(salida))
+
+
+def test_exportacion_incluye_lotes_archivados(mongo):
+    antiguo = _crear(mongo, "2023-01-02 09:00:00")
+    actual = _crear(mongo, "2024-05-03 10:00:00")
+    _archivar(mongo, antiguo)
+
+    resumen, filas = _exportar(mongo)
+    assert resumen["filas"] == 2
+    # Intercalados por fecha de producción: el archivado, más antiguo, va primero
+    assert [f["_id"] for f in filas] == [str(antiguo), str(actual)]
+
+    _, filas = _exportar(mongo, desde=datetime(2023, 1, 1), hasta=datetime(2023, 2, 1))
+    assert [f["_id"] for f in filas] == [str(antiguo)]
+
+
+def test_etiquetas_por_rango_incluyen_archivados(mongo):
+    antiguo = _crear(mongo, "2023-01-02 09:00:00")
+    _archivar(mongo, antiguo)
+    lotes = list(iter_lotes(mongo, desde=datetime(2023, 1, 1), hasta=datetime(2024, 1, 1)))
+    assert [l["_id"] for l in lotes] == [antiguo]
+    assert len(mongo.get_records_between(datetime(2023, 1, 1), datetime(2024, 1, 1))) == 1
+
+
+def test_csv_ida_y_vuelta(mongo):
+    lote_id = _crear(mongo, "2024-05-03 10:00:00")
+    mongo.registros.update_one({"_id": lote_id}, {"$set": {"cantidad_restante": 2.5}})
+
+    resumen, filas = _exportar(mongo)
+    assert resumen["filas"] == 1
+    fila = filas[0]
+    assert list(fila) == DEFAULT_FIELDS
+    assert fila["_id"] == str(lote_id)
+    assert datetime.fromisoformat(fila["fecha_produccion"]) == datetime(2024, 5, 3, 10)
+    assert fila["productType"] == "Cúrcuma" and fila["operatorName"] == "Ana Gómez"
+    assert float(fila["cantidad_inicial"]) == 10 and float(fila["cantidad_restante"]) == 2.5
+
+    _, filas = _exportar(mongo, product="curcuma")
+    assert len(filas) == 1
+    _, filas = _exportar(mongo, supplier="Otro proveedor")
+    assert filas == []
+
+
+def test_csv_con_campos_elegidos(mongo):
+    _crear(mongo, "2024-05-03 10:00:00")
+    salida = io.StringIO()
+    export_records(mongo, salida, "csv", campos=["productType", "cantidad_restante"])
+    assert salida.getvalue().splitlines() == ["productType,cantidad_restante", "Cúrcuma,10.0"]
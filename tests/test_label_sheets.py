@@ -0,0 +1,65 @@
+"""Hojas de etiquetas en PDF (src/label_sheets.py)"""
+import re
+import zlib
+from io import BytesIO
+
+import pytest
+
+from src.label_sheets import sheet_layout, write_label_sheets
+
+
+def _objetos(pdf):
+    """{número: posición} de cada "N 0 obj" del archivo"""
+    return {int(m.group(1)): m.start() for m in re.finditer(rb"(?m)^(\d+) 0 obj\n", pdf)}
+
+
+def _xref(pdf):
+    inicio = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[inicio:].startswith(b"xref\n")
+    cabecera = re.match(rb"xref\n0 (\d+)\n", pdf[inicio:])
+    total = int(cabecera.group(1))
+    entradas = pdf[inicio + cabecera.end():].split(b"\n")[:total]
+    assert entradas[0] == b"0000000000 65535 f "
+    assert re.search(rb"/Size %d " % total, pdf)
+    return {n: int(e[:10]) for n, e in enumerate(entradas) if n}
+
+
+@pytest.fixture(scope="module")
+def pdf_5_etiquetas():
+    salida = BytesIO()
+    payloads = [f"Lote {i}\nhttp://127.0.0.1:8550/lote/{i:024x}" for i in range(5)]
+    resumen = write_label_sheets(salida, iter(payloads), columnas=2, filas=2, dpi=40, workers=1)
+    return resumen, salida.getvalue()
+
+
+def test_paginas_segun_la_grilla(pdf_5_etiquetas):
+    resumen, pdf = pdf_5_etiquetas
+    assert resumen["etiquetas"] == 5 and resumen["paginas"] == 2
+    assert pdf.startswith(b"%PDF-1.4\n")
+    assert len(re.findall(rb"/Type /Page ", pdf)) == 2
+    assert b"/Count 2" in pdf
+    assert len(re.findall(rb"/Subtype /Image", pdf)) == 5
+    # Cada página dibuja sus imágenes: 4 en la primera y 1 en la segunda
+    contenidos = [
+        zlib.decompress(m.group(2)).decode()
+        for m in re.finditer(rb"<< /Filter /FlateDecode /Length (\d+) >>\nstream\n(.*?)\nendstream", pdf, re.S)
+    ]
+    assert [c.count(" Do Q") for c in contenidos] == [4, 1]
+
+
+def test_xref_apunta_a_cada_objeto(pdf_5_etiquetas):
+    _, pdf = pdf_5_etiquetas
+    assert _xref(pdf) == _objetos(pdf)
+
+
+def test_sin_etiquetas_es_un_pdf_valido():
+    salida = BytesIO()
+    resumen = write_label_sheets(salida, iter([]), workers=1)
+    pdf = salida.getvalue()
+    assert resumen["paginas"] == 0 and b"/Count 0" in pdf
+    assert _xref(pdf) == _objetos(pdf)
+
+
+def test_margenes_imposibles():
+    with pytest.raises(ValueError):
+        sheet_layout(columnas=3, filas=4, margen_mm=150)
@@ -0,0 +1,66 @@
+"""Rollup incremental de produccion_diaria (get_daily_lots)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database_manager import ROLLUP_MARK
+from src.shared_state import get_shared_store
+
+LOTE = {
+    "operatorName": "Ana Gómez", "operatorCode": "OP-002", "productType": "Cúrcuma",
+    "quantity": "10 kg", "unit": "kg", "supplier": "Finca El Roble",
+}
+
+
+@pytest.fixture
+def rollups(mongo, monkeypatch):
+    """Días desde los que get_daily_lots pidió recalcular (mongomock no tiene $merge ni $dateTrunc)"""
+    pedidos = []
+    original = mongo.rollup_production
+    # El rollup real guarda su estado; solo se omite el pipeline
+    monkeypatch.setattr(mongo.registros, "aggregate", lambda pipeline: iter(()))
+
+    def registrar(desde=None):
+        pedidos.append(desde)
+        original(desde=desde)
+
+    monkeypatch.setattr(mongo, "rollup_production", registrar)
+    get_shared_store().invalidate(ROLLUP_MARK)
+    yield pedidos
+    get_shared_store().invalidate(ROLLUP_MARK)
+
+
+def _hoy():
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _siguiente_rollup(mongo):
+    get_shared_store().invalidate(ROLLUP_MARK)
+    mongo.get_daily_lots(dias=14)
+
+
+def test_primer_rollup_cubre_todo_el_grafico(mongo, rollups):
+    mongo.get_daily_lots(dias=14)
+    assert rollups == [_hoy() - timedelta(days=13)]
+
+    _siguiente_rollup(mongo)
+    assert rollups[-1] == _hoy() - timedelta(days=1)
+
+
+def test_lote_con_fecha_anterior_se_recalcula(mongo, rollups):
+    mongo.get_daily_lots(dias=14)
+    fecha = _hoy() - timedelta(days=5, hours=-9)
+    mongo.add_history_record({**LOTE, "date": fecha.strftime("%Y-%m-%d %H:%M:%S")})
+
+    _siguiente_rollup(mongo)
+    assert rollups[-1] == _hoy() - timedelta(days=5)
+    # Una vez recalculado, vuelve a ser incremental desde ayer
+    _siguiente_rollup(mongo)
+    assert rollups[-1] == _hoy() - timedelta(days=1)
+
+
+def test_lote_de_hoy_no_amplia_el_rollup(mongo, rollups):
+    mongo.get_daily_lots(dias=14)
+    mongo.add_history_record({**LOTE, "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    _siguiente_rollup(mongo)
+    assert rollups[-1] == _hoy() - timedelta(days=1)
@@ -0,0 +1,25 @@
+"""Pool de render (src/render_service.py): se recupera si un proceso muere"""
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from src.render_service import RenderService
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="requiere SIGKILL (POSIX)")
+def test_pool_roto_en_reposo_se_recrea():
+    servicio = RenderService(workers=1, timeout=30)
+    assert servicio.render_png("Lote de prueba")
+    # Un proceso muerto sin trabajos en curso (p. ej. el OOM killer) rompe el pool en reposo
+    for pid in list(servicio._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(1)
+
+    with pytest.raises(BrokenProcessPool):
+        servicio.render_png("Lote de prueba")
+    assert servicio.render_png("Lote de prueba")
+    assert servicio.stats()["failed"] == 1
+    servicio._executor.shutdown()
@@ -0,0 +1,111 @@
+"""Rutas HTTP de src/scan_server.py que no dependen de la sesión Flet"""
+import pytest
+from fastapi.testclient import TestClient
+
+from src.settings import get_settings
+
+TOKEN = "secreto-de-prueba"
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    """Crea la app con las variables de entorno que cada prueba haya fijado"""
+    def crear(**entorno):
+        for nombre, valor in entorno.items():
+            monkeypatch.setenv(nombre, valor)
+        get_settings.cache_clear()
+        from src.scan_server import create_asgi_app
+        return TestClient(create_asgi_app(lambda page: None))
+
+    yield crear
+    get_settings.cache_clear()
+
+
+def test_diagnostico_no_existe_sin_token(cliente, monkeypatch):
+    monkeypatch.delenv("DIAGNOSTICS_TOKEN", raising=False)
+    http = cliente()
+    for ruta in ("/api/sessions", "/api/render", "/api/ui", "/metrics"):
+        # La ruta no se registra: responde el Mount("/") de Flet con su página, no el diagnóstico
+        respuesta = http.get(ruta)
+        assert not respuesta.headers["content-type"].startswith(("application/json", "text/plain"))
+
+
+def test_diagnostico_pide_token(cliente):
+    http = cliente(DIAGNOSTICS_TOKEN=TOKEN)
+    assert http.get("/api/sessions").status_code == 401
+    assert http.get("/api/sessions", headers={"Authorization": "Bearer otro"}).status_code == 401
+
+    respuesta = http.get("/api/sessions", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert respuesta.status_code == 200
+    assert set(respuesta.json()) >= {"sessions", "connected", "estimated_bytes"}
+    assert http.get("/api/render", params={"token": TOKEN}).status_code == 200
+
+
+def test_sesiones_sin_identificadores():
+    from src.sessions import SessionRegistry
+
+    class Pagina:
+        session_id = "abc123"
+        client_ip = "192.168.1.20"
+
+    class Vistas:
+        def views(self):
+            return []
+
+    registro = SessionRegistry()
+    registro.register(Pagina(), Vistas())
+    texto = str(registro.stats())
+    assert "abc123" not in texto and "192.168.1.20" not in texto
+
+
+def test_escaneo_con_la_base_caida_no_se_cachea(cliente, mongo, monkeypatch):
+    from pymongo.errors import ServerSelectionTimeoutError
+    import src.database_manager as database_manager
+
+    monkeypatch.setattr(database_manager, "get_database_manager", lambda: mongo)
+    http = cliente()
+    lote_id = "665f00000000000000000001"
+    respuesta = http.get(f"/lote/{lote_id}", params={"format": "json"})
+    assert respuesta.status_code == 404
+    assert respuesta.headers["cache-control"].startswith("public")
+
+    def caida(*args, **kwargs):
+        raise ServerSelectionTimeoutError("sin servidor")
+
+    monkeypatch.setattr(mongo.registros, "find_one", caida)
+    for params in ({"format": "json"}, {}):
+        respuesta = http.get("/lote/665f00000000000000000002", params=params)
+        assert respuesta.status_code == 503
+        assert respuesta.headers["cache-control"] == "no-store"
+        assert "retry-after" in respuesta.headers
+
+
+def test_exportacion_pide_token_y_una_a_la_vez(cliente, mongo, monkeypatch):
+    import src.database_manager as database_manager
+    from src.scan_server import _export_slot
+
+    mongo.add_history_record({
+        "operatorName": "Ana Gómez", "operatorCode": "OP-002", "productType": "Cúrcuma",
+        "quantity": "10 kg", "unit": "kg", "supplier": "Finca El Roble",
+    })
+    monkeypatch.setattr(database_manager, "get_database_manager", lambda: mongo)
+    http = cliente(EXPORT_TOKEN=TOKEN)
+    autorizado = {"Authorization": f"Bearer {TOKEN}"}
+
+    assert http.get("/api/export").status_code == 401
+    assert http.get("/api/export", params={"token": "otro"}).status_code == 401
+
+    respuesta = http.get("/api/export", headers=autorizado, params={"campos": "productType,supplier"})
+    assert respuesta.status_code == 200
+    assert respuesta.text.splitlines() == ["productType,supplier", "Cúrcuma,Finca El Roble"]
+
+    # Con otra exportación en curso
+    assert _export_slot.acquire(blocking=False)
+    try:
+        respuesta = http.get("/api/export", headers=autorizado)
+        assert respuesta.status_code == 429
+        assert "retry-after" in respuesta.headers
+    finally:
+        _export_slot.release()
+    # El turno de la primera se liberó al terminar la descarga
+    assert http.get("/api/export", params={"token": TOKEN}).status_code == 200
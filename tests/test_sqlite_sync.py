@@ -0,0 +1,87 @@
+"""MongoSync: el stock se sube como deltas y no pisa lo despachado en otras estaciones"""
+import pytest
+from bson import ObjectId
+
+from src.sqlite_backend import MongoSync, SQLiteBackend
+from src.storage import ESTADO_DESPACHADO, ESTADO_DESPACHO_PARCIAL
+
+LOTE = {
+    "operatorName": "Ana Gómez", "operatorCode": "OP-002", "productType": "Cúrcuma",
+    "quantity": "10 kg", "unit": "kg", "supplier": "Finca El Roble", "date": "01/05/2024 08:00",
+}
+
+
+@pytest.fixture
+def estacion(tmp_path, mongo):
+    """Base local de una estación y su MongoSync, conectado a `mongo` sin hilo de fondo"""
+    local = SQLiteBackend(path=str(tmp_path / "estacion.db"), sync=False)
+    sync = MongoSync(local, interval=60, batch_size=100)
+    sync._remote = mongo
+    return local, sync
+
+
+def _despacho_en_otra_estacion(mongo, lote_id, qty):
+    # Lo que hace DatabaseManager.dispatch en otra estación (mongomock no tiene $round)
+    mongo.registros.update_one(
+        {"_id": ObjectId(lote_id), "cantidad_restante": {"$gte": qty}},
+        {"$inc": {"cantidad_restante": -qty, "cantidad_base_restante": -qty}},
+    )
+
+
+def test_despachos_de_dos_estaciones_se_suman(estacion, mongo):
+    local, sync = estacion
+    lote_id = local.add_history_record(dict(LOTE)).inserted_id
+    sync.sync_once(mongo)
+    assert mongo.registros.find_one({"_id": lote_id})["cantidad_restante"] == 10
+
+    # Otra estación despacha 4 en MongoDB mientras esta despacha 3 sin haber visto ese cambio
+    _despacho_en_otra_estacion(mongo, lote_id, 4)
+    assert local.dispatch(str(lote_id), 3)["cantidad_restante"] == 7
+    sync.sync_once(mongo)
+
+    central = mongo.registros.find_one({"_id": lote_id})
+    assert central["cantidad_restante"] == pytest.approx(3)
+    assert central["cantidad_base_restante"] == pytest.approx(3)
+    assert central["estado"] == ESTADO_DESPACHO_PARCIAL
+    assert central["movimientos_pendientes"] == []
+    assert mongo.movimientos.count_documents({"lote_id": lote_id, "conflicto": {"$exists": False}}) == 1
+    # La copia local recibe lo despachado en la otra estación
+    assert local.get_lote_by_id(str(lote_id))["cantidad_restante"] == pytest.approx(3)
+    assert local.pending_counts() == {"lotes": 0, "movimientos": 0, "catalogo": 0}
+
+
+def test_despacho_sin_stock_central_queda_como_conflicto(estacion, mongo):
+    local, sync = estacion
+    lote_id = local.add_history_record(dict(LOTE)).inserted_id
+    sync.sync_once(mongo)
+
+    _despacho_en_otra_estacion(mongo, lote_id, 8)
+    assert local.dispatch(str(lote_id), 5) is not None
+    sync.sync_once(mongo)
+
+    assert mongo.registros.find_one({"_id": lote_id})["cantidad_restante"] == pytest.approx(2)
+    assert mongo.movimientos.find_one({"lote_id": lote_id})["conflicto"] is True
+    assert local.get_movements(str(lote_id))[0]["conflicto"] is True
+    assert local.get_lote_by_id(str(lote_id))["cantidad_restante"] == pytest.approx(2)
+    assert sync.synced["conflictos"] == 1
+
+
+def test_reenviar_no_descuenta_dos_veces(estacion, mongo):
+    local, sync = estacion
+    lote_id = local.add_history_record(dict(LOTE)).inserted_id
+    local.dispatch(str(lote_id), 10)  # antes de la primera subida: alta + delta
+    sync.sync_once(mongo)
+    central = mongo.registros.find_one({"_id": lote_id})
+    assert central["cantidad_restante"] == pytest.approx(0)
+    assert central["estado"] == ESTADO_DESPACHADO
+
+    # Se cae después de escribir en MongoDB y antes de marcar lo local: se repite el envío
+    local._conn().execute("UPDATE lotes SET version_sincronizada = 0")
+    local._conn().execute("UPDATE movimientos SET sincronizado = 0")
+    local._conn().commit()
+    sync.sync_once(mongo)
+
+    assert mongo.registros.find_one({"_id": lote_id})["cantidad_restante"] == pytest.approx(0)
+    assert mongo.registros.count_documents({}) == 1
+    assert mongo.movimientos.count_documents({"conflicto": True}) == 0
+    assert sync.synced["conflictos"] == 0
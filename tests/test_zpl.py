@@ -0,0 +1,85 @@
+"""Etiquetas ZPL (src/zpl.py): formato, escapes y envío por TCP"""
+import base64
+import re
+import socketserver
+import threading
+import time
+import zlib
+
+import pytest
+
+from src.zpl import QR_GRAFICO, _qr_matrix, crc16_ccitt, escape_field, send_zpl, zpl_label
+
+LOTE = {
+    "productType": "Cúrcuma ^XZ", "quantity": "10 kg", "supplier": "Finca ~El Roble_",
+    "date": "2024-05-01 08:00:00", "operatorName": "Ana Gómez",
+}
+PAYLOAD = "Producto: Cúrcuma\nhttp://127.0.0.1:8550/lote/665f00000000000000000001"
+
+
+@pytest.fixture
+def impresora():
+    """Servidor TCP en 127.0.0.1 que hace de impresora: guarda lo recibido por conexión"""
+    recibido = []
+
+    class Manejador(socketserver.StreamRequestHandler):
+        def handle(self):
+            recibido.append(self.rfile.read())
+
+    servidor = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Manejador)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield f"127.0.0.1:{servidor.server_address[1]}", recibido
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_crc_ccitt():
+    # Valor de referencia de CRC-16/XMODEM (polinomio 0x1021, inicial 0)
+    assert crc16_ccitt(b"123456789") == 0x31C3
+
+
+def test_escape_de_caracteres_de_control_y_tildes():
+    assert escape_field("a^b~c_d") == "a_5Eb_7Ec_5Fd"
+    assert escape_field("Cúrcuma") == "C_C3_BArcuma"
+    assert escape_field("Ñandú").isascii()
+
+
+def test_etiqueta_con_qr_nativo():
+    etiqueta = zpl_label(LOTE, PAYLOAD)
+    assert etiqueta.startswith("^XA\n") and etiqueta.endswith("^XZ\n")
+    assert etiqueta.count("^XA") == 1 and etiqueta.count("^XZ") == 1
+    # Los ^ y ~ del lote no pueden abrir ni cerrar comandos
+    assert "^FDCúrcuma" not in etiqueta and "_5EXZ" in etiqueta and "_7EEl" in etiqueta
+    assert re.search(r"\^BQN,2,\d+\^FH_\^FDMA,", etiqueta)
+
+
+def test_grafico_gfa_con_crc_correcto():
+    etiqueta = zpl_label(LOTE, PAYLOAD, qr=QR_GRAFICO)
+    coincidencia = re.search(r"\^GFA,(\d+),(\d+),(\d+),:Z64:([A-Za-z0-9+/=]+):([0-9A-F]{4})\^FS", etiqueta)
+    assert coincidencia
+    total, _, por_fila, datos, crc = coincidencia.groups()
+    assert int(crc, 16) == crc16_ccitt(datos.encode())
+
+    bitmap = zlib.decompress(base64.b64decode(datos))
+    assert len(bitmap) == int(total)
+    # Primera fila: cada módulo negro del QR son `modulo` bits a 1
+    matriz = _qr_matrix(PAYLOAD)
+    modulo = int(por_fila) * 8 // len(matriz)
+    primera = int.from_bytes(bitmap[:int(por_fila)], "big")
+    bits = format(primera, f"0{int(por_fila) * 8}b")
+    assert bits[:len(matriz) * modulo] == "".join(("1" if negro else "0") * modulo for negro in matriz[0])
+
+
+def test_envio_por_tcp(impresora):
+    destino, recibido = impresora
+    etiquetas = [zpl_label(LOTE, PAYLOAD), zpl_label(LOTE, PAYLOAD, qr=QR_GRAFICO)]
+    total = send_zpl(destino, iter(etiquetas))
+
+    for _ in range(50):
+        if recibido:
+            break
+        time.sleep(0.05)
+    assert recibido == ["".join(etiquetas).encode("ascii")]
+    assert total == len(recibido[0])
+    assert recibido[0].count(b"^XA") == 2 and recibido[0].count(b"^XZ") == 2